@@ -30,6 +30,17 @@ class BackupConsumer(SyncConsumer):
 
         for file_backup in queryset:
             file_name = file_backup.source.file.name
+
+            # Files in the content-addressed storage share stored images,
+            # so each of them only has to be uploaded once.
+            already_uploaded = FileBackup.objects.filter(
+                source__file=file_name, done__isnull=False
+            ).exists()
+            if already_uploaded:
+                file_backup.done = timezone.now()
+                file_backup.save()
+                continue
+
             with file_backup.source.file.file.open('rb') as fh:
                 try:
                     s3client.upload_fileobj(fh, settings.bucket_name, file_name)
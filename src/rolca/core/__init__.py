@@ -6,6 +6,19 @@ Rolca core
 
 .. automodule:: rolca.core.models
 .. automodule:: rolca.core.views
+.. automodule:: rolca.core.protocol
+.. automodule:: rolca.core.consumers
+.. automodule:: rolca.core.worker
+.. automodule:: rolca.core.archive
+.. automodule:: rolca.core.counters
+.. automodule:: rolca.core.cleanup
+.. automodule:: rolca.core.deletion
+.. automodule:: rolca.core.outbox
+.. automodule:: rolca.core.reconcile
+.. automodule:: rolca.core.uploadhandler
+.. automodule:: rolca.core.resumable
+.. automodule:: rolca.core.imaging
+.. automodule:: rolca.core.governor
 .. automodule:: rolca.core.api
 .. automodule:: rolca.core.admin
 .. automodule:: rolca.core.urls
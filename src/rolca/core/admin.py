@@ -15,7 +15,7 @@ from django.contrib import admin
 from django.urls import reverse
 from django.utils.html import format_html
 
-from rolca.core.models import Contest, File, Submission, Theme
+from rolca.core.models import Contest, File, OutgoingEmail, Submission, Theme
 
 
 class ThemeInline(admin.TabularInline):
@@ -96,3 +96,4 @@ class ContestAdmin(admin.ModelAdmin):
 admin.site.register(Contest, ContestAdmin)
 admin.site.register(Submission)
 admin.site.register(File)
+admin.site.register(OutgoingEmail)
@@ -7,6 +7,10 @@ Core API
 .. automodule:: rolca.core.api.views
 .. automodule:: rolca.core.api.serializers
 .. automodule:: rolca.core.api.permissions
+.. automodule:: rolca.core.api.optimization
+.. automodule:: rolca.core.api.pagination
+.. automodule:: rolca.core.api.conditional
+.. automodule:: rolca.core.api.compiled
 .. automodule:: rolca.core.api.urls
 
 """
@@ -0,0 +1,149 @@
+""".. Ignore pydocstyle D400.
+
+=============================
+Core API compiled serializers
+=============================
+
+DRF serializers resolve fields, sources and nested serializers for every
+rendered object. For hot read endpoints, the serializer is compiled
+once per response into a list of ``(name, getter, converter)`` entries
+and objects are rendered by a tight loop over it.
+
+Columns of the model are read with prepared ``attrgetter`` functions and
+converted with plain functions where DRF would only call ``int`` or
+``str``. Other fields use their own ``get_attribute`` and
+``to_representation`` methods, so the output is identical to the one
+produced by DRF. Serializers with custom ``to_representation`` are
+rendered by DRF.
+
+.. autofunction:: rolca.core.api.compiled.compile_serializer
+
+.. autoclass:: rolca.core.api.compiled.CompiledReadMixin
+    :members:
+
+"""
+import operator
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Manager
+
+from rest_framework import permissions, serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+#: converters equivalent to ``to_representation`` of the exact field types
+SIMPLE_CONVERTERS = {
+    serializers.IntegerField: int,
+    serializers.CharField: str,
+}
+
+
+def _get_column_getter(field, model):
+    """Return getter of the model column used by the field or ``None``."""
+    if model is None or len(field.source_attrs) != 1:
+        return None
+
+    try:
+        model_field = model._meta.get_field(field.source_attrs[0])
+    except FieldDoesNotExist:
+        return None
+    if model_field.is_relation or not model_field.concrete:
+        return None
+
+    return operator.attrgetter(model_field.attname)
+
+
+def _compile_field(field, model):
+    """Return getter and converter of the field."""
+    if isinstance(field, serializers.ListSerializer):
+        render_child = compile_serializer(field.child)
+
+        def render_many(data):
+            iterable = data.all() if isinstance(data, Manager) else data
+            return [render_child(item) for item in iterable]
+
+        return field.get_attribute, render_many
+
+    if isinstance(field, serializers.BaseSerializer):
+        return field.get_attribute, compile_serializer(field)
+
+    if isinstance(field, serializers.SerializerMethodField):
+        method = getattr(field.parent, field.method_name)
+        return (lambda instance: instance), method
+
+    converter = SIMPLE_CONVERTERS.get(type(field), field.to_representation)
+    getter = _get_column_getter(field, model) or field.get_attribute
+    return getter, converter
+
+
+def compile_serializer(serializer):
+    """Return function rendering objects in the same way as the serializer.
+
+    List serializers return functions rendering iterables of objects.
+    """
+    if isinstance(serializer, serializers.ListSerializer):
+        render_child = compile_serializer(serializer.child)
+        return lambda instances: [render_child(instance) for instance in instances]
+
+    if (
+        type(serializer).to_representation
+        is not serializers.Serializer.to_representation
+    ):
+        return serializer.to_representation
+
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    entries = [
+        (field.field_name,) + _compile_field(field, model)
+        for field in serializer._readable_fields
+    ]
+
+    def render(instance):
+        row = {}
+        for name, getter, converter in entries:
+            try:
+                attribute = getter(instance)
+            except SkipField:
+                continue
+
+            if isinstance(attribute, PKOnlyObject):
+                row[name] = None if attribute.pk is None else converter(attribute)
+            else:
+                row[name] = None if attribute is None else converter(attribute)
+        return row
+
+    return render
+
+
+class CompiledSerializer:
+    """Serializer wrapper rendering its data with the compiled serializer."""
+
+    def __init__(self, serializer):
+        """Initialize wrapper of the serializer with an instance."""
+        self.serializer = serializer
+
+    def __getattr__(self, name):
+        """Return attributes of the wrapped serializer."""
+        return getattr(self.serializer, name)
+
+    @property
+    def data(self):
+        """Return rendered data of the serializer."""
+        rendered = compile_serializer(self.serializer)(self.serializer.instance)
+        if isinstance(rendered, list):
+            return ReturnList(rendered, serializer=self.serializer)
+        return ReturnDict(rendered, serializer=self.serializer)
+
+
+class CompiledReadMixin:
+    """Viewset mixin rendering read responses with compiled serializers."""
+
+    def get_serializer(self, *args, **kwargs):
+        """Return compiled serializer of objects on read requests."""
+        serializer = super().get_serializer(*args, **kwargs)
+        if self.request.method not in permissions.SAFE_METHODS:
+            return serializer
+        if serializer.instance is None or 'data' in kwargs:
+            return serializer
+
+        return CompiledSerializer(serializer)
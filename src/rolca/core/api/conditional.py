@@ -0,0 +1,123 @@
+""".. Ignore pydocstyle D400.
+
+=====================
+Core API conditionals
+=====================
+
+Responses of read endpoints carry ``ETag`` header computed from the
+number of objects and their latest modification time, which are
+aggregated in the database. Requests with matching ``If-None-Match``
+header are answered with ``304 Not Modified`` before any object is
+serialized.
+
+``Last-Modified`` header is not sent, as the latest modification time
+doesn't change when objects are deleted, so clients revalidating with
+``If-Modified-Since`` would keep the stale copy.
+
+Views declare querysets of all objects included in the response, e.g.
+themes of the listed contests, by overriding
+``get_conditional_querysets``.
+
+.. autofunction:: rolca.core.api.conditional.get_etag
+
+.. autoclass:: rolca.core.api.conditional.ConditionalGetMixin
+    :members:
+
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+
+def get_etag(querysets, *extra):
+    """Return ETag of the querysets.
+
+    Values in ``extra`` are included in the ETag.
+    """
+    state = list(extra)
+    for queryset in querysets:
+        aggregates = {'count': Count('pk')}
+        field_names = [field.name for field in queryset.model._meta.concrete_fields]
+        if 'modified' in field_names:
+            aggregates['modified'] = Max('modified')
+        values = queryset.order_by().aggregate(**aggregates)
+
+        modified = values.get('modified')
+        state.extend([values['count'], modified.isoformat() if modified else None])
+
+    return quote_etag(hashlib.sha1(repr(state).encode()).hexdigest())
+
+
+class EarlyResponse(Exception):
+    """Request is answered with a response before reaching the handler."""
+
+    def __init__(self, response):
+        """Initialize exception with the response."""
+        super().__init__()
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """Viewset mixin answering unchanged list and detail requests with 304."""
+
+    conditional_actions = ('list', 'retrieve')
+
+    def get_conditional_querysets(self, queryset):
+        """Return querysets of all objects included in the response.
+
+        ``queryset`` contains the objects returned by the request.
+        """
+        return [queryset]
+
+    def get_conditional_extra(self):
+        """Return values other than objects the response depends on."""
+        return [
+            self.request.get_full_path(),
+            self.request.accepted_media_type,
+            self.request.user.is_superuser,
+        ]
+
+    def _get_requested_queryset(self):
+        """Return queryset of objects returned by the current request."""
+        queryset = self.filter_queryset(self.get_queryset())
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if lookup_url_kwarg in self.kwargs:
+            queryset = queryset.filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )
+        return queryset
+
+    def initial(self, request, *args, **kwargs):
+        """Answer with 304 response if the client's copy is current."""
+        self._etag = None
+        super().initial(request, *args, **kwargs)
+        if self.action not in self.conditional_actions:
+            return
+
+        self._etag = get_etag(
+            self.get_conditional_querysets(self._get_requested_queryset()),
+            *self.get_conditional_extra(),
+        )
+
+        response = get_conditional_response(request, etag=self._etag)
+        if response is not None:
+            raise EarlyResponse(response)
+
+    def handle_exception(self, exc):
+        """Return the response prepared before reaching the handler."""
+        if isinstance(exc, EarlyResponse):
+            return exc.response
+
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Add ETag to successful responses."""
+        response = super().finalize_response(request, response, *args, **kwargs)
+
+        etag = getattr(self, '_etag', None)
+        if etag and response.status_code in (200, 304):
+            response['ETag'] = etag
+        return response
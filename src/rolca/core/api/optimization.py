@@ -0,0 +1,219 @@
+""".. Ignore pydocstyle D400.
+
+=====================
+Core API optimization
+=====================
+
+Querysets of read requests are optimized based on the serializer used
+to render the response, so the number of queries doesn't depend on the
+number of returned objects.
+
+Fields of the serializer (and of nested serializers) are walked and:
+
+* forward relations rendered with nested serializers are loaded with
+  ``select_related``,
+* reverse and many-to-many relations are loaded with ``prefetch_related``
+  and their querysets are optimized with the nested serializer,
+* only columns used by the serializers are loaded with ``only``.
+
+Serializer method fields can read any attribute, so all columns are
+loaded for serializers with such fields. Relations they use can be
+declared with ``select_related`` and ``prefetch_related`` attributes of
+the serializer's ``Meta`` class. Lookups already prefetched by the view
+(e.g. with annotated querysets) are kept as they are.
+
+.. autoclass:: rolca.core.api.optimization.QueryOptimizationMixin
+    :members:
+
+.. autofunction:: rolca.core.api.optimization.optimize_queryset
+
+"""
+from django.db.models import ForeignObjectRel, Prefetch
+
+from rest_framework import permissions, serializers
+
+
+def _get_model_fields(model):
+    """Return model's fields and relations by their attribute names."""
+    fields = {}
+    for field in model._meta.get_fields():
+        if isinstance(field, ForeignObjectRel):
+            fields[field.get_accessor_name()] = field
+        else:
+            fields[field.name] = field
+    return fields
+
+
+class _QueryPlan:
+    """Relations and columns needed to render the serializer."""
+
+    def __init__(self, annotations=()):
+        """Initialize an empty plan."""
+        self.annotations = set(annotations)
+        self.select_related = set()
+        self.prefetch_related = {}
+        self.only = set()
+
+    def load_all(self, model, prefix):
+        """Load all columns of the model."""
+        self.only.update(prefix + field.name for field in model._meta.concrete_fields)
+
+    def add_select_related(self, model, prefix, lookup):
+        """Select the related objects on the lookup with all their columns."""
+        for name in lookup.split('__'):
+            model = _get_model_fields(model)[name].related_model
+            prefix += name
+            self.select_related.add(prefix)
+            self.only.add(prefix)
+            prefix += '__'
+            self.load_all(model, prefix)
+
+    def add_serializer(self, serializer, model, prefix=''):
+        """Add relations and columns used by the serializer."""
+        meta = getattr(serializer, 'Meta', None)
+        for lookup in getattr(meta, 'select_related', ()):
+            self.add_select_related(model, prefix, lookup)
+        for lookup in getattr(meta, 'prefetch_related', ()):
+            self.prefetch_related.setdefault(prefix + lookup, None)
+
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+
+            if field.source == '*':
+                if isinstance(field, serializers.BaseSerializer):
+                    self.add_serializer(field, model, prefix)
+                else:
+                    # Method fields can read any attribute.
+                    self.load_all(model, prefix)
+                continue
+
+            self.add_source(field, field.source_attrs, model, prefix)
+
+    def add_source(self, field, attrs, model, prefix):
+        """Add relations and columns used by the field's source."""
+        name = attrs[0]
+        model_field = _get_model_fields(model).get(name)
+        if model_field is None:
+            if not prefix and name in self.annotations:
+                return
+            # Properties and methods can read any attribute.
+            self.load_all(model, prefix)
+            return
+
+        lookup = prefix + name
+        if not model_field.is_relation:
+            self.only.add(lookup)
+            return
+
+        related_model = model_field.related_model
+        if related_model is None:
+            # Generic relations point to any model.
+            self.load_all(model, prefix)
+            return
+
+        if not model_field.concrete or model_field.many_to_many:
+            self.add_prefetch(field, attrs, model_field, lookup)
+            return
+
+        self.only.add(lookup)
+        nested = len(attrs) > 1
+        if not nested and isinstance(field, serializers.RelatedField):
+            if field.use_pk_only_optimization():
+                # Primary key is stored in the column of the relation.
+                return
+
+        self.select_related.add(lookup)
+        if nested:
+            self.add_source(field, attrs[1:], related_model, lookup + '__')
+        elif isinstance(field, serializers.BaseSerializer):
+            self.add_serializer(field, related_model, lookup + '__')
+        else:
+            self.load_all(related_model, lookup + '__')
+
+    def add_prefetch(self, field, attrs, model_field, lookup):
+        """Prefetch objects of the reverse or many-to-many relation."""
+        queryset = model_field.related_model._default_manager.all()
+        plan = _QueryPlan()
+        if isinstance(model_field, ForeignObjectRel) and not model_field.many_to_many:
+            # Prefetched objects are matched by their foreign key.
+            plan.only.add(model_field.field.name)
+
+        if isinstance(field, serializers.ListSerializer) and len(attrs) == 1:
+            plan.add_serializer(field.child, queryset.model)
+        elif isinstance(field, serializers.BaseSerializer) and len(attrs) == 1:
+            plan.add_serializer(field, queryset.model)
+        elif isinstance(field, serializers.ManyRelatedField) and len(attrs) == 1:
+            if not field.child_relation.use_pk_only_optimization():
+                plan.load_all(queryset.model, '')
+        else:
+            plan.load_all(queryset.model, '')
+
+        self.prefetch_related[lookup] = plan.apply(queryset)
+
+    def apply(self, queryset):
+        """Return the queryset optimized according to the plan."""
+        query = queryset.query
+        deferred_names, defer = query.deferred_loading
+        # Columns may already be restricted by the view.
+        restrict = not deferred_names and defer and query.select_related is not True
+        if restrict and isinstance(query.select_related, dict):
+            # Relations selected by the view need all their columns.
+            self._add_selected(query.select_related, queryset.model, '')
+
+        existing = [
+            lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup
+            for lookup in queryset._prefetch_related_lookups
+        ]
+        prefetches = [
+            Prefetch(lookup, queryset=prefetch_queryset)
+            for lookup, prefetch_queryset in self.prefetch_related.items()
+            if not any(
+                name == lookup or name.startswith(lookup + '__') for name in existing
+            )
+        ]
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+
+        if restrict:
+            queryset = queryset.only(*self.only)
+
+        return queryset
+
+    def _add_selected(self, selected, model, prefix):
+        """Load all columns of the relations in the select tree."""
+        fields = _get_model_fields(model)
+        for name, nested in selected.items():
+            related_model = fields[name].related_model
+            self.only.add(prefix + name)
+            self.load_all(related_model, prefix + name + '__')
+            self._add_selected(nested, related_model, prefix + name + '__')
+
+
+def optimize_queryset(queryset, serializer):
+    """Return queryset optimized for rendering with the serializer."""
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+
+    plan = _QueryPlan(annotations=queryset.query.annotations)
+    plan.add_serializer(serializer, queryset.model)
+    return plan.apply(queryset)
+
+
+class QueryOptimizationMixin:
+    """Viewset mixin optimizing querysets of read requests.
+
+    Queryset is optimized for the viewset's serializer after it is
+    filtered, so it applies to list and detail requests alike.
+    """
+
+    def filter_queryset(self, queryset):
+        """Filter the queryset and optimize it for the serializer."""
+        queryset = super().filter_queryset(queryset)
+        if self.request.method not in permissions.SAFE_METHODS:
+            return queryset
+
+        return optimize_queryset(queryset, self.get_serializer())
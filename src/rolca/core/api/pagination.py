@@ -0,0 +1,62 @@
+""".. Ignore pydocstyle D400.
+
+===================
+Core API pagination
+===================
+
+List endpoints are paginated with cursors, which filter on the ordering
+field instead of skipping rows with an offset, so loading a page takes
+the same time regardless of its depth.
+
+Objects are ordered as returned by the view's queryset, which defaults
+to the ``ordering`` of the model, or by their primary key otherwise.
+Page size is configured with ``ROLCA_PAGE_SIZE`` setting and can be
+changed by clients with the ``page_size`` query parameter up to
+``ROLCA_MAX_PAGE_SIZE``.
+
+Clients relying on unpaginated responses can opt out by setting the
+``paginate`` query parameter to ``false``.
+
+.. autoclass:: rolca.core.api.pagination.CursorPagination
+    :members:
+
+"""
+from django.conf import settings
+
+from rest_framework import pagination
+
+#: values of ``paginate`` query parameter disabling the pagination
+FALSE_VALUES = ('false', '0', 'no', 'off')
+
+
+class CursorPagination(pagination.CursorPagination):
+    """Cursor pagination in the order of the view's queryset."""
+
+    page_size_query_param = 'page_size'
+    paginate_query_param = 'paginate'
+
+    def get_page_size(self, request):
+        """Return the requested page size limited by the settings."""
+        self.page_size = getattr(settings, 'ROLCA_PAGE_SIZE', 100)
+        self.max_page_size = getattr(settings, 'ROLCA_MAX_PAGE_SIZE', 1000)
+        return super().get_page_size(request)
+
+    def get_ordering(self, request, queryset, view):
+        """Return ordering of the queryset."""
+        filter_backends = getattr(view, 'filter_backends', [])
+        if any(hasattr(backend, 'get_ordering') for backend in filter_backends):
+            # Ordering is chosen by the client.
+            return super().get_ordering(request, queryset, view)
+
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        if not ordering or not all(isinstance(field, str) for field in ordering):
+            ordering = ['pk']
+        return tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Return a page of the queryset or ``None`` if the client opted out."""
+        value = request.query_params.get(self.paginate_query_param, '')
+        if value.lower() in FALSE_VALUES:
+            return None
+
+        return super().paginate_queryset(queryset, request, view)
@@ -1,5 +1,35 @@
-from rest_framework import parsers
+""".. Ignore pydocstyle D400.
 
+================
+Core API parsers
+================
+
+"""
+from django.core.exceptions import ValidationError as DjangoValidationError
+
+from rest_framework import exceptions, parsers
+
+
+class UploadValidationMixin:
+    """Report validation errors raised by upload handlers.
+
+    Errors raised while the files are being received are reported as
+    errors of the ``file`` field.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """Parse the uploaded files."""
+        try:
+            return super().parse(stream, media_type, parser_context)
+        except DjangoValidationError as error:
+            raise exceptions.ValidationError({'file': error.messages})
+
+
+class ImageUploadParser(UploadValidationMixin, parsers.FileUploadParser):
+    """Parser for raw JPEG uploads."""
 
-class ImageUploadParser(parsers.FileUploadParser):
     media_type = 'image/jpeg'
+
+
+class ImageMultiPartParser(UploadValidationMixin, parsers.MultiPartParser):
+    """Parser for multipart uploads of several images."""
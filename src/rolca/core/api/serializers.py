@@ -7,6 +7,9 @@ Core API serializers
 .. autoclass:: rolca.core.api.serializers.FileSerializer
     :members:
 
+.. autoclass:: rolca.core.api.serializers.UploadSessionSerializer
+    :members:
+
 .. autoclass:: rolca.core.api.serializers.PhotoSerializer
     :members:
 
@@ -16,21 +19,103 @@ Core API serializers
 .. autoclass:: rolca.core.api.serializers.ContestSerializer
     :members:
 
+.. autoclass:: rolca.core.api.serializers.SparseFieldsMixin
+    :members:
+
+.. autoclass:: rolca.core.api.serializers.SubmissionListSerializer
+    :members:
+
 """
-from rest_framework import serializers
+from collections import Counter
 
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Case, Value, When, prefetch_related_objects
+from django.utils.functional import cached_property
+
+from rest_framework import permissions, serializers
+
+from rolca.core.archive import invalidate_contest_archives
+from rolca.core.counters import change_theme_counters
 from rolca.core.models import (
     Author,
     Contest,
+    Derivative,
     File,
     Institution,
     Submission,
     SubmissionSet,
     Theme,
+    UploadSession,
 )
+from rolca.core.resumable import start_upload
+
+
+def parse_field_paths(value):
+    """Parse comma separated dotted field paths into a tree of dicts."""
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in path.strip().split('.'):
+            if name:
+                node = node.setdefault(name, {})
+    return tree
+
+
+class SparseFieldsMixin:
+    """Serializer mixin rendering only fields requested by the client.
+
+    Read requests can select fields with ``fields`` query parameter
+    (e.g. ``?fields=id,title,files.thumbnail``) and nested serializers
+    with ``expand`` query parameter (e.g. ``?expand=author``). Nested
+    serializers are rendered if they are expanded or if their fields are
+    selected. Both parameters are optional and apply only to serializers
+    used by the view.
+    """
+
+    def _get_field_path(self):
+        """Return names of fields leading from the root to the serializer."""
+        path, node = [], self
+        while node.parent is not None:
+            if node.field_name:
+                path.append(node.field_name)
+            node = node.parent
+        return path[::-1]
+
+    def _get_requested_tree(self, param):
+        """Return requested subtree of the serializer or ``None`` for all."""
+        request = self.context.get('request')
+        if 'view' not in self.context or request is None:
+            return None
+        if request.method not in permissions.SAFE_METHODS:
+            return None
+        if param not in request.query_params:
+            return None
 
+        tree = parse_field_paths(request.query_params[param])
+        for name in self._get_field_path():
+            tree = tree.get(name, {})
+        return tree
+
+    @cached_property
+    def fields(self):
+        """Return fields requested by the client."""
+        fields = super().fields
+
+        selected = self._get_requested_tree('fields') or None
+        expanded = self._get_requested_tree('expand')
+        for name, field in list(fields.items()):
+            if selected is not None and name not in selected:
+                del fields[name]
+            elif isinstance(field, serializers.BaseSerializer):
+                if expanded is not None and name not in expanded:
+                    if not (selected and selected[name]):
+                        del fields[name]
 
-class BaseSerializer(serializers.ModelSerializer):
+        return fields
+
+
+class BaseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Base serializer for Rolca models."""
 
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
@@ -48,19 +133,78 @@ class IdRelatedSerializer(serializers.Serializer):
     id = serializers.IntegerField()
 
 
+class DerivativeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Serializer for Derivative objects."""
+
+    class Meta:
+        """Serializer configuration."""
+
+        model = Derivative
+        fields = ['size', 'format', 'image', 'width', 'height']
+        read_only_fields = fields
+
+
 class FileSerializer(BaseSerializer):
     """Serializer for File objects."""
 
+    derivatives = DerivativeSerializer(many=True, read_only=True)
+
     class Meta(BaseSerializer.Meta):
         """Serializer configuration."""
 
         model = File
-        fields = BaseSerializer.Meta.fields + ['file', 'thumbnail']
+        fields = BaseSerializer.Meta.fields + [
+            'file',
+            'thumbnail',
+            'status',
+            'width',
+            'height',
+            'file_size',
+            'format',
+            'taken',
+            'camera',
+            'derivatives',
+        ]
+        read_only_fields = BaseSerializer.Meta.read_only_fields + [
+            'status',
+            'width',
+            'height',
+            'file_size',
+            'format',
+            'taken',
+            'camera',
+        ]
         extra_kwargs = {
+            # Thumbnail is ``None`` until it is generated.
             'thumbnail': {'required': False},
         }
 
 
+class UploadSessionSerializer(BaseSerializer):
+    """Serializer for UploadSession objects."""
+
+    class Meta(BaseSerializer.Meta):
+        """Serializer configuration."""
+
+        model = UploadSession
+        fields = BaseSerializer.Meta.fields + [
+            'filename',
+            'size',
+            'offset',
+            'width',
+            'height',
+        ]
+        read_only_fields = BaseSerializer.Meta.read_only_fields + [
+            'offset',
+            'width',
+            'height',
+        ]
+
+    def create(self, validated_data):
+        """Create the session together with its partial file."""
+        return start_upload(**validated_data)
+
+
 class InstitutionSerializer(BaseSerializer):
     """Serializer for Author objects."""
 
@@ -90,6 +234,8 @@ class AuthorSerializer(BaseSerializer):
             'club',
             'distinction',
         ]
+        # User is read by ``get_email``.
+        select_related = ['user']
 
     def get_email(self, author):
         """Return author's email for superusers, ``None`` field otherwise."""
@@ -99,14 +245,123 @@ class AuthorSerializer(BaseSerializer):
         return author.user.email
 
 
+def clean_pks(model, values):
+    """Return valid primary keys of the model among the given values."""
+    pks = []
+    for value in values:
+        try:
+            pk = model._meta.pk.to_python(value)
+        except (DjangoValidationError, TypeError, ValueError):
+            continue
+        if pk is not None:
+            pks.append(pk)
+    return pks
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key field using objects loaded by the list serializer."""
+
+    def to_internal_value(self, data):
+        """Return the object loaded in bulk if available."""
+        bulk_objects = getattr(self.parent, 'bulk_objects', None)
+        if bulk_objects is None:
+            return super().to_internal_value(data)
+
+        pks = clean_pks(self.get_queryset().model, [data])
+        if not pks:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return bulk_objects[self.field_name][pks[0]]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+
+
+class SubmissionListSerializer(serializers.ListSerializer):
+    """List serializer validating and creating submissions in bulk.
+
+    Authors, themes and files referenced by all submissions are loaded
+    with one query per model before the submissions are validated.
+    Submissions are inserted with a single query and their files are
+    attached with a single update.
+    """
+
+    def _load_objects(self, data):
+        """Return objects referenced by submissions mapped by primary keys."""
+        ids = {'author': [], 'theme': [], 'files': []}
+        for item in data if isinstance(data, list) else []:
+            if not isinstance(item, dict):
+                continue
+            if isinstance(item.get('author'), dict):
+                ids['author'].append(item['author'].get('id'))
+            ids['theme'].append(item.get('theme'))
+            if isinstance(item.get('files'), list):
+                ids['files'].extend(
+                    file.get('id') for file in item['files'] if isinstance(file, dict)
+                )
+
+        querysets = {
+            'author': Author.objects.all(),
+            'theme': self.child.fields['theme'].get_queryset(),
+            'files': File.objects.all(),
+        }
+        return {
+            name: queryset.in_bulk(clean_pks(queryset.model, ids[name]))
+            for name, queryset in querysets.items()
+        }
+
+    def to_internal_value(self, data):
+        """Validate submissions against objects loaded in bulk."""
+        self.child.bulk_objects = self._load_objects(data)
+        try:
+            return super().to_internal_value(data)
+        finally:
+            self.child.bulk_objects = None
+
+    @transaction.atomic
+    def create(self, validated_data):
+        """Create all submissions and attach their files."""
+        files = [attrs.pop('files') for attrs in validated_data]
+        submissions = Submission.objects.bulk_create(
+            [Submission(**attrs) for attrs in validated_data]
+        )
+
+        file_submissions = {
+            file.pk: submission.pk
+            for submission, submission_files in zip(submissions, files)
+            for file in submission_files
+        }
+        if file_submissions:
+            File.objects.filter(pk__in=file_submissions).update(
+                submission=Case(
+                    *[
+                        When(pk=file_pk, then=Value(submission_pk))
+                        for file_pk, submission_pk in file_submissions.items()
+                    ]
+                )
+            )
+
+        # Bulk inserts don't send ``post_save`` signals.
+        theme_counts = Counter(submission.theme_id for submission in submissions)
+        for theme_id, count in theme_counts.items():
+            change_theme_counters(theme_id, total=count)
+        invalidate_contest_archives(contest__themes__in=list(theme_counts))
+
+        prefetch_related_objects(submissions, 'files')
+        return submissions
+
+
 class SubmissionSerializer(BaseSerializer):
     """Serializer for Submission objects."""
 
-    theme = serializers.PrimaryKeyRelatedField(queryset=Theme.objects.all())
+    theme = BulkPrimaryKeyRelatedField(queryset=Theme.objects.all())
+
+    #: objects loaded by ~`SubmissionListSerializer` mapped by primary keys
+    bulk_objects = None
 
     class Meta(BaseSerializer.Meta):
         """Serializer configuration."""
 
+        list_serializer_class = SubmissionListSerializer
         model = Submission
         fields = BaseSerializer.Meta.fields + [
             'author',
@@ -131,11 +386,22 @@ class SubmissionSerializer(BaseSerializer):
 
     def validate_files(self, value):
         file_ids = [file['id'] for file in value]
+        if self.bulk_objects is not None:
+            files = self.bulk_objects['files']
+            return [files[pk] for pk in file_ids if pk in files]
         return File.objects.filter(id__in=file_ids)
 
     def validate_author(self, value):
+        if self.bulk_objects is not None:
+            try:
+                return self.bulk_objects['author'][value['id']]
+            except KeyError:
+                raise serializers.ValidationError(
+                    'Invalid pk "{}" - object does not exist.'.format(value['id'])
+                )
         return Author.objects.get(pk=value['id'])
 
+    @transaction.atomic
     def create(self, validated_data):
         files = validated_data.pop('files')
         submission = Submission.objects.create(**validated_data)
@@ -183,7 +449,7 @@ class ThemeSerializer(BaseSerializer):
         ]
 
     def get_submissions_number(self, theme):
-        return theme.submission_set.count()
+        return theme.n_submissions
 
 
 class ContestSerializer(BaseSerializer):
@@ -34,11 +34,13 @@ from rolca.core.api.views import (
     InstitutionViewSet,
     SubmissionSetViewSet,
     SubmissionViewSet,
+    UploadSessionViewSet,
 )
 
 routeList = (
     (r'author', AuthorViewSet),
     (r'file', FileViewSet),
+    (r'upload', UploadSessionViewSet),
     (r'submission', SubmissionViewSet),
     (r'submissionset', SubmissionSetViewSet),
     (r'contest', ContestViewSet),
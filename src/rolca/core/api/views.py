@@ -10,22 +10,37 @@ Core API views
 .. autoclass:: rolca.core.api.views.ContestViewSet
     :members:
 
+.. autoclass:: rolca.core.api.views.UploadSessionViewSet
+    :members:
+
 """
+import functools
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
 from django.db.models import Q
+from django.dispatch import receiver
 from django.utils import timezone
 
 from rest_framework import exceptions, mixins, permissions, status, viewsets
+from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from rolca.core.api.compiled import CompiledReadMixin
+from rolca.core.api.conditional import ConditionalGetMixin
 from rolca.core.api.filters import (
     ContestFilter,
     InstitutionFilter,
     SubmissionFilter,
     SubmissionSetFilter,
 )
-from rolca.core.api.parsers import ImageUploadParser
+from rolca.core.api.optimization import QueryOptimizationMixin
+from rolca.core.api.pagination import CursorPagination
+from rolca.core.api.parsers import ImageMultiPartParser, ImageUploadParser
 from rolca.core.api.permissions import AdminOrReadOnly
 from rolca.core.api.serializers import (
     AuthorSerializer,
@@ -34,6 +49,7 @@ from rolca.core.api.serializers import (
     InstitutionSerializer,
     SubmissionSerializer,
     SubmissionSetSerializer,
+    UploadSessionSerializer,
 )
 from rolca.core.models import (
     Author,
@@ -42,11 +58,49 @@ from rolca.core.models import (
     Institution,
     Submission,
     SubmissionSet,
+    Theme,
+    UploadSession,
 )
+from rolca.core.outbox import queue_email
+from rolca.core.resumable import append_chunk, finalize_upload
+from rolca.core.uploadhandler import ImageLimitUploadHandler, get_upload_handlers
 
 logger = logging.getLogger(__name__)
 
 
+def get_max_batch_upload():
+    """Return max number of photos uploaded in a single request.
+
+    The limit is configured with ``ROLCA_MAX_BATCH_UPLOAD`` setting.
+    """
+    return getattr(settings, 'ROLCA_MAX_BATCH_UPLOAD', 10)
+
+
+@functools.lru_cache(maxsize=None)
+def get_upload_pool():
+    """Return thread pool shared by all batch uploads in the process.
+
+    Size of the pool is configured with ``ROLCA_UPLOAD_WORKERS`` setting,
+    so the number of photos processed at once is bounded regardless of
+    the number of concurrent requests.
+    """
+    return ThreadPoolExecutor(
+        max_workers=getattr(settings, 'ROLCA_UPLOAD_WORKERS', 4),
+        thread_name_prefix='rolca-upload',
+    )
+
+
+@receiver(setting_changed)
+def upload_pool_setting_handler(setting, **kwargs):
+    """Recreate the upload pool when its size setting changes."""
+    if setting != 'ROLCA_UPLOAD_WORKERS':
+        return
+
+    if get_upload_pool.cache_info().currsize:
+        get_upload_pool().shutdown(wait=False)
+    get_upload_pool.cache_clear()
+
+
 class FileViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
     """API viewset for File objects."""
 
@@ -55,16 +109,169 @@ class FileViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
     queryset = File.objects.none()
     permission_classes = (permissions.IsAuthenticated,)
 
+    def initialize_request(self, request, *args, **kwargs):
+        """Validate and hash uploaded files while they are being received."""
+        # Action is only set once the request is initialized.
+        action = self.action_map.get(request.method.lower())
+        max_files = get_max_batch_upload() if action == 'batch' else 1
+        request.upload_handlers = [
+            ImageLimitUploadHandler(request, max_files=max_files)
+        ] + get_upload_handlers(request)
+        return super().initialize_request(request, *args, **kwargs)
+
+    def _prepare_file(self, upload):
+        """Validate the uploaded photo and process it without saving.
+
+        This runs on the upload pool, whose threads are kept alive, so
+        database connections opened by them are closed afterwards.
+        """
+        try:
+            serializer = self.get_serializer(data={'file': upload})
+            if not serializer.is_valid():
+                return None, serializer.errors
+
+            file = File(**serializer.validated_data)
+            try:
+                file.prepare()
+            except (OSError, ValueError):
+                # Image is only decoded when its thumbnail is generated.
+                logger.info("Cannot process uploaded photo.", exc_info=True)
+                return None, {'file': ["Upload a valid image."]}
+            return file, {}
+        finally:
+            close_old_connections()
+
+    @action(detail=False, methods=['post'], parser_classes=[ImageMultiPartParser])
+    def batch(self, request):
+        """Upload several photos in a single multipart request.
+
+        Photos are sent in the ``file`` fields. They are validated and
+        processed in parallel on the shared upload pool and are saved
+        together, only if all of them are valid. In the content-addressed
+        mode images are generated on save, as only then it is known if
+        the blob already exists, so they are not processed in parallel.
+        """
+        uploads = request.FILES.getlist('file')
+        if not uploads:
+            raise exceptions.ValidationError({'file': ["No files were uploaded."]})
+        max_files = get_max_batch_upload()
+        if len(uploads) > max_files:
+            raise exceptions.ValidationError(
+                {'file': ["Max {} files can be uploaded at once.".format(max_files)]}
+            )
+
+        results = list(get_upload_pool().map(self._prepare_file, uploads))
+        errors = [errors for _, errors in results]
+        if any(errors):
+            raise exceptions.ValidationError(errors)
+
+        files = [file for file, _ in results]
+        with transaction.atomic():
+            for file in files:
+                file.save()
+
+        serializer = self.get_serializer(files, many=True)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class UploadSessionViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """API viewset for resumable uploads.
+
+    Session is created with the name and the size of the photo. Chunks
+    are sent as raw request bodies with ``PATCH`` requests, where the
+    ``Upload-Offset`` header must match the number of bytes already
+    received. Interrupted upload is continued by retrieving the session
+    to get its current offset. Completed upload is turned into a file
+    with ``POST`` request to the ``finalize`` endpoint.
+
+    Uploads exceeding the limits or failing validation are discarded.
+    """
+
+    serializer_class = UploadSessionSerializer
+    queryset = UploadSession.objects.all()
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get_queryset(self):
+        """Return only user's own upload sessions."""
+        return self.queryset.filter(user=self.request.user)
+
+    def _lock_session(self):
+        """Return the session locked for the current transaction."""
+        return UploadSession.objects.select_for_update().get(pk=self.get_object().pk)
+
+    def _discard(self, session, error):
+        """Delete the session and report the validation error."""
+        session.delete()
+        raise exceptions.ValidationError({'file': error.messages})
+
+    def partial_update(self, request, *args, **kwargs):
+        """Append the chunk in the request body to the upload."""
+        try:
+            offset = int(request.META['HTTP_UPLOAD_OFFSET'])
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except (KeyError, ValueError):
+            raise exceptions.ValidationError(
+                {'offset': ["Valid Upload-Offset header is required."]}
+            )
 
-class InstitutionViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+        try:
+            with transaction.atomic():
+                session = self._lock_session()
+                if offset != session.offset:
+                    return Response(
+                        self.get_serializer(session).data,
+                        status=status.HTTP_409_CONFLICT,
+                        headers={'Upload-Offset': session.offset},
+                    )
+                if length:
+                    append_chunk(session, request.stream, length)
+        except DjangoValidationError as error:
+            self._discard(session, error)
+
+        return Response(
+            self.get_serializer(session).data,
+            headers={'Upload-Offset': session.offset},
+        )
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, *args, **kwargs):
+        """Create file from the completed upload."""
+        try:
+            with transaction.atomic():
+                session = self._lock_session()
+                if not session.is_complete():
+                    raise exceptions.ValidationError(
+                        {'offset': ["Upload is not complete."]}
+                    )
+                file = finalize_upload(session)
+        except DjangoValidationError as error:
+            self._discard(session, error)
+
+        serializer = FileSerializer(file, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class InstitutionViewSet(
+    ConditionalGetMixin,
+    QueryOptimizationMixin,
+    mixins.ListModelMixin,
+    viewsets.GenericViewSet,
+):
+    pagination_class = CursorPagination
     queryset = Institution.objects.all()
     serializer_class = InstitutionSerializer
     filter_class = InstitutionFilter
 
 
-class AuthorViewSet(viewsets.ModelViewSet):
+class AuthorViewSet(QueryOptimizationMixin, viewsets.ModelViewSet):
     """API viewset for Author objects."""
 
+    pagination_class = CursorPagination
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
     permission_classes = (permissions.IsAuthenticated,)
@@ -77,9 +284,10 @@ class AuthorViewSet(viewsets.ModelViewSet):
         return queryset.objects.filter(user=self.request.user)
 
 
-class SubmissionViewSet(viewsets.ModelViewSet):
+class SubmissionViewSet(QueryOptimizationMixin, viewsets.ModelViewSet):
     """API view Submission objects."""
 
+    pagination_class = CursorPagination
     serializer_class = SubmissionSerializer
     queryset = Submission.objects.all()
     permission_classes = (permissions.IsAuthenticated,)
@@ -120,7 +328,9 @@ class SubmissionViewSet(viewsets.ModelViewSet):
         )
 
         if contest.confirmation_email and request.user.email:
-            contest.confirmation_email.send(request.user.email)
+            queue_email(
+                contest.confirmation_email, request.user.email, user=request.user
+            )
 
         headers = self.get_success_headers(serializer.data)
         return Response(
@@ -144,11 +354,13 @@ class SubmissionViewSet(viewsets.ModelViewSet):
 
 
 class SubmissionSetViewSet(
+    QueryOptimizationMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.DestroyModelMixin,
     viewsets.GenericViewSet,
 ):
+    pagination_class = CursorPagination
     queryset = SubmissionSet.objects.all()
     serializer_class = SubmissionSetSerializer
     permission_classes = (permissions.IsAuthenticated,)
@@ -181,10 +393,20 @@ class SubmissionSetViewSet(
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class ContestViewSet(viewsets.ModelViewSet):
+class ContestViewSet(
+    ConditionalGetMixin,
+    CompiledReadMixin,
+    QueryOptimizationMixin,
+    viewsets.ModelViewSet,
+):
     """API view Contest objects."""
 
+    pagination_class = CursorPagination
     queryset = Contest.objects.all()
     serializer_class = ContestSerializer
     permission_classes = (AdminOrReadOnly,)
     filter_class = ContestFilter
+
+    def get_conditional_querysets(self, queryset):
+        """Return querysets of contests and their themes."""
+        return [queryset, Theme.objects.filter(contest__in=queryset)]
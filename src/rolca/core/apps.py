@@ -7,3 +7,8 @@ class RolcaCoreConfig(AppConfig):
 
     name = 'rolca.core'
     verbose_name = "Rolca core"
+
+    def ready(self):
+        """Application initialization."""
+        # Register signals handlers
+        from . import signals  # noqa: F401
@@ -0,0 +1,225 @@
+""".. Ignore pydocstyle D400.
+
+=============
+Core archives
+=============
+
+Contest archives are produced as a stream of ZIP chunks, so the whole
+archive never has to be held in memory. Photos are stored without
+recompression (``ZIP_STORED``) and ZIP64 extensions are used when the
+archive grows past the classic ZIP limits.
+
+Once the contest is closed, the archive is built by a background worker
+and stored under ``MEDIA_ROOT``, so repeated downloads can be served
+directly from the disk. Stored archive is invalidated (and rebuilt)
+whenever submissions of the contest change.
+
+Archives are stored under random names, which change with every build,
+so they cannot be guessed from the contest and are only reachable
+through the download view. The previous archive is deleted by the
+background worker once it is replaced.
+
+.. autofunction:: rolca.core.archive.iter_contest_archive
+
+.. autofunction:: rolca.core.archive.build_contest_archive
+
+.. autofunction:: rolca.core.archive.request_contest_archive
+
+.. autofunction:: rolca.core.archive.invalidate_contest_archives
+
+"""
+import os
+import secrets
+import tempfile
+import zipfile
+
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.text import slugify
+
+from rolca.core.deletion import flush_deletions, schedule_deletion
+from rolca.core.models import Contest, ContestArchive, File, Submission, Theme
+from rolca.core.protocol import TYPE_ARCHIVE
+from rolca.core.worker import send_to_worker
+
+#: directory (relative to ``MEDIA_ROOT``) where built archives are stored
+ARCHIVE_DIR = 'archives'
+
+
+class StreamBuffer:
+    """Unseekable file-like object collecting data written by ``ZipFile``.
+
+    ``ZipFile`` detects that the object has no ``seek`` method and
+    writes local headers with data descriptors instead of seeking back
+    to patch them, which makes the output suitable for streaming.
+    """
+
+    def __init__(self):
+        """Initialize empty buffer."""
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        """Store written data and return its length."""
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        """Return the number of bytes written so far."""
+        return self._position
+
+    def flush(self):
+        """Do nothing, data is kept until it is popped."""
+
+    def pop(self):
+        """Return data written since the last call and empty the buffer."""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def get_archive_filename(contest):
+    """Return filename of the archive for the given contest."""
+    return '{}.zip'.format(slugify(contest.title))
+
+
+def _iter_archive_entries(contest):
+    """Yield ``(path, file)`` tuples of all photos in the contest.
+
+    Directory entries are yielded with ``file`` set to ``None``.
+    """
+    contest_dir = slugify(contest.title)
+    submission_qs = Submission.objects.select_related('author').prefetch_related(
+        Prefetch(
+            'files', queryset=File.objects.only('id', 'submission', 'file', 'modified')
+        )
+    )
+
+    for theme in Theme.objects.filter(contest=contest):
+        theme_dir = os.path.join(contest_dir, slugify(theme.title))
+        yield theme_dir + '/', None
+
+        no_title_count = 0
+        for submission in submission_qs.filter(theme=theme).iterator(chunk_size=100):
+            if not submission.title:
+                no_title_count += 1
+            name = slugify(
+                '{}-{}'.format(submission.author, submission.title or no_title_count)
+            )
+
+            files = list(submission.files.all())
+            for index, file in enumerate(files, start=1):
+                file_name = name if len(files) == 1 else '{}-{}'.format(name, index)
+                yield os.path.join(theme_dir, file_name + '.jpg'), file
+
+
+def _iter_zip_chunks(contest):
+    """Write the archive into a stream buffer and yield written data."""
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        for path, file in _iter_archive_entries(contest):
+            if file is None:
+                archive.writestr(zipfile.ZipInfo(path), '')
+                yield buffer.pop()
+                continue
+
+            zip_info = zipfile.ZipInfo(path, date_time=file.modified.timetuple()[:6])
+            zip_info.compress_type = zipfile.ZIP_STORED
+            # Known size lets ``ZipFile`` decide whether ZIP64 is needed.
+            zip_info.file_size = file.file.size
+
+            with file.file.open('rb') as source, archive.open(
+                zip_info, mode='w'
+            ) as target:
+                for chunk in source.chunks():
+                    target.write(chunk)
+                    yield buffer.pop()
+
+            yield buffer.pop()
+
+    # Central directory is written when the archive is closed.
+    yield buffer.pop()
+
+
+def iter_contest_archive(contest):
+    """Yield chunks of the ZIP archive with all photos of the contest.
+
+    Only a single chunk of a single photo is kept in memory at any time,
+    so memory consumption does not depend on the size of the contest.
+    """
+    return (chunk for chunk in _iter_zip_chunks(contest) if chunk)
+
+
+def build_contest_archive(contest):
+    """Build the archive of the contest and store it under ``MEDIA_ROOT``.
+
+    The archive is first written to a temporary file which is then moved
+    under a new random name, so a partially written archive is never
+    served.
+    """
+    archive, _ = ContestArchive.objects.get_or_create(contest=contest)
+    snapshot = timezone.now()
+
+    name = os.path.join(ARCHIVE_DIR, '{}.zip'.format(secrets.token_hex(16)))
+    path = archive.file.storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            for chunk in iter_contest_archive(contest):
+                fh.write(chunk)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+    ContestArchive.objects.filter(pk=archive.pk).update(
+        file=name, built=snapshot, modified=timezone.now()
+    )
+
+    if archive.file:
+        schedule_deletion(archive.file.name)
+        flush_deletions()
+
+
+def request_contest_archive(contest, force=False):
+    """Request a background build of the contest archive.
+
+    Request is skipped if a build is already pending, unless ``force``
+    is set.
+    """
+    archive, _ = ContestArchive.objects.get_or_create(contest=contest)
+    if archive.is_pending() and not force:
+        return
+
+    now = timezone.now()
+    ContestArchive.objects.filter(pk=archive.pk).update(requested=now, modified=now)
+    transaction.on_commit(lambda: send_to_worker(TYPE_ARCHIVE, contest_pk=contest.pk))
+
+
+def invalidate_contest_archives(**filters):
+    """Invalidate archives matching given filters.
+
+    Archives of already closed contests are rebuilt once the current
+    transaction is committed.
+    """
+    contest_pks = list(
+        ContestArchive.objects.filter(**filters).values_list('contest', flat=True)
+    )
+    if not contest_pks:
+        return
+
+    now = timezone.now()
+    ContestArchive.objects.filter(contest__in=contest_pks).update(
+        invalidated=now, modified=now
+    )
+
+    def rebuild():
+        closed = Contest.objects.filter(pk__in=contest_pks, end_date__lt=timezone.now())
+        for contest in closed:
+            request_contest_archive(contest)
+
+    transaction.on_commit(rebuild)
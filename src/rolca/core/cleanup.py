@@ -0,0 +1,156 @@
+""".. Ignore pydocstyle D400.
+
+============
+Core cleanup
+============
+
+Photos are uploaded before the submission is created, so abandoned
+forms leave behind ~`rolca.core.models.File` objects without a
+submission. They are deleted together with their stored images once
+they are older than ``ROLCA_ORPHAN_FILE_TTL`` setting (in seconds).
+Unfinished resumable uploads are removed after the same time.
+
+Files are deleted in batches and their stored images are deleted by
+~`rolca.core.deletion` at the end of the collection.
+
+Collection runs on the background worker. It is triggered by new
+uploads at most once per ``ROLCA_ORPHAN_COLLECTION_INTERVAL`` seconds,
+as orphans can only appear when files are uploaded. It can also be run
+with ``collectorphans`` management command.
+
+.. autofunction:: rolca.core.cleanup.collect_orphans
+
+.. autofunction:: rolca.core.cleanup.schedule_orphan_collection
+
+"""
+import datetime
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from rolca.core.deletion import delete_stored_files
+from rolca.core.models import File, UploadSession
+from rolca.core.protocol import TYPE_COLLECT_ORPHANS
+from rolca.core.worker import send_to_worker
+
+logger = logging.getLogger(__name__)
+
+#: default age in seconds after which unused uploads are deleted
+DEFAULT_ORPHAN_TTL = 24 * 60 * 60
+
+#: default min time in seconds between two collections
+DEFAULT_COLLECTION_INTERVAL = 60 * 60
+
+#: cache key marking a recently scheduled collection
+COLLECTION_CACHE_KEY = 'rolca-core-orphan-collection'
+
+
+def _stored_size(files):
+    """Return size of images that are deleted together with the files."""
+    blob_pks = {file.blob_id for file in files if file.blob_id is not None}
+    shared_blobs = set()
+    if blob_pks:
+        # Images are still referenced by files outside of the batch.
+        shared_blobs = set(
+            File.objects.filter(blob__in=blob_pks)
+            .exclude(pk__in=[file.pk for file in files])
+            .values_list('blob', flat=True)
+        )
+
+    # Files sharing a blob refer to the same stored images.
+    images = {}
+    for file in files:
+        if file.blob_id in shared_blobs:
+            continue
+        images[file.file.name] = file.file
+        images[file.thumbnail.name] = file.thumbnail
+        for derivative in file.derivatives.all():
+            images[derivative.image.name] = derivative.image
+
+    size = 0
+    for name, image in images.items():
+        if not name:
+            continue
+        try:
+            size += image.size
+        except OSError:
+            pass
+    return size
+
+
+def _collect_files(cutoff, batch_size):
+    """Delete orphaned files in batches and return their count and size."""
+    queryset = (
+        File.objects.filter(submission=None, created__lt=cutoff)
+        .prefetch_related('derivatives')
+        .order_by('pk')
+    )
+
+    count, size, last_pk = 0, 0, 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return count, size
+
+        last_pk = batch[-1].pk
+        size += _stored_size(batch)
+        # Stored images are scheduled for deletion by the signal handlers
+        # and related backups are deleted by the database cascade.
+        _, deleted = queryset.filter(pk__in=[file.pk for file in batch]).delete()
+        count += deleted.get(File._meta.label, 0)
+
+
+def _collect_upload_sessions(cutoff, batch_size):
+    """Delete unfinished uploads and return their count and size."""
+    queryset = UploadSession.objects.filter(modified__lt=cutoff).order_by('pk')
+
+    count, size, last_pk = 0, 0, 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return count, size
+
+        for session in batch:
+            last_pk = session.pk
+            # Partial file is removed by the signal handler.
+            session.delete()
+            count += 1
+            size += session.offset
+
+
+def collect_orphans(ttl=None, batch_size=100):
+    """Delete orphaned files and unfinished uploads older than ``ttl``.
+
+    Objects are loaded and deleted in batches of ``batch_size``. Return
+    dictionary with the number of deleted ``files`` and ``sessions``
+    and the number of reclaimed ``bytes`` in the storage.
+    """
+    if ttl is None:
+        ttl = getattr(settings, 'ROLCA_ORPHAN_FILE_TTL', DEFAULT_ORPHAN_TTL)
+    cutoff = timezone.now() - datetime.timedelta(seconds=ttl)
+
+    files, files_size = _collect_files(cutoff, batch_size)
+    sessions, sessions_size = _collect_upload_sessions(cutoff, batch_size)
+    delete_stored_files(batch_size=batch_size)
+
+    return {
+        'files': files,
+        'sessions': sessions,
+        'bytes': files_size + sessions_size,
+    }
+
+
+def schedule_orphan_collection():
+    """Trigger collection on the background worker unless done recently."""
+    interval = getattr(
+        settings, 'ROLCA_ORPHAN_COLLECTION_INTERVAL', DEFAULT_COLLECTION_INTERVAL
+    )
+    if interval is None:
+        return
+
+    # Adding the key is atomic, so only one process schedules the task.
+    if cache.add(COLLECTION_CACHE_KEY, True, timeout=interval):
+        transaction.on_commit(lambda: send_to_worker(TYPE_COLLECT_ORPHANS))
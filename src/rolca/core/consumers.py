@@ -0,0 +1,72 @@
+""".. Ignore pydocstyle D400.
+
+==============
+Core consumers
+==============
+
+.. autoclass:: rolca.core.consumers.CoreConsumer
+    :members:
+
+"""
+import logging
+
+from channels.consumer import SyncConsumer
+
+from rolca.core.archive import build_contest_archive
+from rolca.core.cleanup import collect_orphans
+from rolca.core.deletion import delete_stored_files
+from rolca.core.models import Contest, File
+from rolca.core.outbox import send_emails
+
+logger = logging.getLogger(__name__)
+
+
+class CoreConsumer(SyncConsumer):
+    """Consumer for background tasks of the core application."""
+
+    def core_archive(self, message):
+        """Build archive for ~`rolca.core.models.Contest` object."""
+        try:
+            contest = Contest.objects.get(pk=message['contest_pk'])
+        except Contest.DoesNotExist:
+            logger.warning("Contest of requested archive does not exist.")
+            return
+
+        build_contest_archive(contest)
+
+    def core_thumbnail(self, message):
+        """Generate thumbnail for ~`rolca.core.models.File` object."""
+        try:
+            file = File.objects.get(pk=message['file_pk'], status=File.PROCESSING)
+        except File.DoesNotExist:
+            return
+
+        try:
+            file.process()
+        except Exception:
+            logger.exception("Thumbnail generation failed.")
+            File.objects.filter(pk=file.pk).update(status=File.ERROR)
+
+    def core_collect_orphans(self, message):
+        """Delete orphaned files and unfinished uploads."""
+        result = collect_orphans()
+        logger.info(
+            "Deleted %d orphaned files and %d upload sessions, reclaimed %d bytes.",
+            result['files'],
+            result['sessions'],
+            result['bytes'],
+        )
+
+    def core_email(self, message):
+        """Send queued emails."""
+        result = send_emails()
+        if result['failed']:
+            logger.warning(
+                "Sent %d emails, %d failed and will be retried.",
+                result['sent'],
+                result['failed'],
+            )
+
+    def core_delete_storage(self, message):
+        """Delete files scheduled for deletion from the storage."""
+        delete_stored_files()
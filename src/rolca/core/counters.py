@@ -0,0 +1,112 @@
+""".. Ignore pydocstyle D400.
+
+=============
+Core counters
+=============
+
+Number of all and of paid submissions is stored on
+~`rolca.core.models.Theme` and ~`rolca.core.models.Contest` objects, so
+it doesn't have to be counted on every request.
+
+Counters are changed with ``F`` expressions, which are evaluated by the
+database, so concurrent changes are not lost. Total counters are
+maintained by the core signal handlers and paid counters by the payment
+application. Submissions moved to another theme with ``save`` are
+counted in the new theme. Changes made with queryset ``update`` are not
+tracked, the counters can be recomputed with ``repaircounters``
+management command.
+
+Changes of the counters are announced with ``theme_counters_changed``
+signal, so other applications can invalidate data derived from them.
+
+.. autodata:: rolca.core.counters.theme_counters_changed
+
+.. autofunction:: rolca.core.counters.change_theme_counters
+
+.. autofunction:: rolca.core.counters.change_counters
+
+.. autofunction:: rolca.core.counters.recompute_counters
+
+"""
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
+from django.utils import timezone
+
+from rolca.core.models import Contest, Submission, Theme
+
+#: signal sent with ``theme_id`` argument when counters of the theme change
+theme_counters_changed = Signal()
+
+
+def change_theme_counters(theme_id, total=0, paid=0):
+    """Change counters of the theme and its contest by the given values."""
+    changes = {
+        'n_submissions': F('n_submissions') + total,
+        'n_paid_submissions': F('n_paid_submissions') + paid,
+    }
+    # Changed theme invalidates cached responses. Contest's modification
+    # time is kept, as responses listing contests include their themes.
+    Theme.objects.filter(pk=theme_id).update(modified=timezone.now(), **changes)
+    Contest.objects.filter(themes=theme_id).update(**changes)
+    theme_counters_changed.send(sender=Theme, theme_id=theme_id)
+
+
+def change_counters(submissions, total=0, paid=0):
+    """Change counters by the given values for each of the submissions.
+
+    ``submissions`` is a queryset of ~`rolca.core.models.Submission`
+    objects.
+    """
+    theme_counts = (
+        submissions.order_by()
+        .values('theme')
+        .annotate(count=Count('pk', distinct=True))
+    )
+    for row in theme_counts:
+        change_theme_counters(
+            row['theme'], total=total * row['count'], paid=paid * row['count']
+        )
+
+
+def _count_subquery(queryset, field, aggregate):
+    """Return subquery aggregating ``queryset`` per the outer object."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(value=aggregate)
+            .values('value')
+        ),
+        0,
+    )
+
+
+def recompute_counters():
+    """Recompute counters of all themes and contests."""
+    n_paid_submissions = 0
+    if apps.is_installed('rolca.payment'):
+        n_paid_submissions = _count_subquery(
+            Submission.objects.filter(submissionset__payment__paid=True),
+            'theme',
+            Count('pk', distinct=True),
+        )
+
+    with transaction.atomic():
+        Theme.objects.update(
+            n_submissions=_count_subquery(
+                Submission.objects.all(), 'theme', Count('pk')
+            ),
+            n_paid_submissions=n_paid_submissions,
+        )
+        Contest.objects.update(
+            n_submissions=_count_subquery(
+                Theme.objects.all(), 'contest', Sum('n_submissions')
+            ),
+            n_paid_submissions=_count_subquery(
+                Theme.objects.all(), 'contest', Sum('n_paid_submissions')
+            ),
+        )
@@ -0,0 +1,158 @@
+""".. Ignore pydocstyle D400.
+
+=====================
+Core storage deletion
+=====================
+
+Stored images are not deleted during requests, as deleting a contest or
+a submission set can cascade to thousands of files. Instead, names of
+the images are recorded as ~`rolca.core.models.StorageDeletion` objects
+by the signal handlers of deleted objects. Cascaded deletes send them as
+well, so no image is left behind.
+
+Names are collected in ``pre_delete`` handlers and stored with a single
+query in ``post_delete`` handlers, which are sent after all objects
+deleted at once are collected. Once the transaction is committed, the
+background worker deletes the images in batches. Images still
+referenced by other objects, e.g. blobs in the content-addressed
+storage shared by several files, are kept. The journal is also emptied
+after orphaned uploads are collected. Deletion of files that may still
+be linked from rendered pages or cached responses can be delayed, such
+files are deleted by the first run after the delay.
+
+.. autofunction:: rolca.core.deletion.schedule_deletion
+
+.. autofunction:: rolca.core.deletion.flush_deletions
+
+.. autofunction:: rolca.core.deletion.delete_stored_files
+
+"""
+import datetime
+import logging
+import threading
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from rolca.core.models import (
+    ContentBlob,
+    Contest,
+    ContestArchive,
+    Derivative,
+    File,
+    StorageDeletion,
+)
+from rolca.core.protocol import TYPE_DELETE_STORAGE
+from rolca.core.worker import send_to_worker
+
+logger = logging.getLogger(__name__)
+
+#: fields of models that reference files in the storage
+REFERENCES = [
+    (File, 'file'),
+    (File, 'thumbnail'),
+    (Derivative, 'image'),
+    (ContentBlob, 'file'),
+    (ContentBlob, 'thumbnail'),
+    (ContestArchive, 'file'),
+    (Contest, 'header_image'),
+]
+
+_pending = threading.local()
+
+
+def schedule_deletion(*names):
+    """Schedule deletion of the stored files once they are flushed."""
+    if not hasattr(_pending, 'names'):
+        _pending.names = []
+    _pending.names.extend(name for name in names if name)
+
+
+def flush_deletions(delay=0):
+    """Store scheduled deletions and trigger the worker on commit.
+
+    Files are not deleted sooner than ``delay`` seconds from now.
+    """
+    names = getattr(_pending, 'names', None)
+    if not names:
+        return
+
+    _pending.names = []
+    delete_after = timezone.now() + datetime.timedelta(seconds=delay)
+    StorageDeletion.objects.bulk_create(
+        StorageDeletion(name=name, delete_after=delete_after) for name in names
+    )
+    transaction.on_commit(lambda: send_to_worker(TYPE_DELETE_STORAGE))
+
+
+def _get_referenced_names(names):
+    """Return names among the given ones still referenced by any object."""
+    referenced = set()
+    for model, field in REFERENCES:
+        referenced.update(
+            model.objects.filter(**{field + '__in': names}).values_list(
+                field, flat=True
+            )
+        )
+    return referenced
+
+
+def _delete_batch(last_pk, batch_size):
+    """Delete a batch of scheduled files following ``last_pk``.
+
+    Return the handled deletions.
+    """
+    with transaction.atomic():
+        # Locked deletions are handled by another worker.
+        deletions = list(
+            StorageDeletion.objects.filter(
+                pk__gt=last_pk, delete_after__lte=timezone.now()
+            )
+            .select_for_update(skip_locked=True)
+            .order_by('pk')[:batch_size]
+        )
+        if not deletions:
+            return deletions
+
+        names = {deletion.name for deletion in deletions}
+
+        # Lock blobs to serialize with uploads of the same content, and
+        # release the ones whose files were deleted with a queryset.
+        blob_pks = list(
+            ContentBlob.objects.filter(Q(file__in=names) | Q(thumbnail__in=names))
+            .select_for_update()
+            .values_list('pk', flat=True)
+        )
+        ContentBlob.objects.filter(pk__in=blob_pks, files=None).delete()
+
+        referenced = _get_referenced_names(names)
+        failed = set()
+        for name in names - referenced:
+            try:
+                default_storage.delete(name)
+            except Exception:
+                logger.exception("Cannot delete stored file %s.", name)
+                failed.add(name)
+
+        # Failed deletions are retried by the next run.
+        StorageDeletion.objects.filter(
+            pk__in=[deletion.pk for deletion in deletions]
+        ).exclude(name__in=failed).delete()
+
+    return deletions
+
+
+def delete_stored_files(batch_size=100):
+    """Delete all scheduled files in batches of ``batch_size``.
+
+    Return the number of handled deletions.
+    """
+    count, last_pk = 0, 0
+    while True:
+        deletions = _delete_batch(last_pk, batch_size)
+        count += len(deletions)
+        if len(deletions) < batch_size:
+            return count
+        last_pk = deletions[-1].pk
@@ -0,0 +1,124 @@
+""".. Ignore pydocstyle D400.
+
+=============
+Core governor
+=============
+
+Governor protecting the process from running out of memory while
+processing images.
+
+Images with more pixels than allowed by ``ROLCA_MAX_IMAGE_PIXELS``
+setting are rejected based on their headers, before they are decoded.
+Memory used by decoded bitmaps of all images processed concurrently in
+the process is limited by ``ROLCA_IMAGE_MEMORY_BUDGET`` setting (in
+bytes). Jobs exceeding the budget wait until enough memory is released,
+and a single job larger than the whole budget runs alone.
+
+Counters of processed, queued and rejected images are available through
+:func:`get_metrics`.
+
+.. autoclass:: rolca.core.governor.ImageGovernor
+    :members:
+
+.. autofunction:: rolca.core.governor.get_governor
+
+.. autofunction:: rolca.core.governor.get_metrics
+
+"""
+import contextlib
+import functools
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+logger = logging.getLogger(__name__)
+
+#: default max number of pixels of processed images
+DEFAULT_MAX_PIXELS = 100 * 10**6
+
+#: default memory budget for decoded bitmaps in bytes
+DEFAULT_MEMORY_BUDGET = 512 * 1024**2
+
+
+class ImageGovernor:
+    """Limit the pixel count and the memory of processed images."""
+
+    def __init__(self, memory_budget):
+        """Initialize governor with the memory budget in bytes."""
+        self.memory_budget = memory_budget
+        self._condition = threading.Condition()
+        self._reserved = 0
+        self._metrics = {
+            'processed': 0,
+            'queued': 0,
+            'rejected': 0,
+            'wait_time': 0.0,
+            'peak_reserved': 0,
+        }
+
+    def check(self, width, height):
+        """Check that the image has allowed number of pixels.
+
+        ``django.core.exceptions.ValidationError`` is raised otherwise.
+        """
+        max_pixels = getattr(settings, 'ROLCA_MAX_IMAGE_PIXELS', DEFAULT_MAX_PIXELS)
+        if width * height > max_pixels:
+            with self._condition:
+                self._metrics['rejected'] += 1
+            logger.warning("Rejected image with %dx%d pixels.", width, height)
+            raise ValidationError("Max photo size is {} pixels.".format(max_pixels))
+
+    @contextlib.contextmanager
+    def reserve(self, size):
+        """Reserve ``size`` bytes of the budget for the duration of the block.
+
+        The block is delayed until enough of the budget is available.
+        """
+        size = min(size, self.memory_budget)
+        with self._condition:
+            if self._reserved + size > self.memory_budget:
+                self._metrics['queued'] += 1
+                start = time.monotonic()
+                self._condition.wait_for(
+                    lambda: self._reserved + size <= self.memory_budget
+                )
+                self._metrics['wait_time'] += time.monotonic() - start
+
+            self._reserved += size
+            self._metrics['processed'] += 1
+            self._metrics['peak_reserved'] = max(
+                self._metrics['peak_reserved'], self._reserved
+            )
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._reserved -= size
+                self._condition.notify_all()
+
+    def get_metrics(self):
+        """Return a snapshot of the governor's counters."""
+        with self._condition:
+            return dict(self._metrics, reserved=self._reserved)
+
+
+@functools.lru_cache(maxsize=None)
+def get_governor():
+    """Return image governor shared by the whole process."""
+    return ImageGovernor(
+        getattr(settings, 'ROLCA_IMAGE_MEMORY_BUDGET', DEFAULT_MEMORY_BUDGET)
+    )
+
+
+def get_metrics():
+    """Return counters of the process-wide image governor.
+
+    Returned dictionary contains the number of ``processed``, ``queued``
+    and ``rejected`` images, total ``wait_time`` in seconds, and the
+    currently ``reserved`` and ``peak_reserved`` memory in bytes.
+    """
+    return get_governor().get_metrics()
@@ -0,0 +1,212 @@
+""".. Ignore pydocstyle D400.
+
+============
+Core imaging
+============
+
+Derivative engine producing downscaled versions of uploaded photos.
+
+The photo is decoded only once, at the lowest resolution still needed
+for the largest derivative. For JPEG images this uses the decoder's
+draft mode, which scales the image by 1/2, 1/4 or 1/8 while decoding,
+so the full resolution bitmap is never materialized. Smaller derivatives
+are then produced in a cascade from the larger ones.
+
+.. autofunction:: rolca.core.imaging.open_draft
+
+.. autofunction:: rolca.core.imaging.estimate_bitmap_size
+
+.. autofunction:: rolca.core.imaging.iter_scaled
+
+.. autofunction:: rolca.core.imaging.encode
+
+.. autofunction:: rolca.core.imaging.read_metadata
+
+.. autofunction:: rolca.core.imaging.read_jpeg_size
+
+"""
+import datetime
+import io
+import struct
+
+from PIL import Image
+
+#: size of the longer edge of thumbnails
+THUMBNAIL_SIZE = 400
+
+#: images are first reduced by an integer factor (which is fast) while
+#: staying at least this many times larger than the target size, and
+#: only then resampled with the Lanczos filter
+REDUCING_GAP = 2.0
+
+#: encoder options for supported formats
+FORMAT_OPTIONS = {
+    'JPEG': {'quality': 80, 'optimize': True, 'progressive': True},
+    'WEBP': {'quality': 80, 'method': 4},
+}
+
+#: bytes per pixel of decoded bitmaps, Pillow stores RGB pixels in 32 bits
+BITMAP_PIXEL_SIZE = 4
+
+#: file extensions of supported formats
+FORMAT_EXTENSIONS = {
+    'JPEG': '.jpg',
+    'WEBP': '.webp',
+}
+
+
+#: EXIF tags used for extracting metadata
+EXIF_IFD = 0x8769
+EXIF_MAKE = 0x010F
+EXIF_MODEL = 0x0110
+EXIF_DATETIME = 0x0132
+EXIF_DATETIME_ORIGINAL = 0x9003
+
+#: JPEG start of frame markers, excluding DHT, JPG and DAC markers which
+#: share the same range
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+#: JPEG start of scan marker
+JPEG_SOS_MARKER = 0xDA
+
+
+def fit_size(size, max_edge):
+    """Return ``size`` scaled to fit into ``max_edge`` square box."""
+    width, height = size
+    scale = min(1.0, max_edge / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def open_draft(fp, max_edge):
+    """Open the image and set up the decoder for the ``max_edge`` target.
+
+    The decoded bitmap stays at least ``REDUCING_GAP`` times larger than
+    the target, unless the image itself is smaller. The image is not
+    decoded yet, but its ``size`` is already the size
+    of the bitmap that will be decoded.
+    """
+    image = Image.open(fp)
+    # Decoder picks the largest scale still producing at least this size,
+    # the margin is left for the Lanczos filter to avoid aliasing.
+    image.draft('RGB', fit_size(image.size, max_edge * REDUCING_GAP))
+    return image
+
+
+def estimate_bitmap_size(image):
+    """Return estimated memory in bytes needed to decode the opened image."""
+    size = image.width * image.height * BITMAP_PIXEL_SIZE
+    if image.mode != 'RGB':
+        # Image is converted to RGB after decoding.
+        size *= 2
+    return size
+
+
+def iter_scaled(fp, sizes):
+    """Decode the image once and yield ``(size, image)`` tuples.
+
+    ``fp`` is a file or an image returned by ``open_draft``. Sizes are
+    yielded in descending order and each image is produced by
+    downscaling the previous one. Images are never upscaled. Yielded
+    image is modified in-place on the next iteration, so it has to be
+    processed (or copied) before continuing.
+    """
+    sizes = sorted(set(sizes), reverse=True)
+    image = fp if isinstance(fp, Image.Image) else open_draft(fp, sizes[0])
+    image.load()
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    for size in sizes:
+        image.thumbnail((size, size), Image.LANCZOS, reducing_gap=REDUCING_GAP)
+        yield size, image
+
+
+def encode(image, format='JPEG'):
+    """Encode image in the given format and return it in a ``BytesIO``."""
+    output = io.BytesIO()
+    image.save(output, format=format, **FORMAT_OPTIONS[format])
+    return output
+
+
+def _exif_str(value):
+    """Return EXIF value as a stripped string."""
+    if isinstance(value, bytes):
+        value = value.decode('latin-1')
+    return str(value or '').strip('\x00 ')
+
+
+def _parse_exif_datetime(value):
+    """Parse EXIF date and time or return ``None`` if it is not valid."""
+    try:
+        return datetime.datetime.strptime(_exif_str(value), '%Y:%m:%d %H:%M:%S')
+    except ValueError:
+        return None
+
+
+def read_metadata(fp):
+    """Return dictionary with metadata of the image.
+
+    Only image headers are read, the image is not decoded. Returned
+    dictionary contains ``width``, ``height``, ``format``, ``taken``
+    (capture time as a naive datetime or ``None``) and ``camera``.
+    """
+    fp.seek(0)
+    image = Image.open(fp)
+    exif = image.getexif()
+
+    taken = exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL)
+    make = _exif_str(exif.get(EXIF_MAKE))
+    model = _exif_str(exif.get(EXIF_MODEL))
+    # Model often already starts with the manufacturer's name.
+    camera = model if model.startswith(make) else '{} {}'.format(make, model)
+
+    metadata = {
+        'width': image.width,
+        'height': image.height,
+        'format': image.format or '',
+        'taken': _parse_exif_datetime(taken or exif.get(EXIF_DATETIME)),
+        'camera': camera.strip(),
+    }
+    fp.seek(0)
+
+    return metadata
+
+
+def read_jpeg_size(data):
+    """Return ``(width, height)`` read from the JPEG's start of frame marker.
+
+    ``data`` is the beginning of the JPEG file. ``None`` is returned if it
+    doesn't reach the start of frame marker yet, and ``ValueError`` is
+    raised if it is not a valid JPEG.
+    """
+    if len(data) < 2:
+        return None
+    if data[:2] != b'\xff\xd8':
+        raise ValueError("Not a JPEG image.")
+
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            raise ValueError("Invalid JPEG marker.")
+
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            # Fill byte.
+            offset += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            # Marker without a segment.
+            offset += 2
+            continue
+        if marker == JPEG_SOS_MARKER:
+            raise ValueError("Image data before start of frame.")
+
+        if marker in JPEG_SOF_MARKERS:
+            if offset + 9 > len(data):
+                return None
+            height, width = struct.unpack('>HH', data[offset + 5 : offset + 9])
+            return width, height
+
+        (length,) = struct.unpack('>H', data[offset + 2 : offset + 4])
+        offset += 2 + length
+
+    return None
@@ -0,0 +1,58 @@
+""".. Ignore pydocstyle D400.
+
+=========================
+Command: backfillmetadata
+=========================
+"""
+import logging
+
+from django.core.management.base import BaseCommand
+
+from rolca.core.models import File
+
+logger = logging.getLogger(__name__)
+
+#: fields filled by ``File.extract_metadata``
+METADATA_FIELDS = ['width', 'height', 'file_size', 'format', 'taken', 'camera']
+
+
+class Command(BaseCommand):
+    """Extract metadata of files uploaded before it was stored."""
+
+    help = "Extract metadata of files uploaded before it was stored."
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of files updated in a single query.',
+        )
+
+    def handle(self, *args, **options):
+        """Command handle."""
+        batch_size = options['batch_size']
+        queryset = File.objects.filter(width__isnull=True).only('id', 'file', 'width')
+
+        updated, failed = 0, 0
+        batch = []
+        for file in queryset.iterator(chunk_size=batch_size):
+            try:
+                with file.file.open('rb'):
+                    file.extract_metadata()
+            except (OSError, ValueError):
+                logger.exception("Cannot read metadata of file %s.", file.pk)
+                failed += 1
+                continue
+
+            batch.append(file)
+            if len(batch) >= batch_size:
+                File.objects.bulk_update(batch, METADATA_FIELDS)
+                updated += len(batch)
+                batch = []
+
+        File.objects.bulk_update(batch, METADATA_FIELDS)
+        updated += len(batch)
+
+        self.stdout.write("Updated {} files, {} failed.".format(updated, failed))
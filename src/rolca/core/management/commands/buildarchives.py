@@ -0,0 +1,40 @@
+""".. Ignore pydocstyle D400.
+
+======================
+Command: buildarchives
+======================
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from rolca.core.archive import request_contest_archive
+from rolca.core.models import Contest
+
+
+class Command(BaseCommand):
+    """Request archive builds of closed contests via django channels."""
+
+    help = "Request archive builds of closed contests via django channels."
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Request builds also for archives that are already pending.',
+        )
+
+    def handle(self, *args, **options):
+        """Command handle."""
+        count = 0
+        for contest in Contest.objects.filter(
+            end_date__lt=timezone.now()
+        ).select_related('archive'):
+            archive = getattr(contest, 'archive', None)
+            if archive is not None and archive.is_valid():
+                continue
+
+            request_contest_archive(contest, force=options['force'])
+            count += 1
+
+        self.stdout.write("Requested {} archive builds.".format(count))
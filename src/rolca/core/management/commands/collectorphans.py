@@ -0,0 +1,39 @@
+""".. Ignore pydocstyle D400.
+
+=======================
+Command: collectorphans
+=======================
+"""
+from django.core.management.base import BaseCommand
+
+from rolca.core.cleanup import collect_orphans
+
+
+class Command(BaseCommand):
+    """Delete uploaded files never attached to a submission."""
+
+    help = "Delete uploaded files never attached to a submission."
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--ttl',
+            type=int,
+            help='Age in seconds after which unused uploads are deleted.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of files loaded and deleted at once.',
+        )
+
+    def handle(self, *args, **options):
+        """Command handle."""
+        result = collect_orphans(ttl=options['ttl'], batch_size=options['batch_size'])
+
+        self.stdout.write(
+            "Deleted {} files and {} upload sessions, reclaimed {} bytes.".format(
+                result['files'], result['sessions'], result['bytes']
+            )
+        )
@@ -0,0 +1,50 @@
+""".. Ignore pydocstyle D400.
+
+==========================
+Command: processthumbnails
+==========================
+"""
+import datetime
+import logging
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from rolca.core.models import File
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Generate thumbnails of files left waiting for the worker."""
+
+    help = "Generate thumbnails of files left waiting for the worker."
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=15 * 60,
+            help='Min age in seconds of files, so the worker can handle them first.',
+        )
+
+    def handle(self, *args, **options):
+        """Command handle."""
+        # Files stay in processing if the worker was never triggered,
+        # e.g. because the channel was full.
+        since = timezone.now() - datetime.timedelta(seconds=options['min_age'])
+        queryset = File.objects.filter(status=File.PROCESSING, modified__lt=since)
+
+        processed, failed = 0, 0
+        for file in queryset.iterator():
+            try:
+                file.process()
+            except Exception:
+                logger.exception("Thumbnail generation of file %s failed.", file.pk)
+                File.objects.filter(pk=file.pk).update(status=File.ERROR)
+                failed += 1
+            else:
+                processed += 1
+
+        self.stdout.write("Processed {} files, {} failed.".format(processed, failed))
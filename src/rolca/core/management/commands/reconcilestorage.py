@@ -0,0 +1,51 @@
+""".. Ignore pydocstyle D400.
+
+=========================
+Command: reconcilestorage
+=========================
+"""
+from django.core.management.base import BaseCommand
+
+from rolca.core.models import File
+from rolca.core.reconcile import DIRECTORIES, iter_unreferenced_files
+
+
+class Command(BaseCommand):
+    """Report or delete stored images not referenced by any file."""
+
+    help = "Report or delete stored images not referenced by any file."
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            help='Delete unreferenced images instead of only listing them.',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=24 * 60 * 60,
+            help='Skip images modified in the last given number of seconds.',
+        )
+
+    def handle(self, *args, **options):
+        """Command handle."""
+        storage = File._meta.get_field('file').storage
+
+        count, size = 0, 0
+        for directory in DIRECTORIES:
+            for name in iter_unreferenced_files(
+                storage, directory, min_age=options['min_age']
+            ):
+                count += 1
+                size += storage.size(name)
+                if options['delete']:
+                    storage.delete(name)
+                else:
+                    self.stdout.write(name)
+
+        action = "Deleted" if options['delete'] else "Found"
+        self.stdout.write(
+            "{} {} unreferenced images with {} bytes.".format(action, count, size)
+        )
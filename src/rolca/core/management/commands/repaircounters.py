@@ -0,0 +1,20 @@
+""".. Ignore pydocstyle D400.
+
+=======================
+Command: repaircounters
+=======================
+"""
+from django.core.management.base import BaseCommand
+
+from rolca.core.counters import recompute_counters
+
+
+class Command(BaseCommand):
+    """Recompute submission counters of themes and contests."""
+
+    help = "Recompute submission counters of themes and contests."
+
+    def handle(self, *args, **options):
+        """Command handle."""
+        recompute_counters()
+        self.stdout.write("Submission counters recomputed.")
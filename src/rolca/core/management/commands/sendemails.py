@@ -0,0 +1,32 @@
+""".. Ignore pydocstyle D400.
+
+===================
+Command: sendemails
+===================
+"""
+from django.core.management.base import BaseCommand
+
+from rolca.core.outbox import send_emails
+
+
+class Command(BaseCommand):
+    """Send queued emails including pending retries."""
+
+    help = "Send queued emails including pending retries."
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of emails sent over a single connection.',
+        )
+
+    def handle(self, *args, **options):
+        """Command handle."""
+        result = send_emails(batch_size=options['batch_size'])
+
+        self.stdout.write(
+            "Sent {} emails, {} failed.".format(result['sent'], result['failed'])
+        )
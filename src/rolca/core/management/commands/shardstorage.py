@@ -0,0 +1,136 @@
+""".. Ignore pydocstyle D400.
+
+=====================
+Command: shardstorage
+=====================
+"""
+import logging
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from rolca.core.deletion import flush_deletions, schedule_deletion
+from rolca.core.models import ContentBlob, File, get_sharded_name
+
+logger = logging.getLogger(__name__)
+
+#: fields with names of stored images and directories of the images
+FIELDS = [('file', 'photos'), ('thumbnail', 'thumbs')]
+
+
+class Command(BaseCommand):
+    """Move stored photos and thumbnails into the sharded layout.
+
+    ``ROLCA_SHARDED_STORAGE`` setting should be enabled first, so new
+    uploads are already stored in the sharded layout. Images are first
+    linked (or copied) to the new location, then the names are updated
+    in the database and only then the old images are scheduled for
+    deletion, so all images stay available while the site is online.
+    Old images are deleted after ``--delete-delay`` seconds, so pages
+    and cached responses referring to them keep working meanwhile.
+    Interrupted command continues where it stopped.
+    """
+
+    help = "Move stored photos and thumbnails into the sharded layout."
+
+    def add_arguments(self, parser):
+        """Add command arguments."""
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of images moved in a single transaction.',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.0,
+            help='Seconds to wait between batches to reduce the load.',
+        )
+        parser.add_argument(
+            '--delete-delay',
+            type=int,
+            default=60 * 60,
+            help='Seconds to keep the old images before they are deleted.',
+        )
+
+    def _link(self, storage, name, new_name):
+        """Make the stored image available under the new name."""
+        if storage.exists(new_name):
+            # Image was already linked by an interrupted run.
+            return
+
+        try:
+            path, new_path = storage.path(name), storage.path(new_name)
+        except NotImplementedError:
+            with storage.open(name) as fh:
+                storage.save(new_name, fh)
+            return
+
+        os.makedirs(os.path.dirname(new_path), exist_ok=True)
+        os.link(path, new_path)
+
+    def _shard_field(self, field, directory, batch_size, sleep, delete_delay):
+        """Move images referenced by the field and return their count."""
+        storage = File._meta.get_field(field).storage
+        # Only names directly in the directory are not sharded yet.
+        queryset = (
+            File.objects.filter(**{field + '__regex': r'^{}/[^/]+$'.format(directory)})
+            .order_by(field)
+            .values_list(field, flat=True)
+            .distinct()
+        )
+
+        count, last_name = 0, ''
+        while True:
+            names = list(queryset.filter(**{field + '__gt': last_name})[:batch_size])
+            if not names:
+                return count
+            last_name = names[-1]
+
+            moved = []
+            for name in names:
+                new_name = get_sharded_name(name)
+                if new_name == name:
+                    continue
+                if not storage.exists(name) and not storage.exists(new_name):
+                    logger.warning("Stored image %s does not exist.", name)
+                    continue
+
+                self._link(storage, name, new_name)
+                moved.append((name, new_name))
+
+            with transaction.atomic():
+                for name, new_name in moved:
+                    # Changed names invalidate cached responses.
+                    File.objects.filter(**{field: name}).update(
+                        modified=timezone.now(), **{field: new_name}
+                    )
+                    ContentBlob.objects.filter(**{field: name}).update(
+                        modified=timezone.now(), **{field: new_name}
+                    )
+
+                # Old images still referenced, e.g. by a concurrent
+                # upload of the same content, are kept.
+                schedule_deletion(*(name for name, _ in moved))
+                flush_deletions(delay=delete_delay)
+
+            count += len(moved)
+            time.sleep(sleep)
+
+    def handle(self, *args, **options):
+        """Command handle."""
+        count = 0
+        for field, directory in FIELDS:
+            count += self._shard_field(
+                field,
+                directory,
+                options['batch_size'],
+                options['sleep'],
+                options['delete_delay'],
+            )
+
+        self.stdout.write("Moved {} images.".format(count))
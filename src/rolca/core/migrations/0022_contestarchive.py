@@ -0,0 +1,39 @@
+# Generated by Django 4.2 on 2026-10-18 06:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0021_auto_20210208_1803'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContestArchive',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('file', models.FileField(blank=True, null=True, upload_to='')),
+                ('built', models.DateTimeField(blank=True, null=True)),
+                ('invalidated', models.DateTimeField(blank=True, null=True)),
+                ('requested', models.DateTimeField(blank=True, null=True)),
+                (
+                    'contest',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='archive',
+                        to='core.contest',
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2 on 2026-10-18 06:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0022_contestarchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentBlob',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('file', models.CharField(blank=True, max_length=100)),
+                ('thumbnail', models.CharField(blank=True, max_length=100)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='blob',
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name='files',
+                to='core.contentblob',
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-18 06:09
+
+from django.db import migrations, models
+import rolca.core.models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0023_contentblob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='status',
+            field=models.SmallIntegerField(
+                choices=[(1, 'Processing'), (2, 'Done'), (3, 'Error')], default=2
+            ),
+        ),
+        migrations.AlterField(
+            model_name='file',
+            name='thumbnail',
+            field=models.ImageField(
+                blank=True, upload_to=rolca.core.models.generate_thumb_filename
+            ),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2 on 2026-10-18 06:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+import rolca.core.models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0024_file_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Derivative',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('size', models.PositiveSmallIntegerField()),
+                ('format', models.CharField(max_length=10)),
+                (
+                    'image',
+                    models.ImageField(
+                        height_field='height',
+                        upload_to=rolca.core.models.generate_derivative_filename,
+                        width_field='width',
+                    ),
+                ),
+                ('width', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('height', models.PositiveSmallIntegerField(blank=True, null=True)),
+                (
+                    'file',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='derivatives',
+                        to='core.file',
+                    ),
+                ),
+            ],
+            options={
+                'ordering': ['size', 'format'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='derivative',
+            constraint=models.UniqueConstraint(
+                fields=('file', 'size', 'format'), name='unique_file_size_format'
+            ),
+        ),
+    ]
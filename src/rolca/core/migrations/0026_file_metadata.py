@@ -0,0 +1,42 @@
+# Generated by Django 4.2 on 2026-10-18 06:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0025_derivative'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='camera',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='file_size',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='format',
+            field=models.CharField(blank=True, db_index=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='taken',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2 on 2026-10-18 06:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import rolca.core.models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0026_file_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('filename', models.CharField(max_length=255)),
+                (
+                    'size',
+                    models.PositiveIntegerField(
+                        validators=[rolca.core.models.validate_file_size]
+                    ),
+                ),
+                ('offset', models.PositiveIntegerField(default=0)),
+                ('width', models.PositiveIntegerField(blank=True, null=True)),
+                ('height', models.PositiveIntegerField(blank=True, null=True)),
+                (
+                    'user',
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
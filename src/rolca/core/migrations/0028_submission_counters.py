@@ -0,0 +1,60 @@
+# Generated by Django 4.2 on 2026-10-18 06:31
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def count_submissions(apps, schema_editor):
+    """Compute counters of submissions already in the database."""
+    Contest = apps.get_model("core", "Contest")
+    Submission = apps.get_model("core", "Submission")
+    Theme = apps.get_model("core", "Theme")
+
+    submission_count = (
+        Submission.objects.filter(theme=OuterRef('pk'))
+        .order_by()
+        .values('theme')
+        .annotate(value=Count('pk'))
+        .values('value')
+    )
+    Theme.objects.update(n_submissions=Coalesce(Subquery(submission_count), 0))
+
+    theme_sum = (
+        Theme.objects.filter(contest=OuterRef('pk'))
+        .order_by()
+        .values('contest')
+        .annotate(value=Sum('n_submissions'))
+        .values('value')
+    )
+    Contest.objects.update(n_submissions=Coalesce(Subquery(theme_sum), 0))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0027_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contest',
+            name='n_paid_submissions',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='contest',
+            name='n_submissions',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='theme',
+            name='n_paid_submissions',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='theme',
+            name='n_submissions',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_submissions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 07:24
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0034_contentblob_base'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storagedeletion',
+            name='delete_after',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2 on 2026-10-18 07:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('core', '0035_storagedeletion_delete_after'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='outgoingemail',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('attempts', 0), ('sent__isnull', True)),
+                fields=('email', 'recipient'),
+                name='unique_pending_email',
+            ),
+        ),
+    ]
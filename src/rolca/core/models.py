@@ -19,24 +19,55 @@ Core models
 .. autoclass:: rolca.core.models.File
     :members:
 
+.. autoclass:: rolca.core.models.ContentBlob
+    :members:
+
+.. autoclass:: rolca.core.models.Derivative
+    :members:
+
+.. autoclass:: rolca.core.models.ContestArchive
+    :members:
+
+.. autoclass:: rolca.core.models.UploadSession
+    :members:
+
+.. autoclass:: rolca.core.models.OutgoingEmail
+    :members:
+
+.. autoclass:: rolca.core.models.StorageDeletion
+    :members:
+
 """
+import functools
 import hashlib
-import io
 import os
 import struct
 import time
 
-from PIL import Image
-
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import InMemoryUploadedFile
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from drf_user.models import Email
 
+from rolca.core.governor import get_governor
+from rolca.core.imaging import (
+    FORMAT_EXTENSIONS,
+    THUMBNAIL_SIZE,
+    encode,
+    estimate_bitmap_size,
+    iter_scaled,
+    open_draft,
+    read_metadata,
+)
+from rolca.core.protocol import TYPE_THUMBNAIL
+from rolca.core.worker import send_to_worker
+
 
 class BaseModel(models.Model):
     """Base model for all other models."""
@@ -114,6 +145,12 @@ class Contest(BaseModel):
 
     school_required = models.BooleanField(default=False)
 
+    #: number of submissions in the contest
+    n_submissions = models.IntegerField(default=0, editable=False)
+
+    #: number of paid submissions in the contest
+    n_paid_submissions = models.IntegerField(default=0, editable=False)
+
     def save(self, *args, **kwargs):
         """Save Contest instance."""
         if not self.publish_date:
@@ -135,8 +172,9 @@ class Contest(BaseModel):
 
     def number_of_photos(self):
         """Return number of photos submitted to the current contest."""
-        return Submission.objects.filter(theme__contest=self).count()
+        return self.n_submissions
 
+    number_of_photos.admin_order_field = 'n_submissions'
     number_of_photos.short_description = _('number of submissons')
 
 
@@ -164,6 +202,12 @@ class Theme(BaseModel):
     #: number of photos that can be submited to theme
     n_photos = models.IntegerField(_('Number of photos'))
 
+    #: number of submissions in the theme
+    n_submissions = models.IntegerField(default=0, editable=False)
+
+    #: number of paid submissions in the theme
+    n_paid_submissions = models.IntegerField(default=0, editable=False)
+
     def save(self, *args, **kwargs):
         """Save Theme instance."""
         if getattr(self, 'user', None) is None:
@@ -176,14 +220,71 @@ class Theme(BaseModel):
         return self.title
 
 
+#: hash algorithms available for ``ROLCA_HASH_ALGORITHM`` setting, all of
+#: them produce 128-bit digests
+HASH_ALGORITHMS = {
+    'md5': hashlib.md5,
+    'blake2b': functools.partial(hashlib.blake2b, digest_size=16),
+}
+
+
+def new_content_hash():
+    """Return new hash object of the configured algorithm."""
+    algorithm = getattr(settings, 'ROLCA_HASH_ALGORITHM', 'md5')
+    return HASH_ALGORITHMS[algorithm]()
+
+
+def is_content_addressed():
+    """Check if photos are stored in the content-addressed storage.
+
+    The mode is enabled with ``ROLCA_CONTENT_ADDRESSED_STORAGE`` setting.
+    """
+    return getattr(settings, 'ROLCA_CONTENT_ADDRESSED_STORAGE', False)
+
+
+def is_sharded_storage():
+    """Check if photos are stored in hash-prefix subdirectories.
+
+    The layout is enabled with ``ROLCA_SHARDED_STORAGE`` setting.
+    """
+    return getattr(settings, 'ROLCA_SHARDED_STORAGE', False)
+
+
+def get_sharded_name(name):
+    """Return name of the stored file in the sharded layout.
+
+    The first four characters of the file name are used for two levels
+    of subdirectories, i.e. ``photos/abcd.jpg`` is stored as
+    ``photos/ab/cd/abcd.jpg``. Names too short to be sharded are
+    returned unchanged.
+    """
+    directory, filename = os.path.split(name)
+    if len(os.path.splitext(filename)[0]) < 4:
+        return name
+    return os.path.join(directory, filename[:2], filename[2:4], filename)
+
+
 def _generate_filename(instance, filename, prefix):
-    """Generate unique filename with given prefix."""
-    md5 = hashlib.md5()
-    md5.update(struct.pack('f', time.time()))
-    for chunk in instance.file.chunks():
-        md5.update(chunk)
+    """Generate unique filename with given prefix.
+
+    The name is derived from the content digest salted with the current
+    time. It is computed once and shared by the photo and its thumbnail.
+    In the content-addressed mode the digest is used without the salt.
+    """
+    if instance._name_hash is None:
+        if is_content_addressed():
+            instance._name_hash = instance.get_content_digest()
+        else:
+            name_hash = new_content_hash()
+            name_hash.update(struct.pack('f', time.time()))
+            name_hash.update(instance.get_content_digest().encode())
+            instance._name_hash = name_hash.hexdigest()
+
     extension = os.path.splitext(filename)[1]
-    return os.path.join(prefix, md5.hexdigest() + extension)
+    name = os.path.join(prefix, instance._name_hash + extension)
+    if is_sharded_storage():
+        name = get_sharded_name(name)
+    return name
 
 
 def generate_file_filename(instance, filename):
@@ -245,14 +346,46 @@ class Submission(BaseModel):
         return self.title
 
 
-def validate_image(file):
+def validate_file_size(size):
+    """Check that the size of the uploaded file is within the limit."""
     max_size = settings.ROLCA_MAX_UPLOAD_SIZE
-    if file.size > max_size:
+    if size > max_size:
         raise ValidationError("Max size of file is {}B.".format(max_size))
 
+
+def validate_resolution(width, height):
+    """Check that the resolution of the uploaded photo is within the limits."""
     max_res = settings.ROLCA_MAX_UPLOAD_RESOLUTION
-    if max(file.image.size) > max_res:
+    if max(width, height) > max_res:
         raise ValidationError("Max photo resolution is {}px.".format(max_res))
+    get_governor().check(width, height)
+
+
+def validate_image(file):
+    validate_file_size(file.size)
+    validate_resolution(*file.image.size)
+
+
+class ContentBlob(BaseModel):
+    """Photo and its thumbnail in the content-addressed storage.
+
+    All ~`rolca.core.models.File` objects with identical content refer
+    to a single blob. Stored images are deleted when the last reference
+    to the blob is deleted.
+    """
+
+    #: digest of the photo's content
+    digest = models.CharField(max_length=64, unique=True)
+
+    #: name of the stored photo
+    file = models.CharField(max_length=100, blank=True)
+
+    #: name of the stored thumbnail
+    thumbnail = models.CharField(max_length=100, blank=True)
+
+    def __str__(self):
+        """Return string representation of ContentBlob object."""
+        return "Blob {}".format(self.digest)
 
 
 class File(BaseModel):
@@ -272,6 +405,15 @@ class File(BaseModel):
         verbose_name = _('file')
         verbose_name_plural = _('files')
 
+    PROCESSING = 1
+    DONE = 2
+    ERROR = 3
+    STATUS_CHOICES = [
+        (PROCESSING, 'Processing'),
+        (DONE, 'Done'),
+        (ERROR, 'Error'),
+    ]
+
     submission = models.ForeignKey(
         Submission, related_name='files', null=True, on_delete=models.CASCADE
     )
@@ -282,34 +424,276 @@ class File(BaseModel):
     )
 
     #: thumbnail of uploaded file
-    thumbnail = models.ImageField(upload_to=generate_thumb_filename)
+    thumbnail = models.ImageField(upload_to=generate_thumb_filename, blank=True)
 
-    def save(self, *args, **kwargs):
-        """Add photo thumbnail and save object."""
-        if not self.pk:  # on create
-            image = Image.open(self.file)
-            image.thumbnail((400, 400), Image.ANTIALIAS)
-
-            thumb = io.BytesIO()
-            image.save(
-                thumb, format="jpeg", quality=80, optimize=True, progressive=True
+    #: status of processing the uploaded file
+    status = models.SmallIntegerField(choices=STATUS_CHOICES, default=DONE)
+
+    #: width of the uploaded image
+    width = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+
+    #: height of the uploaded image
+    height = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+
+    #: size of the uploaded file in bytes
+    file_size = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+
+    #: image format of the uploaded file
+    format = models.CharField(max_length=10, blank=True, db_index=True)
+
+    #: time when the photo was taken (from EXIF)
+    taken = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    #: camera used to take the photo (from EXIF)
+    camera = models.CharField(max_length=100, blank=True, db_index=True)
+
+    #: blob in the content-addressed storage holding the images
+    blob = models.ForeignKey(
+        ContentBlob,
+        related_name='files',
+        null=True,
+        blank=True,
+        on_delete=models.PROTECT,
+    )
+
+    _content_digest = None
+    _name_hash = None
+    _pending_derivatives = ()
+    _prepared = False
+
+    def _create_images(self):
+        """Generate thumbnail and derivatives of the uploaded photo.
+
+        The photo is decoded only once for all of them, within the memory
+        budget of the image governor. Derivatives are
+        configured with ``ROLCA_DERIVATIVE_SIZES`` and
+        ``ROLCA_DERIVATIVE_FORMATS`` settings and are saved by
+        ``_save_derivatives`` once the object has a primary key.
+        """
+        sizes = getattr(settings, 'ROLCA_DERIVATIVE_SIZES', ())
+        formats = getattr(settings, 'ROLCA_DERIVATIVE_FORMATS', ('JPEG',))
+
+        all_sizes = list(sizes) + [THUMBNAIL_SIZE]
+        governor = get_governor()
+
+        # Reject decompression bombs before anything is decoded.
+        self.extract_metadata()
+        governor.check(self.width, self.height)
+
+        self.file.seek(0)
+        draft = open_draft(self.file, max(all_sizes))
+        self._pending_derivatives = []
+        with governor.reserve(estimate_bitmap_size(draft)):
+            for size, image in iter_scaled(draft, all_sizes):
+                if size == THUMBNAIL_SIZE:
+                    thumb = encode(image)
+                    self.thumbnail = InMemoryUploadedFile(
+                        thumb, None, self.file.name, 'image/jpeg', thumb.tell(), None
+                    )
+                if size in sizes:
+                    for format in formats:
+                        self._pending_derivatives.append(
+                            (size, format, encode(image, format))
+                        )
+
+    def _save_derivatives(self):
+        """Save derivatives generated by ``_create_images``."""
+        for size, format, content in self._pending_derivatives:
+            name = os.path.splitext(os.path.basename(self.file.name))[0]
+            derivative = Derivative(file=self, size=size, format=format, user=self.user)
+            derivative.image.save(
+                name + FORMAT_EXTENSIONS[format],
+                ContentFile(content.getvalue()),
+                save=False,
             )
-            self.thumbnail = InMemoryUploadedFile(
-                thumb, None, self.file.name, 'image/jpeg', thumb.tell(), None
+            derivative.save()
+
+        self._pending_derivatives = []
+
+    def _copy_derivatives(self):
+        """Copy derivative references from another file sharing the same blob."""
+        sibling = self.blob.files.exclude(pk=self.pk).first()
+        if sibling is None:
+            return
+
+        Derivative.objects.bulk_create(
+            Derivative(
+                file=self,
+                user=self.user,
+                size=derivative.size,
+                format=derivative.format,
+                image=derivative.image.name,
+                width=derivative.width,
+                height=derivative.height,
+            )
+            for derivative in sibling.derivatives.all()
+        )
+
+    def _prepare_thumbnail(self):
+        """Generate thumbnail or defer it to the background worker.
+
+        Thumbnails are generated by the background worker if
+        ``ROLCA_ASYNC_THUMBNAILS`` setting is enabled. Files the worker
+        never received are handled by ``processthumbnails`` command.
+        """
+        if getattr(settings, 'ROLCA_ASYNC_THUMBNAILS', False):
+            self.status = self.PROCESSING
+        else:
+            self._create_images()
+
+    def _save_content_addressed(self, *args, **kwargs):
+        """Save object referencing a blob in the content-addressed storage.
+
+        Images are only stored (and thumbnail generated) if a blob with
+        the same content doesn't exist yet.
+        """
+        blob, _ = ContentBlob.objects.get_or_create(digest=self.get_content_digest())
+        # Lock the blob to serialize concurrent uploads and deletions.
+        self.blob = ContentBlob.objects.select_for_update().get(pk=blob.pk)
+
+        if self.blob.file:
+            self.file = self.blob.file
+            self.thumbnail = self.blob.thumbnail
+            if not self.blob.thumbnail:
+                # Thumbnail of the blob is still being generated.
+                self.status = self.PROCESSING
+            super().save(*args, **kwargs)
+            self._copy_derivatives()
+            return
+
+        self._prepare_thumbnail()
+        super().save(*args, **kwargs)
+        self._save_derivatives()
+
+        self.blob.file = self.file.name
+        self.blob.thumbnail = self.thumbnail.name or ''
+        self.blob.save(update_fields=['file', 'thumbnail', 'modified'])
+
+    def extract_metadata(self):
+        """Store dimensions, size, format and EXIF metadata of the photo.
+
+        Only image headers are read. Metadata is extracted only once, so
+        calling the method again is cheap.
+        """
+        if self.width is not None:
+            return
+
+        metadata = read_metadata(self.file)
+        if metadata['taken'] is not None and settings.USE_TZ:
+            metadata['taken'] = timezone.make_aware(metadata['taken'])
+        metadata['camera'] = metadata['camera'][:100]
+
+        for field, value in metadata.items():
+            setattr(self, field, value)
+        self.file_size = self.file.size
+
+    def prepare(self):
+        """Process the new photo in advance, without accessing the database.
+
+        Metadata, content digest and images are computed here, so ``save``
+        only has to store them. This allows processing several photos in
+        parallel threads. In the content-addressed mode images are only
+        generated on save if the blob doesn't exist yet.
+        """
+        self.extract_metadata()
+        self.get_content_digest()
+        if not is_content_addressed():
+            self._prepare_thumbnail()
+        self._prepared = True
+
+    def save(self, *args, **kwargs):
+        """Add photo thumbnail and derivatives and save object."""
+        if self.pk:
+            return super(File, self).save(*args, **kwargs)
+
+        # On create.
+        self.extract_metadata()
+        if is_content_addressed():
+            with transaction.atomic():
+                self._save_content_addressed(*args, **kwargs)
+        else:
+            if not self._prepared:
+                self._prepare_thumbnail()
+            super(File, self).save(*args, **kwargs)
+            self._save_derivatives()
+
+        if self.status == self.PROCESSING:
+            transaction.on_commit(
+                lambda: send_to_worker(TYPE_THUMBNAIL, file_pk=self.pk)
             )
 
-        super(File, self).save(*args, **kwargs)
+    def process(self):
+        """Generate thumbnail of the stored photo and mark object as done.
 
-    def delete(self, *args, **kwargs):
-        """Delete attached images and actual object."""
-        self.file.delete(save=False)
-        self.thumbnail.delete(save=False)
+        This is run by the background worker when thumbnails are
+        generated asynchronously.
+        """
+        # Reuse the photo's name instead of hashing the stored photo again.
+        self._name_hash = os.path.splitext(os.path.basename(self.file.name))[0]
 
-        super(File, self).delete(*args, **kwargs)
+        with transaction.atomic():
+            blob = None
+            if self.blob_id is not None:
+                blob = ContentBlob.objects.select_for_update().get(pk=self.blob_id)
+
+            if blob is not None and blob.thumbnail:
+                self.thumbnail = blob.thumbnail
+                self._copy_derivatives()
+            else:
+                self._create_images()
+                self._save_derivatives()
+
+            self.status = self.DONE
+            self.save(update_fields=['thumbnail', 'status', 'modified'])
+
+            if blob is not None and not blob.thumbnail:
+                blob.thumbnail = self.thumbnail.name
+                blob.save(update_fields=['thumbnail', 'modified'])
+
+    def delete(self, *args, **kwargs):
+        """Delete the object and schedule deletion of attached images.
+
+        Images are deleted by the background worker once they are no
+        longer referenced, see ~`rolca.core.deletion`. Blob in the
+        content-addressed storage is deleted with its last reference.
+        """
+        if self.blob_id is None:
+            return super(File, self).delete(*args, **kwargs)
+
+        with transaction.atomic():
+            blob = ContentBlob.objects.select_for_update().get(pk=self.blob_id)
+            result = super(File, self).delete(*args, **kwargs)
+
+            if not blob.files.exists():
+                blob.delete()
+
+        return result
+
+    def get_content_digest(self):
+        """Return digest of the uploaded file's content.
+
+        Digest computed by the upload handler while the file was being
+        received is used when available. Otherwise the file is read once
+        and the digest is cached on the instance.
+        """
+        if self._content_digest is None:
+            digest = getattr(self.file.file, 'content_digest', None)
+            if digest is None:
+                content_hash = new_content_hash()
+                for chunk in self.file.chunks():
+                    content_hash.update(chunk)
+                digest = content_hash.hexdigest()
+            self._content_digest = digest
+
+        return self._content_digest
 
     def get_long_edge(self):
         """Return longer edge of the image."""
-        return max(self.file.width, self.file.height)
+        if self.width is None:
+            # Metadata of the object was not extracted yet.
+            return max(self.file.width, self.file.height)
+
+        return max(self.width, self.height)
 
     def __str__(self):
         """Return string representation of File object."""
@@ -320,6 +704,207 @@ class File(BaseModel):
         )
 
 
+class ContestArchive(BaseModel):
+    """Prebuilt ZIP archive with all photos of the contest.
+
+    The archive is built by a background worker once the contest is
+    closed and is invalidated whenever submissions of the contest change.
+    """
+
+    #: contest that the archive belongs to
+    contest = models.OneToOneField(
+        Contest, related_name='archive', on_delete=models.CASCADE
+    )
+
+    #: built archive
+    file = models.FileField(null=True, blank=True)
+
+    #: time of the snapshot of submissions stored in the archive
+    built = models.DateTimeField(null=True, blank=True)
+
+    #: time of the last change of the contest's submissions
+    invalidated = models.DateTimeField(null=True, blank=True)
+
+    #: time when the last build was requested
+    requested = models.DateTimeField(null=True, blank=True)
+
+    def is_valid(self):
+        """Check if the built archive reflects the current submissions."""
+        if not self.file or self.built is None:
+            return False
+
+        return self.invalidated is None or self.built >= self.invalidated
+
+    def is_pending(self):
+        """Check if the archive build was requested but not yet finished."""
+        if self.requested is None:
+            return False
+
+        return self.built is None or self.requested > self.built
+
+    def __str__(self):
+        """Return string representation of ContestArchive object."""
+        return "Archive of {}".format(self.contest)
+
+
+def generate_derivative_filename(instance, filename):
+    """Generate filename for derivatives of uploaded photos."""
+    name, extension = os.path.splitext(filename)
+    return os.path.join('derivatives', '{}_{}{}'.format(name, instance.size, extension))
+
+
+class Derivative(BaseModel):
+    """Downscaled version of the uploaded photo."""
+
+    class Meta:
+        """Derivative Meta options."""
+
+        ordering = ['size', 'format']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['file', 'size', 'format'], name='unique_file_size_format'
+            ),
+        ]
+
+    #: original photo
+    file = models.ForeignKey(File, related_name='derivatives', on_delete=models.CASCADE)
+
+    #: size of the longer edge requested for the derivative
+    size = models.PositiveSmallIntegerField()
+
+    #: image format of the derivative
+    format = models.CharField(max_length=10)
+
+    #: downscaled image
+    image = models.ImageField(
+        upload_to=generate_derivative_filename,
+        width_field='width',
+        height_field='height',
+    )
+
+    #: width of the image
+    width = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    #: height of the image
+    height = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    def __str__(self):
+        """Return string representation of Derivative object."""
+        return "{} ({}px, {})".format(self.file_id, self.size, self.format)
+
+
+#: directory (relative to ``MEDIA_ROOT``) where resumable uploads are
+#: assembled
+UPLOAD_DIR = 'uploads'
+
+
+class UploadSession(BaseModel):
+    """Resumable upload of a single photo.
+
+    Received chunks are appended to a partial file under ``MEDIA_ROOT``
+    which is turned into a ~`rolca.core.models.File` once the upload is
+    complete.
+    """
+
+    class Meta:
+        """UploadSession Meta options."""
+
+        ordering = ['id']
+
+    #: name of the uploaded file
+    filename = models.CharField(max_length=255)
+
+    #: declared size of the uploaded file in bytes
+    size = models.PositiveIntegerField(validators=[validate_file_size])
+
+    #: number of bytes received so far
+    offset = models.PositiveIntegerField(default=0)
+
+    #: width of the image, once it is read from the received data
+    width = models.PositiveIntegerField(null=True, blank=True)
+
+    #: height of the image, once it is read from the received data
+    height = models.PositiveIntegerField(null=True, blank=True)
+
+    def get_path(self):
+        """Return path of the partial file."""
+        name = os.path.join(UPLOAD_DIR, 'session-{}.part'.format(self.pk))
+        return default_storage.path(name)
+
+    def is_complete(self):
+        """Check if all bytes of the upload were received."""
+        return self.offset == self.size
+
+    def __str__(self):
+        """Return string representation of UploadSession object."""
+        return "{} ({}/{}B)".format(self.filename, self.offset, self.size)
+
+
+class OutgoingEmail(BaseModel):
+    """Email queued for sending by the background worker.
+
+    See ~`rolca.core.outbox` for details.
+    """
+
+    class Meta:
+        """OutgoingEmail Meta options."""
+
+        ordering = ['id']
+        indexes = [models.Index(fields=['sent', 'send_after'])]
+        constraints = [
+            # Only emails which weren't attempted yet are coalesced.
+            models.UniqueConstraint(
+                fields=['email', 'recipient'],
+                condition=models.Q(sent__isnull=True, attempts=0),
+                name='unique_pending_email',
+            ),
+        ]
+
+    #: email to send
+    email = models.ForeignKey(Email, on_delete=models.CASCADE)
+
+    #: address of the recipient
+    recipient = models.EmailField()
+
+    #: time after which the email is (re)sent
+    send_after = models.DateTimeField(default=timezone.now)
+
+    #: time when the email was sent
+    sent = models.DateTimeField(null=True, blank=True)
+
+    #: number of failed attempts to send the email
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    #: error of the last failed attempt
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        """Return string representation of OutgoingEmail object."""
+        return "{} to {}".format(self.email_id, self.recipient)
+
+
+class StorageDeletion(BaseModel):
+    """Stored file scheduled for deletion by the background worker.
+
+    See ~`rolca.core.deletion` for details.
+    """
+
+    class Meta:
+        """StorageDeletion Meta options."""
+
+        ordering = ['id']
+
+    #: name of the file in the default storage
+    name = models.CharField(max_length=255)
+
+    #: time after which the file can be deleted
+    delete_after = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        """Return string representation of StorageDeletion object."""
+        return self.name
+
+
 class Institution(BaseModel):
     SCHOOL = 1
     KIND_CHOICES = [
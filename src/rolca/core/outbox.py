@@ -0,0 +1,156 @@
+""".. Ignore pydocstyle D400.
+
+===========
+Core outbox
+===========
+
+Emails are not sent during requests, as slow or unavailable mail
+servers would slow down or break them. Instead, they are stored as
+~`rolca.core.models.OutgoingEmail` objects and sent by the background
+worker once the transaction is committed.
+
+Emails are sent ``ROLCA_EMAIL_COALESCE_WINDOW`` seconds after they are
+queued. The same email queued for the recipient meanwhile is merged
+into the pending one, so several submissions sent in a row result in a
+single confirmation. Pending emails are unique per recipient, so
+concurrent requests don't queue duplicates.
+
+The worker claims pending emails in batches by leasing them for
+``ROLCA_EMAIL_LEASE`` seconds and sends them outside of the
+transaction, so no database locks are held while talking to the mail
+server. Emails leased by a crashed worker are sent again once the
+lease expires. Failed emails are retried with exponentially growing
+delays starting at ``ROLCA_EMAIL_RETRY_DELAY`` seconds, until they
+fail ``ROLCA_EMAIL_MAX_ATTEMPTS`` times. The worker is only triggered
+by newly queued emails, so ``sendemails`` management command should be
+run periodically to send delayed emails and retries.
+
+.. autofunction:: rolca.core.outbox.queue_email
+
+.. autofunction:: rolca.core.outbox.send_emails
+
+"""
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from rolca.core.models import OutgoingEmail
+from rolca.core.protocol import TYPE_EMAIL
+from rolca.core.worker import send_to_worker
+
+logger = logging.getLogger(__name__)
+
+#: default delay in seconds before the queued email is sent
+DEFAULT_COALESCE_WINDOW = 5 * 60
+
+#: default delay in seconds before the first retry
+DEFAULT_RETRY_DELAY = 60
+
+#: default number of attempts before the email is abandoned
+DEFAULT_MAX_ATTEMPTS = 8
+
+#: default time in seconds for which the claimed emails are reserved
+DEFAULT_LEASE = 15 * 60
+
+
+def queue_email(email, recipient, user=None):
+    """Queue the email to be sent to the recipient by the worker.
+
+    Return the ~`rolca.core.models.OutgoingEmail` object, which is
+    shared with the same email queued before it was sent.
+    """
+    window = getattr(settings, 'ROLCA_EMAIL_COALESCE_WINDOW', DEFAULT_COALESCE_WINDOW)
+    # Concurrently created email violates the unique constraint, so the
+    # existing one is returned instead.
+    outgoing, created = OutgoingEmail.objects.get_or_create(
+        email=email,
+        recipient=recipient,
+        sent__isnull=True,
+        attempts=0,
+        defaults={
+            'user': user,
+            'send_after': timezone.now() + datetime.timedelta(seconds=window),
+        },
+    )
+    if created:
+        transaction.on_commit(lambda: send_to_worker(TYPE_EMAIL))
+    return outgoing
+
+
+def _get_retry_time(attempts):
+    """Return time of the next attempt after the given number of failures."""
+    delay = getattr(settings, 'ROLCA_EMAIL_RETRY_DELAY', DEFAULT_RETRY_DELAY)
+    return timezone.now() + datetime.timedelta(seconds=delay * 2 ** (attempts - 1))
+
+
+def _claim_batch(batch_size):
+    """Lease a batch of pending emails to the current worker."""
+    max_attempts = getattr(settings, 'ROLCA_EMAIL_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    lease = getattr(settings, 'ROLCA_EMAIL_LEASE', DEFAULT_LEASE)
+
+    with transaction.atomic():
+        # Locked emails are being claimed by another worker.
+        outgoing_emails = list(
+            OutgoingEmail.objects.filter(
+                sent__isnull=True,
+                send_after__lte=timezone.now(),
+                attempts__lt=max_attempts,
+            )
+            .select_related('email')
+            .select_for_update(skip_locked=True, of=('self',))[:batch_size]
+        )
+        now = timezone.now()
+        for outgoing in outgoing_emails:
+            outgoing.send_after = now + datetime.timedelta(seconds=lease)
+            outgoing.modified = now
+        OutgoingEmail.objects.bulk_update(outgoing_emails, ['send_after', 'modified'])
+
+    return outgoing_emails
+
+
+def _send_batch(batch_size):
+    """Send a batch of pending emails and return numbers of sent and failed."""
+    outgoing_emails = _claim_batch(batch_size)
+    sent, failed = [], []
+
+    # Claimed emails are sent outside of the transaction.
+    for outgoing in outgoing_emails:
+        try:
+            outgoing.email.send(outgoing.recipient)
+        except Exception as error:
+            logger.exception("Sending email %d failed.", outgoing.pk)
+            outgoing.error = str(error)
+            failed.append(outgoing)
+        else:
+            sent.append(outgoing)
+
+    now = timezone.now()
+    for outgoing in sent:
+        outgoing.sent = now
+    for outgoing in failed:
+        outgoing.attempts += 1
+        outgoing.send_after = _get_retry_time(outgoing.attempts)
+    for outgoing in outgoing_emails:
+        outgoing.modified = now
+    OutgoingEmail.objects.bulk_update(
+        outgoing_emails, ['sent', 'attempts', 'send_after', 'error', 'modified']
+    )
+
+    return len(sent), len(failed)
+
+
+def send_emails(batch_size=100):
+    """Send all pending emails in batches.
+
+    Return a dict with numbers of ``sent`` and ``failed`` emails.
+    """
+    result = {'sent': 0, 'failed': 0}
+    while True:
+        sent, failed = _send_batch(batch_size)
+        result['sent'] += sent
+        result['failed'] += failed
+        if sent + failed < batch_size:
+            return result
@@ -0,0 +1,26 @@
+""".. Ignore pydocstyle D400.
+
+=============
+Core protocol
+=============
+
+Channel and message types of the core background worker.
+
+"""
+#: channel of the core background worker
+CHANNEL_CORE = 'rolca.core'
+
+#: message type for building contest archives
+TYPE_ARCHIVE = 'core.archive'
+
+#: message type for generating thumbnails
+TYPE_THUMBNAIL = 'core.thumbnail'
+
+#: message type for collecting orphaned uploads
+TYPE_COLLECT_ORPHANS = 'core.collect_orphans'
+
+#: message type for sending queued emails
+TYPE_EMAIL = 'core.email'
+
+#: message type for deleting files from the storage
+TYPE_DELETE_STORAGE = 'core.delete_storage'
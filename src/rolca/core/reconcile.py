@@ -0,0 +1,111 @@
+""".. Ignore pydocstyle D400.
+
+===================
+Core reconciliation
+===================
+
+Stored images can outlive their ~`rolca.core.models.File` objects, for
+example when they were deleted before deletions were recorded by
+~`rolca.core.deletion`. Reconciliation finds images in the ``photos/`` and
+``thumbs/`` directories that are not referenced by any object.
+
+Directory listing is sorted with an external merge sort (sorted runs
+are spilled into temporary files) and merged with names read from the
+database in the same order through a server-side cursor, so memory
+consumption doesn't depend on the number of stored files.
+
+.. autofunction:: rolca.core.reconcile.iter_unreferenced_files
+
+"""
+import contextlib
+import heapq
+import itertools
+import os
+import tempfile
+import time
+
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Collate
+
+from rolca.core.models import File
+
+#: directories with stored images and fields referencing them
+DIRECTORIES = {
+    'photos': 'file',
+    'thumbs': 'thumbnail',
+}
+
+#: number of names sorted in memory at once
+RUN_SIZE = 100000
+
+
+def _iter_stored_files(path, prefix, max_mtime):
+    """Yield names of files in the directory tree older than ``max_mtime``."""
+    directories = [(path, prefix)]
+    while directories:
+        path, prefix = directories.pop()
+        with os.scandir(path) as entries:
+            for entry in entries:
+                name = '{}/{}'.format(prefix, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append((entry.path, name))
+                elif entry.stat(follow_symlinks=False).st_mtime < max_mtime:
+                    # Recent files may belong to uploads in progress.
+                    yield name
+
+
+def _iter_sorted(names, run_size):
+    """Sort names with an external merge sort and yield them."""
+    with contextlib.ExitStack() as stack:
+        runs = []
+        names = iter(names)
+        while True:
+            run = sorted(itertools.islice(names, run_size))
+            if not run:
+                break
+
+            run_file = stack.enter_context(tempfile.TemporaryFile('w+'))
+            run_file.writelines(name + '\n' for name in run)
+            run_file.seek(0)
+            runs.append(line[:-1] for line in run_file)
+
+        yield from heapq.merge(*runs)
+
+
+def _iter_referenced_names(field, prefix, chunk_size):
+    """Yield names stored in the field of all files sorted by code points."""
+    order = F(field)
+    if connection.vendor == 'postgresql':
+        # Database collation may not sort by code points as Python does.
+        order = Collate(order, 'C')
+
+    return (
+        File.objects.filter(**{field + '__startswith': prefix + '/'})
+        .order_by(order)
+        .values_list(field, flat=True)
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def iter_unreferenced_files(
+    storage, directory, min_age=0, run_size=RUN_SIZE, chunk_size=2000
+):
+    """Yield names of stored files in the directory not used by any file.
+
+    ``directory`` is one of the keys of ``DIRECTORIES``. Files modified
+    in the last ``min_age`` seconds are skipped.
+    """
+    path = storage.path(directory)
+    if not os.path.isdir(path):
+        return
+
+    stored = _iter_stored_files(path, directory, time.time() - min_age)
+    referenced = _iter_referenced_names(DIRECTORIES[directory], directory, chunk_size)
+
+    reference = next(referenced, None)
+    for name in _iter_sorted(stored, run_size):
+        while reference is not None and reference < name:
+            reference = next(referenced, None)
+        if reference != name:
+            yield name
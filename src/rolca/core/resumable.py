@@ -0,0 +1,173 @@
+""".. Ignore pydocstyle D400.
+
+=================
+Resumable uploads
+=================
+
+Large photos can be uploaded in chunks, so an interrupted upload can be
+continued from the last received byte instead of starting over.
+
+An upload session is created with the name and the size of the photo.
+Chunks are then written directly into a partial file under
+``MEDIA_ROOT`` while they are being received, so only a small buffer is
+kept in memory regardless of the chunk size. Size and resolution limits
+are checked with every chunk, the resolution as soon as the JPEG's start
+of frame marker is received. Once all bytes are received, the session is
+finalized into a ~`rolca.core.models.File` and the partial file is moved
+into its place.
+
+.. autofunction:: rolca.core.resumable.start_upload
+
+.. autofunction:: rolca.core.resumable.append_chunk
+
+.. autofunction:: rolca.core.resumable.finalize_upload
+
+"""
+import os
+
+from PIL import UnidentifiedImageError
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+
+from rolca.core.imaging import read_jpeg_size
+from rolca.core.models import (
+    File,
+    UploadSession,
+    new_content_hash,
+    validate_file_size,
+    validate_image,
+    validate_resolution,
+)
+from rolca.core.uploadhandler import HEADER_LIMIT
+
+#: size of the buffer used for copying received data into the partial file
+BUFFER_SIZE = 64 * 1024
+
+
+class SessionUploadedFile(UploadedFile):
+    """Partial file of the finished upload session.
+
+    The file system storage moves files providing ``temporary_file_path``
+    instead of copying them.
+    """
+
+    def temporary_file_path(self):
+        """Return path of the partial file."""
+        return self.file.name
+
+
+def start_upload(user, filename, size):
+    """Create an upload session and an empty partial file."""
+    validate_file_size(size)
+
+    session = UploadSession.objects.create(user=user, filename=filename, size=size)
+    path = session.get_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+
+    return session
+
+
+def _check_header(session, fh, start):
+    """Read the resolution from the beginning of the partial file.
+
+    Nothing is done if the resolution is already known or if the start
+    of frame marker was not found in the first ``HEADER_LIMIT`` bytes.
+    """
+    if session.width is not None or start >= HEADER_LIMIT:
+        return
+
+    fh.seek(0)
+    try:
+        size = read_jpeg_size(fh.read(min(session.offset, HEADER_LIMIT)))
+    except ValueError:
+        # Format is validated when the upload is finalized.
+        return
+
+    if size is not None:
+        validate_resolution(*size)
+        session.width, session.height = size
+
+
+def append_chunk(session, stream, length):
+    """Append ``length`` bytes read from ``stream`` to the partial file.
+
+    ``session`` should be locked with ``select_for_update``. If the
+    stream ends prematurely, the bytes received so far are kept and the
+    upload can be continued from the new offset.
+    ``django.core.exceptions.ValidationError`` is raised if the limits
+    are exceeded.
+    """
+    start = session.offset
+    if start + length > session.size:
+        raise ValidationError("Chunk exceeds the declared size of the upload.")
+
+    with open(session.get_path(), 'r+b') as fh:
+        # Drop leftovers of a previously interrupted write.
+        fh.truncate(start)
+        fh.seek(start)
+
+        remaining = length
+        while remaining:
+            data = stream.read(min(BUFFER_SIZE, remaining))
+            if not data:
+                break
+            fh.write(data)
+            remaining -= len(data)
+
+        session.offset = start + length - remaining
+        _check_header(session, fh, start)
+
+    session.save(update_fields=['offset', 'width', 'height', 'modified'])
+
+
+def _compute_digest(path):
+    """Return content digest of the file at the given path."""
+    content_hash = new_content_hash()
+    with open(path, 'rb') as fh:
+        for data in iter(lambda: fh.read(BUFFER_SIZE), b''):
+            content_hash.update(data)
+    return content_hash.hexdigest()
+
+
+def finalize_upload(session):
+    """Turn the completed upload session into a ``File`` object.
+
+    The session and its partial file are removed.
+    ``django.core.exceptions.ValidationError`` is raised if the upload is
+    not complete or the uploaded file is not a valid photo.
+    """
+    if not session.is_complete():
+        raise ValidationError("Upload is not complete.")
+
+    path = session.get_path()
+    upload = SessionUploadedFile(
+        open(path, 'rb'),
+        name=session.filename,
+        content_type='image/jpeg',
+        size=session.size,
+    )
+    # Hash state can't be kept between requests, so the assembled file is
+    # read once here instead.
+    upload.content_digest = _compute_digest(path)
+
+    try:
+        # Run the same validation as uploads through the serializers.
+        forms.ImageField().clean(upload)
+        validate_image(upload)
+
+        file = File(user=session.user, file=upload)
+        try:
+            file.prepare()
+            with transaction.atomic():
+                file.save()
+                session.delete()
+        except (OSError, UnidentifiedImageError):
+            raise ValidationError("Upload a valid image.")
+    finally:
+        upload.close()
+
+    return file
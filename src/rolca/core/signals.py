@@ -0,0 +1,117 @@
+""".. Ignore pydocstyle D400.
+
+===============
+Signal Handlers
+===============
+
+"""
+import os
+
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from rolca.core.archive import invalidate_contest_archives
+from rolca.core.cleanup import schedule_orphan_collection
+from rolca.core.counters import change_theme_counters
+from rolca.core.deletion import flush_deletions, schedule_deletion
+from rolca.core.models import (
+    Contest,
+    ContestArchive,
+    Derivative,
+    File,
+    Submission,
+    UploadSession,
+)
+
+
+@receiver([post_save, post_delete], sender=Submission)
+def archive_submission_handler(sender, instance, **kwargs):
+    """Invalidate archive of the contest when its submission changes."""
+    invalidate_contest_archives(contest__themes=instance.theme_id)
+
+
+@receiver([post_save, post_delete], sender=File)
+def archive_file_handler(sender, instance, **kwargs):
+    """Invalidate archive of the contest when its file changes."""
+    if instance.submission_id is not None:
+        invalidate_contest_archives(contest__themes__submission=instance.submission_id)
+
+
+@receiver(pre_delete, sender=File)
+def deletion_file_handler(sender, instance, **kwargs):
+    """Schedule deletion of the stored photo and thumbnail."""
+    schedule_deletion(instance.file.name, instance.thumbnail.name)
+
+
+@receiver(pre_delete, sender=Derivative)
+def deletion_derivative_handler(sender, instance, **kwargs):
+    """Schedule deletion of the stored derivative."""
+    schedule_deletion(instance.image.name)
+
+
+@receiver(pre_delete, sender=ContestArchive)
+def deletion_archive_handler(sender, instance, **kwargs):
+    """Schedule deletion of the stored archive."""
+    schedule_deletion(instance.file.name)
+
+
+@receiver(pre_delete, sender=Contest)
+def deletion_contest_handler(sender, instance, **kwargs):
+    """Schedule deletion of the stored header image."""
+    schedule_deletion(instance.header_image.name)
+
+
+@receiver(post_delete, sender=File)
+@receiver(post_delete, sender=Derivative)
+@receiver(post_delete, sender=ContestArchive)
+@receiver(post_delete, sender=Contest)
+def deletion_flush_handler(sender, instance, **kwargs):
+    """Store deletions scheduled for the deleted objects."""
+    flush_deletions()
+
+
+@receiver(post_delete, sender=UploadSession)
+def upload_session_post_delete_handler(sender, instance, **kwargs):
+    """Delete partial file of the upload together with the object."""
+    path = instance.get_path()
+    if os.path.exists(path):
+        os.unlink(path)
+
+
+@receiver(post_save, sender=File)
+def orphan_collection_handler(sender, instance, created, **kwargs):
+    """Periodically collect orphaned uploads when new files are uploaded."""
+    if created:
+        schedule_orphan_collection()
+
+
+@receiver(pre_save, sender=Submission)
+def counters_pre_save_handler(sender, instance, update_fields=None, **kwargs):
+    """Remember the stored theme of the changed submission."""
+    instance._stored_theme_id = None
+    if instance._state.adding or (
+        update_fields is not None and 'theme' not in update_fields
+    ):
+        return
+
+    instance._stored_theme_id = (
+        Submission.objects.filter(pk=instance.pk)
+        .values_list('theme', flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Submission)
+def counters_post_save_handler(sender, instance, created, **kwargs):
+    """Count the new or moved submission in its theme and contest."""
+    if created:
+        change_theme_counters(instance.theme_id, total=1)
+    elif instance._stored_theme_id not in (None, instance.theme_id):
+        change_theme_counters(instance._stored_theme_id, total=-1)
+        change_theme_counters(instance.theme_id, total=1)
+
+
+@receiver(post_delete, sender=Submission)
+def counters_post_delete_handler(sender, instance, **kwargs):
+    """Remove the deleted submission from counters."""
+    change_theme_counters(instance.theme_id, total=-1)
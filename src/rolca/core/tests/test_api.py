@@ -1,19 +1,70 @@
 import io
+import json
+import os
+import threading
+import time
 from datetime import date, timedelta
 
+from channels.layers import ChannelFull
 from mock import MagicMock, Mock, patch
 from PIL import Image
 
 from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test.utils import override_settings
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
 
+from drf_user.models import Email
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.test import APIRequestFactory, APITestCase, force_authenticate
 
-from rolca.core.api.views import ContestViewSet, FileViewSet, SubmissionViewSet
-from rolca.core.models import Author, Contest, File, Submission, Theme
+from rolca.core.api.compiled import CompiledReadMixin
+from rolca.core.api.views import (
+    ContestViewSet,
+    FileViewSet,
+    SubmissionSetViewSet,
+    SubmissionViewSet,
+    UploadSessionViewSet,
+    get_upload_pool,
+)
+from rolca.core.consumers import CoreConsumer
+from rolca.core.counters import change_theme_counters
+from rolca.core.models import (
+    Author,
+    Contest,
+    File,
+    OutgoingEmail,
+    Submission,
+    SubmissionSet,
+    Theme,
+    UploadSession,
+)
+from rolca.payment.models import Payment
+from rolca.rating.api.serializers import SubmissionResultsSerializer
+from rolca.rating.api.views import (
+    ContestViewSet as RatingContestViewSet,
+    SubmissionResultsViewSet,
+    SubmissionViewSet as RatingSubmissionViewSet,
+    ThemeResultsViewSet,
+)
+from rolca.rating.cache import get_cached, get_results_key, set_cached
+from rolca.rating.models import (
+    AuthorReward,
+    Judge,
+    Rating,
+    SubmissionReward,
+    ThemeResults,
+)
 
 
 def generate_photo():
@@ -24,6 +75,15 @@ def generate_photo():
     return file
 
 
+def generate_truncated_photo():
+    """Return photo with valid headers which can't be decoded."""
+    file = io.BytesIO()
+    image = Image.frombytes('RGB', (200, 200), os.urandom(200 * 200 * 3))
+    image.save(file, 'jpeg')
+    data = file.getvalue()
+    return data[: len(data) * 3 // 4]
+
+
 class ContestApiTest(APITestCase):
     def setUp(self):
         self.factory = APIRequestFactory()
@@ -177,11 +237,11 @@ class SubmissionViewSetTest(APITestCase):
             user=self.creator, title='Test contest', start_date=today, end_date=tomorrow
         )
 
-        theme = Theme.objects.create(
+        self.theme = theme = Theme.objects.create(
             title='Test theme', contest=self.contest, n_photos=2
         )
 
-        author1 = Author.objects.create(user=self.user1)
+        self.author1 = author1 = Author.objects.create(user=self.user1)
         author2 = Author.objects.create(user=self.user2)
 
         file_mock = SimpleUploadedFile('photo.jpg', b'fake photo')
@@ -233,6 +293,76 @@ class SubmissionViewSetTest(APITestCase):
         viewset_mock.request = Mock(user=self.user2)
         self.assertEqual(len(SubmissionViewSet.get_queryset(viewset_mock)), 3)
 
+    def create_submissions(self, n_submissions, author_pk=None):
+        files = [
+            File.objects.create(pk=10 + i, user=self.user1, file=self.file1.file.name)
+            for i in range(n_submissions)
+        ]
+        data = [
+            {
+                'author': {'id': author_pk or self.author1.pk},
+                'theme': self.theme.pk,
+                'title': 'Photo {}'.format(i),
+                'files': [{'id': file.pk}],
+            }
+            for i, file in enumerate(files)
+        ]
+        request = APIRequestFactory().post('', data, format='json')
+        force_authenticate(request, self.user1)
+        view = SubmissionViewSet.as_view({'post': 'create'})
+        with CaptureQueriesContext(connection) as queries:
+            response = view(request)
+        return response, len(queries)
+
+    def test_bulk_create(self):
+        response, n_queries = self.create_submissions(4)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 4)
+        self.assertEqual(response.data[3]['files'], [{'id': 13}])
+
+        submissions = Submission.objects.filter(title__startswith='Photo')
+        self.assertEqual(submissions.count(), 4)
+        for submission in submissions:
+            self.assertEqual(submission.author, self.author1)
+            self.assertEqual(submission.user, self.user1)
+            self.assertEqual(submission.files.count(), 1)
+        self.assertEqual(SubmissionSet.objects.get().submissions.count(), 4)
+
+        self.theme.refresh_from_db()
+        self.assertEqual(self.theme.n_submissions, 7)
+
+        # Number of queries doesn't depend on the number of submissions.
+        Submission.objects.filter(title__startswith='Photo').delete()
+        File.objects.filter(pk__gte=10).delete()
+        _, n_queries_single = self.create_submissions(1)
+        self.assertEqual(n_queries, n_queries_single)
+
+    @patch('rolca.core.outbox.send_to_worker')
+    def test_create_confirmation(self, send_mock):
+        self.contest.confirmation_email = Email.objects.create(
+            subject='Confirmation', body='Thanks!'
+        )
+        self.contest.save()
+        self.user1.email = 'user1@example.com'
+        self.user1.save()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response, _ = self.create_submissions(2)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # Email is sent by the worker.
+        self.assertEqual(len(mail.outbox), 0)
+        send_mock.assert_called_once_with('core.email')
+        outgoing = OutgoingEmail.objects.get()
+        self.assertEqual(outgoing.recipient, 'user1@example.com')
+        self.assertEqual(outgoing.email, self.contest.confirmation_email)
+
+    def test_bulk_create_invalid(self):
+        response, _ = self.create_submissions(2, author_pk=999)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('author', response.data[0])
+        self.assertFalse(Submission.objects.filter(title__startswith='Photo').exists())
+
 
 @override_settings(ROLCA_MAX_UPLOAD_SIZE=1024**2)
 @override_settings(ROLCA_MAX_UPLOAD_RESOLUTION=480)
@@ -249,6 +379,9 @@ class FileViewSetTest(APITestCase):
                 'post': 'create',
             }
         )
+        self.batch_view = FileViewSet.as_view(
+            {'post': 'batch'}, **FileViewSet.batch.kwargs
+        )
 
     def get_upload_request(self):
         photo = generate_photo().read()
@@ -277,7 +410,54 @@ class FileViewSetTest(APITestCase):
         resp = self.file_view(request)
         self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
         self.assertEqual(File.objects.count(), 1)
-        self.assertEqual(File.objects.first().file.read(), generate_photo().read())
+        file = File.objects.first()
+        self.assertEqual(file.file.read(), generate_photo().read())
+        # Photo and thumbnail share the name generated from a single digest.
+        self.assertEqual(
+            os.path.basename(file.file.name)[:32],
+            os.path.basename(file.thumbnail.name)[:32],
+        )
+
+    @override_settings(ROLCA_ASYNC_THUMBNAILS=True)
+    def test_create_async_thumbnail(self):
+        request = self.get_upload_request()
+        force_authenticate(request, self.user)
+
+        with patch('rolca.core.models.send_to_worker') as send_mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.file_view(request)
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertIsNone(resp.data['thumbnail'])
+        self.assertEqual(resp.data['status'], File.PROCESSING)
+        send_mock.assert_called_once_with('core.thumbnail', file_pk=resp.data['id'])
+
+        CoreConsumer().core_thumbnail({'file_pk': resp.data['id']})
+
+        file = File.objects.get(pk=resp.data['id'])
+        self.assertEqual(file.status, File.DONE)
+        self.assertEqual(file.thumbnail.width, 100)
+
+    @override_settings(ROLCA_ASYNC_THUMBNAILS=True)
+    def test_process_thumbnails_command(self):
+        request = self.get_upload_request()
+        force_authenticate(request, self.user)
+
+        # Worker is never triggered when the channel is full.
+        with patch('rolca.core.worker.get_channel_layer') as layer_mock:
+            layer_mock.return_value.send.side_effect = ChannelFull
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.file_view(request)
+        self.assertEqual(resp.data['status'], File.PROCESSING)
+
+        out = io.StringIO()
+        call_command('processthumbnails', stdout=out)
+        self.assertIn("Processed 0 files, 0 failed.", out.getvalue())
+
+        call_command('processthumbnails', min_age=0, stdout=out)
+        self.assertIn("Processed 1 files, 0 failed.", out.getvalue())
+        file = File.objects.get(pk=resp.data['id'])
+        self.assertEqual(file.status, File.DONE)
+        self.assertEqual(file.thumbnail.width, 100)
 
     @override_settings(ROLCA_MAX_UPLOAD_SIZE=10)
     def test_create_exceed_size(self):
@@ -288,6 +468,27 @@ class FileViewSetTest(APITestCase):
         self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(resp.data['file'][0], "Max size of file is 10B.")
 
+    def test_create_abort_res(self):
+        photo = io.BytesIO()
+        Image.new('RGB', (1000, 1000)).save(photo, 'jpeg')
+        request = self.factory.post(
+            '',
+            photo.getvalue(),
+            content_type='image/jpeg',
+            HTTP_CONTENT_DISPOSITION='attachment; filename=test.jpg;',
+        )
+        force_authenticate(request, self.user)
+
+        with patch('rolca.core.uploadhandler.validate_resolution') as validate_mock:
+            validate_mock.side_effect = ValidationError(
+                "Max photo resolution is 480px."
+            )
+            resp = self.file_view(request)
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(resp.data['file'][0], "Max photo resolution is 480px.")
+        validate_mock.assert_called_once_with(1000, 1000)
+
     @override_settings(ROLCA_MAX_UPLOAD_RESOLUTION=10)
     def test_create_exceed_res(self):
         request = self.get_upload_request()
@@ -296,3 +497,722 @@ class FileViewSetTest(APITestCase):
         resp = self.file_view(request)
         self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(resp.data['file'][0], "Max photo resolution is 10px.")
+
+    @override_settings(ROLCA_MAX_IMAGE_PIXELS=5000)
+    def test_create_exceed_pixels(self):
+        request = self.get_upload_request()
+        force_authenticate(request, self.user)
+
+        resp = self.file_view(request)
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(resp.data['file'][0], "Max photo size is 5000 pixels.")
+        self.assertEqual(File.objects.count(), 0)
+
+    def get_batch_request(self, count):
+        photos = [
+            SimpleUploadedFile('test{}.jpg'.format(i), generate_photo().read())
+            for i in range(count)
+        ]
+        request = self.factory.post('', {'file': photos}, format='multipart')
+        force_authenticate(request, self.user)
+        return request
+
+    def test_batch(self):
+        resp = self.batch_view(self.get_batch_request(3))
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(resp.data), 3)
+        self.assertEqual(File.objects.count(), 3)
+        for file in File.objects.all():
+            self.assertEqual(file.user, self.user)
+            self.assertEqual(file.width, 100)
+            self.assertEqual(file.thumbnail.width, 100)
+
+    def test_batch_pool(self):
+        with patch('rolca.core.api.views.close_old_connections') as close_mock:
+            resp = self.batch_view(self.get_batch_request(2))
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        # Connections opened by pool threads are closed after each photo.
+        self.assertEqual(close_mock.call_count, 2)
+
+        max_workers = get_upload_pool()._max_workers
+        with override_settings(ROLCA_UPLOAD_WORKERS=max_workers + 1):
+            self.assertEqual(get_upload_pool()._max_workers, max_workers + 1)
+        self.assertEqual(get_upload_pool()._max_workers, max_workers)
+
+    def test_batch_invalid(self):
+        photos = [
+            SimpleUploadedFile('test.jpg', generate_photo().read()),
+            SimpleUploadedFile('test.jpg', b'not an image'),
+        ]
+        request = self.factory.post('', {'file': photos}, format='multipart')
+        force_authenticate(request, self.user)
+
+        resp = self.batch_view(request)
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(resp.data[0], {})
+        self.assertIn('file', resp.data[1])
+        self.assertEqual(File.objects.count(), 0)
+
+    def test_batch_corrupt(self):
+        photos = [
+            SimpleUploadedFile('test.jpg', generate_photo().read()),
+            SimpleUploadedFile('test.jpg', generate_truncated_photo()),
+        ]
+        request = self.factory.post('', {'file': photos}, format='multipart')
+        force_authenticate(request, self.user)
+
+        resp = self.batch_view(request)
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(resp.data[0], {})
+        self.assertEqual(resp.data[1], {'file': ["Upload a valid image."]})
+        self.assertEqual(File.objects.count(), 0)
+
+    @override_settings(ROLCA_MAX_BATCH_UPLOAD=2)
+    def test_batch_too_many(self):
+        resp = self.batch_view(self.get_batch_request(3))
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(File.objects.count(), 0)
+
+
+@override_settings(ROLCA_MAX_UPLOAD_SIZE=1024**2)
+@override_settings(ROLCA_MAX_UPLOAD_RESOLUTION=480)
+class UploadSessionViewSetTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user_model = get_user_model()
+        cls.user = user_model.objects.create_user(username='user')
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.list_view = UploadSessionViewSet.as_view({'post': 'create'})
+        self.detail_view = UploadSessionViewSet.as_view(
+            {'get': 'retrieve', 'patch': 'partial_update', 'delete': 'destroy'}
+        )
+        self.finalize_view = UploadSessionViewSet.as_view({'post': 'finalize'})
+        self.photo = generate_photo().read()
+
+    def start(self, size=None):
+        request = self.factory.post(
+            '',
+            {'filename': 'test.jpg', 'size': size or len(self.photo)},
+            format='json',
+        )
+        force_authenticate(request, self.user)
+        resp = self.list_view(request)
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        return resp.data['id']
+
+    def send_chunk(self, pk, offset, data):
+        request = self.factory.patch(
+            '',
+            data,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+        force_authenticate(request, self.user)
+        return self.detail_view(request, pk=pk)
+
+    def finalize(self, pk):
+        request = self.factory.post('')
+        force_authenticate(request, self.user)
+        return self.finalize_view(request, pk=pk)
+
+    def test_upload(self):
+        pk = self.start()
+        path = UploadSession.objects.get(pk=pk).get_path()
+
+        resp = self.send_chunk(pk, 0, self.photo[:100])
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['offset'], 100)
+        self.assertEqual(resp['Upload-Offset'], '100')
+        # Resolution is read as soon as the start of frame is received.
+        self.assertEqual(resp.data['width'], None)
+
+        resp = self.send_chunk(pk, 100, self.photo[100:400])
+        self.assertEqual(resp.data['offset'], 400)
+        self.assertEqual(resp.data['width'], 100)
+
+        resp = self.send_chunk(pk, 400, self.photo[400:])
+        self.assertEqual(resp.data['offset'], len(self.photo))
+
+        resp = self.finalize(pk)
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        file = File.objects.get(pk=resp.data['id'])
+        self.assertEqual(file.file.read(), self.photo)
+        self.assertEqual(file.user, self.user)
+        self.assertEqual(file.width, 100)
+        self.assertEqual(file.thumbnail.width, 100)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_offset_mismatch(self):
+        pk = self.start()
+        self.send_chunk(pk, 0, self.photo[:100])
+
+        # Chunk is resent after the response was lost.
+        resp = self.send_chunk(pk, 0, self.photo[:100])
+        self.assertEqual(resp.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(resp.data['offset'], 100)
+
+        resp = self.send_chunk(pk, 100, self.photo[100:])
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.finalize(pk).status_code, status.HTTP_201_CREATED)
+
+    def test_finalize_incomplete(self):
+        pk = self.start()
+        self.send_chunk(pk, 0, self.photo[:100])
+
+        resp = self.finalize(pk)
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(UploadSession.objects.get(pk=pk).offset, 100)
+
+    def test_finalize_corrupt(self):
+        photo = generate_truncated_photo()
+        pk = self.start(size=len(photo))
+        path = UploadSession.objects.get(pk=pk).get_path()
+        self.send_chunk(pk, 0, photo)
+
+        resp = self.finalize(pk)
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(resp.data['file'][0], "Upload a valid image.")
+        self.assertFalse(File.objects.exists())
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    @override_settings(ROLCA_MAX_UPLOAD_SIZE=10)
+    def test_exceed_size(self):
+        request = self.factory.post(
+            '', {'filename': 'test.jpg', 'size': 11}, format='json'
+        )
+        force_authenticate(request, self.user)
+        resp = self.list_view(request)
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(resp.data['size'][0], "Max size of file is 10B.")
+
+    def test_exceed_declared_size(self):
+        pk = self.start(size=10)
+        resp = self.send_chunk(pk, 0, self.photo[:100])
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(UploadSession.objects.exists())
+
+    @override_settings(ROLCA_MAX_UPLOAD_RESOLUTION=10)
+    def test_exceed_res(self):
+        pk = self.start()
+        path = UploadSession.objects.get(pk=pk).get_path()
+
+        resp = self.send_chunk(pk, 0, self.photo[:1000])
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(resp.data['file'][0], "Max photo resolution is 10px.")
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_other_user(self):
+        pk = self.start()
+        other_user = get_user_model().objects.create_user(username='other')
+
+        request = self.factory.get('')
+        force_authenticate(request, other_user)
+        resp = self.detail_view(request, pk=pk)
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class QueryCountTest(APITestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.user = get_user_model().objects.create_user(
+            username='user', email='user@example.com', is_superuser=True
+        )
+        self.author = Author.objects.create(user=self.user)
+
+    def create_contest(self):
+        today = date.today()
+        contest = Contest.objects.create(
+            user=self.user,
+            title='Test contest',
+            start_date=today,
+            end_date=today + timedelta(days=1),
+            publish_date=today + timedelta(days=2),
+        )
+        judge = Judge.objects.create(contest=contest, judge=self.user)
+
+        for _ in range(2):
+            theme = Theme.objects.create(title='Theme', contest=contest, n_photos=2)
+            paid, unpaid = [
+                Submission.objects.create(
+                    user=self.user, author=self.author, theme=theme
+                )
+                for _ in range(2)
+            ]
+            for submission, is_paid in [(paid, True), (unpaid, False)]:
+                File.objects.create(
+                    file=SimpleUploadedFile('photo.jpg', generate_photo().read()),
+                    submission=submission,
+                )
+                submission_set = SubmissionSet.objects.create(
+                    contest=contest, author=self.author
+                )
+                submission_set.submissions.add(submission)
+                Payment.objects.create(submissionset=submission_set, paid=is_paid)
+            Rating.objects.create(
+                user=self.user, judge=judge, submission=paid, rating=3
+            )
+
+    def count_queries(self, view):
+        request = self.factory.get('')
+        force_authenticate(request, self.user)
+        with CaptureQueriesContext(connection) as context:
+            resp = view(request)
+            resp.render()
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return len(context), resp.data['results']
+
+    def test_contest_list(self):
+        view = ContestViewSet.as_view({'get': 'list'})
+
+        self.create_contest()
+        queries, data = self.count_queries(view)
+        self.assertEqual(data[0]['themes'][0]['submissions_number'], 2)
+
+        self.create_contest()
+        self.create_contest()
+        self.assertEqual(self.count_queries(view)[0], queries)
+
+    def test_rating_contest_list(self):
+        view = RatingContestViewSet.as_view({'get': 'list'})
+
+        self.create_contest()
+        queries, data = self.count_queries(view)
+        self.assertEqual(data[0]['themes'][0]['submissions_number'], 1)
+        self.assertEqual(data[0]['themes'][0]['ratings_number'], 1)
+
+        self.create_contest()
+        self.create_contest()
+        self.assertEqual(self.count_queries(view)[0], queries)
+
+    def test_submission_list(self):
+        view = SubmissionViewSet.as_view({'get': 'list'})
+
+        self.create_contest()
+        queries, data = self.count_queries(view)
+        self.assertEqual(data[0]['author']['email'], 'user@example.com')
+        self.assertEqual(len(data[0]['files']), 1)
+
+        self.create_contest()
+        self.create_contest()
+        self.assertEqual(self.count_queries(view)[0], queries)
+
+    def test_submission_set_list(self):
+        view = SubmissionSetViewSet.as_view({'get': 'list'})
+
+        self.create_contest()
+        queries, data = self.count_queries(view)
+        self.assertEqual(data[0]['author']['email'], 'user@example.com')
+        self.assertEqual(len(data[0]['submissions'][0]['files']), 1)
+
+        self.create_contest()
+        self.create_contest()
+        self.assertEqual(self.count_queries(view)[0], queries)
+
+    def test_rating_submission_list(self):
+        view = RatingSubmissionViewSet.as_view({'get': 'list'})
+
+        self.create_contest()
+        queries, data = self.count_queries(view)
+        self.assertEqual(len(data), 2)
+
+        self.create_contest()
+        self.create_contest()
+        self.assertEqual(self.count_queries(view)[0], queries)
+
+
+class PaginationTest(APITestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.view = SubmissionViewSet.as_view({'get': 'list'})
+        self.user = get_user_model().objects.create_user(username='user')
+        author = Author.objects.create(user=self.user)
+
+        today = date.today()
+        contest = Contest.objects.create(
+            user=self.user,
+            title='Test contest',
+            start_date=today,
+            end_date=today,
+            publish_date=today + timedelta(days=1),
+        )
+        theme = Theme.objects.create(title='Theme', contest=contest, n_photos=5)
+        self.submissions = [
+            Submission.objects.create(user=self.user, author=author, theme=theme)
+            for _ in range(5)
+        ]
+
+    def get(self, url):
+        request = self.factory.get(url)
+        force_authenticate(request, self.user)
+        resp = self.view(request)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.data
+
+    def test_pages(self):
+        ids, url = [], '/submission/?page_size=2'
+        while url:
+            data = self.get(url)
+            self.assertLessEqual(len(data['results']), 2)
+            ids.extend(submission['id'] for submission in data['results'])
+            url = data['next']
+
+        self.assertEqual(ids, [submission.pk for submission in self.submissions])
+
+    @override_settings(ROLCA_PAGE_SIZE=3)
+    def test_page_size_setting(self):
+        data = self.get('/submission/')
+        self.assertEqual(len(data['results']), 3)
+        self.assertIsNone(data['previous'])
+        self.assertIsNotNone(data['next'])
+
+    def test_opt_out(self):
+        data = self.get('/submission/?paginate=false')
+        self.assertEqual(len(data), 5)
+        self.assertEqual(data[0]['id'], self.submissions[0].pk)
+
+
+class SparseFieldsTest(APITestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.view = SubmissionViewSet.as_view({'get': 'list'})
+        self.user = get_user_model().objects.create_user(username='user')
+        author = Author.objects.create(user=self.user, first_name='Jane')
+
+        today = date.today()
+        contest = Contest.objects.create(
+            user=self.user,
+            title='Test contest',
+            start_date=today,
+            end_date=today,
+            publish_date=today + timedelta(days=1),
+        )
+        theme = Theme.objects.create(title='Theme', contest=contest, n_photos=1)
+        self.submission = Submission.objects.create(
+            user=self.user, author=author, theme=theme, title='Title'
+        )
+        self.file = File.objects.create(
+            file=SimpleUploadedFile('photo.jpg', generate_photo().read()),
+            submission=self.submission,
+        )
+
+    def get(self, url):
+        request = self.factory.get(url)
+        force_authenticate(request, self.user)
+        with CaptureQueriesContext(connection) as context:
+            resp = self.view(request)
+            resp.render()
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return resp.data['results'][0], [query['sql'] for query in context]
+
+    def test_fields(self):
+        data, queries = self.get('/?fields=id,title,files.thumbnail')
+        self.assertEqual(
+            data,
+            {
+                'id': self.submission.pk,
+                'title': 'Title',
+                'files': [{'thumbnail': 'http://testserver' + self.file.thumbnail.url}],
+            },
+        )
+
+        submission_query, file_query = queries[-2:]
+        self.assertNotIn('core_author', submission_query)
+        self.assertNotIn('description', submission_query)
+        self.assertIn('thumbnail', file_query)
+        self.assertNotIn('camera', file_query)
+        self.assertNotIn('derivative', ' '.join(queries))
+
+    def test_expand(self):
+        data, queries = self.get('/?expand=author')
+        self.assertEqual(data['author']['first_name'], 'Jane')
+        self.assertNotIn('files', data)
+        self.assertIn('description', data)
+        self.assertFalse(any('core_file' in query for query in queries))
+
+        data, _ = self.get('/?fields=id,author&expand=')
+        self.assertEqual(data, {'id': self.submission.pk})
+
+        data, _ = self.get('/?fields=id,author.first_name&expand=')
+        self.assertEqual(
+            data, {'id': self.submission.pk, 'author': {'first_name': 'Jane'}}
+        )
+
+    def test_all_fields(self):
+        data, _ = self.get('/')
+        self.assertIn('author', data)
+        self.assertIn('derivatives', data['files'][0])
+
+
+class ResultsApiTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.user = get_user_model().objects.create_user(username='user')
+        self.author = author = Author.objects.create(user=self.user)
+
+        today = date.today()
+        self.contest = Contest.objects.create(
+            user=self.user,
+            title='Test contest',
+            start_date=today - timedelta(days=3),
+            end_date=today - timedelta(days=2),
+            publish_date=today - timedelta(days=1),
+        )
+        self.theme = Theme.objects.create(
+            title='Theme', contest=self.contest, n_photos=2
+        )
+        ThemeResults.objects.create(theme=self.theme, accepted_threshold=1)
+        self.judge = Judge.objects.create(contest=self.contest, judge=self.user)
+        self.submission = Submission.objects.create(
+            user=self.user, author=author, theme=self.theme
+        )
+        Rating.objects.create(judge=self.judge, submission=self.submission, rating=2)
+
+    def get(self, view, path='/', headers={}, **kwargs):
+        request = self.factory.get(path, **headers)
+        force_authenticate(request, self.user)
+        return view(request, **kwargs)
+
+
+class ConditionalGetTest(ResultsApiTestCase):
+    def assertConditional(self, view, **kwargs):
+        resp = self.get(view, **kwargs)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        etag = resp['ETag']
+
+        serializer_class = view.cls.serializer_class
+        with patch.object(serializer_class, 'to_representation') as serializer_mock:
+            resp = self.get(view, headers={'HTTP_IF_NONE_MATCH': etag}, **kwargs)
+            self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(resp['ETag'], etag)
+
+        serializer_mock.assert_not_called()
+        return etag
+
+    def test_contest_list(self):
+        view = ContestViewSet.as_view({'get': 'list'})
+        etag = self.assertConditional(view)
+
+        self.theme.title = 'New title'
+        self.theme.save()
+        resp = self.get(view, headers={'HTTP_IF_NONE_MATCH': etag})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(resp['ETag'], etag)
+
+    def test_contest_list_submission(self):
+        view = ContestViewSet.as_view({'get': 'list'})
+        etag = self.get(view)['ETag']
+        modified = Contest.objects.get().modified
+
+        Submission.objects.create(user=self.user, author=self.author, theme=self.theme)
+        resp = self.get(view, headers={'HTTP_IF_NONE_MATCH': etag})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(Contest.objects.get().modified, modified)
+
+    def test_delete(self):
+        other = Contest.objects.create(
+            title='Other contest', start_date=date.today(), end_date=date.today()
+        )
+        self.contest.save()
+
+        view = ContestViewSet.as_view({'get': 'list'})
+        resp = self.get(view)
+        self.assertNotIn('Last-Modified', resp)
+        etag = resp['ETag']
+
+        # Deletion doesn't change the latest modification time.
+        other.delete()
+        resp = self.get(view, headers={'HTTP_IF_NONE_MATCH': etag})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.data['results']), 1)
+
+        if_modified_since = http_date(time.time() + 60)
+        resp = self.get(view, headers={'HTTP_IF_MODIFIED_SINCE': if_modified_since})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_theme_results(self):
+        view = ThemeResultsViewSet.as_view({'get': 'retrieve'})
+        etag = self.assertConditional(view, pk=self.theme.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Rating.objects.update(rating=3)
+            Rating.objects.get().save()
+        resp = self.get(view, headers={'HTTP_IF_NONE_MATCH': etag}, pk=self.theme.pk)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(resp.content)['submissions'][0]['rating'], 3)
+
+    def test_submission_results(self):
+        view = SubmissionResultsViewSet.as_view({'get': 'list'})
+        etag = self.assertConditional(view)
+
+        # Submission drops below the threshold.
+        with self.captureOnCommitCallbacks(execute=True):
+            Rating.objects.get().delete()
+        resp = self.get(view, headers={'HTTP_IF_NONE_MATCH': etag})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(resp.content)['results'], [])
+
+
+class ResultsCacheTest(ResultsApiTestCase):
+    def test_theme_results(self):
+        view = ThemeResultsViewSet.as_view({'get': 'retrieve'})
+        content = self.get(view, pk=self.theme.pk).content
+
+        serializer_class = view.cls.serializer_class
+        with patch.object(serializer_class, 'to_representation') as serializer_mock:
+            self.assertEqual(self.get(view, pk=self.theme.pk).content, content)
+        serializer_mock.assert_not_called()
+
+        # Changes of other themes don't invalidate the results.
+        other_theme = Theme.objects.create(
+            title='Other', contest=self.contest, n_photos=1
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            ThemeResults.objects.create(theme=other_theme, accepted_threshold=1)
+        with patch.object(serializer_class, 'to_representation') as serializer_mock:
+            self.get(view, pk=self.theme.pk)
+        serializer_mock.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rating = Rating.objects.get()
+            rating.rating = 5
+            rating.save()
+        data = json.loads(self.get(view, pk=self.theme.pk).content)
+        self.assertEqual(data['submissions'][0]['rating'], 5)
+
+    def test_theme_results_counters(self):
+        view = ThemeResultsViewSet.as_view({'get': 'retrieve'})
+        data = json.loads(self.get(view, pk=self.theme.pk).content)
+        submissions_number = data['submissions_number']
+
+        # Counters are changed with a queryset update.
+        with self.captureOnCommitCallbacks(execute=True):
+            change_theme_counters(self.theme.pk, total=1, paid=1)
+        data = json.loads(self.get(view, pk=self.theme.pk).content)
+        self.assertEqual(data['submissions_number'], submissions_number + 1)
+
+    def test_submission_results_filters(self):
+        view = SubmissionResultsViewSet.as_view({'get': 'list'})
+        path = '/?theme={}'.format(self.theme.pk)
+        self.assertEqual(len(json.loads(self.get(view, path).content)['results']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ThemeResults.objects.update(accepted_threshold=10)
+            ThemeResults.objects.get().save()
+        self.assertEqual(json.loads(self.get(view, path).content)['results'], [])
+
+    def test_publish(self):
+        publish_date = timezone.now() + timedelta(hours=1)
+        Contest.objects.filter(pk=self.contest.pk).update(publish_date=publish_date)
+
+        view = SubmissionResultsViewSet.as_view({'get': 'list'})
+        path = '/?theme={}'.format(self.theme.pk)
+        self.assertEqual(json.loads(self.get(view, path).content)['results'], [])
+
+        # Contest is published without any change of the results.
+        after_publish = publish_date + timedelta(minutes=1)
+        with patch('django.utils.timezone.now', return_value=after_publish):
+            data = json.loads(self.get(view, path).content)
+        self.assertEqual(len(data['results']), 1)
+
+    @override_settings(ROLCA_RESULTS_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        view = ThemeResultsViewSet.as_view({'get': 'retrieve'})
+        self.get(view, pk=self.theme.pk)
+
+        serializer_class = view.cls.serializer_class
+        with patch.object(serializer_class, 'to_representation') as serializer_mock:
+            serializer_mock.return_value = {}
+            self.get(view, pk=self.theme.pk)
+        serializer_mock.assert_called_once()
+
+    def test_stampede(self):
+        key = get_results_key(['all'], 'stampede')
+        self.assertIsNone(get_cached(key))
+
+        # Other requests wait until the lock holder stores the content.
+        timer = threading.Timer(0.1, set_cached, args=(key, b'content'))
+        timer.start()
+        self.assertEqual(get_cached(key), b'content')
+        timer.join()
+
+
+@override_settings(ROLCA_RESULTS_CACHE_TIMEOUT=0)
+class CompiledSerializerTest(ResultsApiTestCase):
+    def setUp(self):
+        super().setUp()
+        File.objects.create(
+            file=SimpleUploadedFile('photo.jpg', generate_photo().read()),
+            submission=self.submission,
+        )
+        SubmissionReward.objects.create(
+            submission=self.submission, kind=SubmissionReward.GOLD, label='First'
+        )
+        AuthorReward.objects.create(
+            author=self.submission.author, theme=self.theme, label='Best'
+        )
+        Submission.objects.create(
+            user=self.user, author=self.submission.author, theme=self.theme
+        )
+
+    def assertIdentical(self, view, **kwargs):
+        compiled = self.get(view, **kwargs)
+        with patch.object(
+            CompiledReadMixin,
+            'get_serializer',
+            lambda self, *args, **kwargs: super(CompiledReadMixin, self).get_serializer(
+                *args, **kwargs
+            ),
+        ):
+            drf = self.get(view, **kwargs)
+
+        self.assertEqual(compiled.status_code, status.HTTP_200_OK)
+        self.assertEqual(compiled.render().content, drf.render().content)
+        return json.loads(compiled.content)
+
+    def test_theme_results(self):
+        view = ThemeResultsViewSet.as_view({'get': 'retrieve'})
+        data = self.assertIdentical(view, pk=self.theme.pk)
+        self.assertEqual(len(data['submissions']), 2)
+        self.assertEqual(data['submissions'][0]['reward_kind'], 'Gold')
+        self.assertEqual(len(data['submissions'][0]['files']), 1)
+
+        # Nested submissions match the plain DRF serializer.
+        request = Request(self.factory.get('/'))
+        request.user = self.user
+        submissions = Submission.objects.annotate(rating_sum=Sum('rating__rating'))
+        serializer = SubmissionResultsSerializer(
+            submissions,
+            many=True,
+            context={'request': request, 'accept_threshold': 1},
+        )
+        self.assertEqual(
+            JSONRenderer().render(data['submissions']),
+            JSONRenderer().render(serializer.data),
+        )
+
+    def test_submission_results(self):
+        view = SubmissionResultsViewSet.as_view({'get': 'list'})
+        data = self.assertIdentical(view)
+        self.assertEqual(data['results'][0]['author']['reward'], 'Best')
+
+    def test_contest_list(self):
+        view = ContestViewSet.as_view({'get': 'list'})
+        self.assertIdentical(view)
+
+    def test_judge_submissions(self):
+        Contest.objects.update(publish_date=date.today() + timedelta(days=1))
+        submission_set = SubmissionSet.objects.create(
+            contest=self.contest, author=self.submission.author
+        )
+        submission_set.submissions.add(self.submission)
+        Payment.objects.create(submissionset=submission_set, paid=True)
+
+        view = RatingSubmissionViewSet.as_view({'get': 'list'})
+        data = self.assertIdentical(view)
+        self.assertEqual(len(data['results']), 1)
@@ -0,0 +1,330 @@
+import io
+import os
+import tempfile
+import time
+from datetime import timedelta
+
+from mock import patch
+from PIL import Image
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from rolca.backup.models import FileBackup
+from rolca.core.cleanup import COLLECTION_CACHE_KEY, schedule_orphan_collection
+from rolca.core.consumers import CoreConsumer
+from rolca.core.deletion import delete_stored_files
+from rolca.core.models import (
+    Author,
+    ContentBlob,
+    Contest,
+    File,
+    StorageDeletion,
+    Submission,
+    Theme,
+    get_sharded_name,
+)
+from rolca.core.reconcile import iter_unreferenced_files
+
+
+def upload(age=None, submission=None):
+    photo = io.BytesIO()
+    Image.new('RGB', (100, 100)).save(photo, 'jpeg')
+    file = File.objects.create(
+        file=SimpleUploadedFile('photo.jpg', photo.getvalue()),
+        submission=submission,
+    )
+    if age is not None:
+        File.objects.filter(pk=file.pk).update(created=timezone.now() - age)
+    return file
+
+
+class CollectOrphansTestCase(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        contest = Contest.objects.create(
+            title='Contest', start_date=now, end_date=now, publish_date=now
+        )
+        theme = Theme.objects.create(title='Theme', contest=contest, n_photos=1)
+        author = Author.objects.create(first_name='Jane', last_name='Doe')
+        self.submission = Submission.objects.create(author=author, theme=theme)
+
+    def test_collect(self):
+        orphans = [upload(age=timedelta(days=2)) for _ in range(3)]
+        recent = upload()
+        attached = upload(age=timedelta(days=2), submission=self.submission)
+
+        storage = orphans[0].file.storage
+        names = [
+            name for file in orphans for name in (file.file.name, file.thumbnail.name)
+        ]
+        size = sum(storage.size(name) for name in names)
+        self.assertEqual(FileBackup.objects.count(), 5)
+
+        out = io.StringIO()
+        call_command('collectorphans', batch_size=2, stdout=out)
+        self.assertEqual(
+            out.getvalue().strip(),
+            "Deleted 3 files and 0 upload sessions, reclaimed {} bytes.".format(size),
+        )
+
+        self.assertQuerysetEqual(
+            File.objects.order_by('pk'), [recent, attached], transform=lambda x: x
+        )
+        self.assertEqual(FileBackup.objects.count(), 2)
+        for name in names:
+            self.assertFalse(storage.exists(name))
+
+    @override_settings(ROLCA_CONTENT_ADDRESSED_STORAGE=True)
+    def test_collect_content_addressed(self):
+        for _ in range(2):
+            upload(age=timedelta(days=2))
+        attached = upload(age=timedelta(days=2), submission=self.submission)
+        self.assertEqual(ContentBlob.objects.count(), 1)
+
+        # Shared images are not reclaimed.
+        out = io.StringIO()
+        call_command('collectorphans', stdout=out)
+        self.assertIn("Deleted 2 files", out.getvalue())
+        self.assertIn("reclaimed 0 bytes", out.getvalue())
+
+        for _ in range(2):
+            upload(age=timedelta(days=2))
+        File.objects.filter(pk=attached.pk).update(submission=None)
+        storage = attached.file.storage
+        size = storage.size(attached.file.name) + storage.size(attached.thumbnail.name)
+
+        # Images of files deleted together are counted once.
+        out = io.StringIO()
+        call_command('collectorphans', stdout=out)
+        self.assertEqual(
+            out.getvalue().strip(),
+            "Deleted 3 files and 0 upload sessions, reclaimed {} bytes.".format(size),
+        )
+        self.assertFalse(storage.exists(attached.file.name))
+
+    def test_ttl(self):
+        upload(age=timedelta(minutes=10))
+
+        call_command('collectorphans', ttl=3600, stdout=io.StringIO())
+        self.assertEqual(File.objects.count(), 1)
+
+        call_command('collectorphans', ttl=60, stdout=io.StringIO())
+        self.assertEqual(File.objects.count(), 0)
+
+    @patch('rolca.core.cleanup.send_to_worker')
+    def test_schedule(self, send_mock):
+        cache.delete(COLLECTION_CACHE_KEY)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule_orphan_collection()
+            schedule_orphan_collection()
+
+        send_mock.assert_called_once_with('core.collect_orphans')
+
+
+class StorageDeletionTestCase(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        contest = Contest.objects.create(
+            title='Contest', start_date=now, end_date=now, publish_date=now
+        )
+        theme = Theme.objects.create(title='Theme', contest=contest, n_photos=1)
+        author = Author.objects.create(first_name='Jane', last_name='Doe')
+        self.submission = Submission.objects.create(author=author, theme=theme)
+
+    @patch('rolca.core.deletion.send_to_worker')
+    def test_cascade(self, send_mock):
+        files = [upload(submission=self.submission) for _ in range(3)]
+        storage = files[0].file.storage
+        names = [
+            name for file in files for name in (file.file.name, file.thumbnail.name)
+        ]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Submission.objects.all().delete()
+
+        self.assertEqual(File.objects.count(), 0)
+        send_mock.assert_called_once_with('core.delete_storage')
+        self.assertCountEqual(
+            StorageDeletion.objects.values_list('name', flat=True), names
+        )
+        # Images are deleted by the worker.
+        for name in names:
+            self.assertTrue(storage.exists(name))
+
+        CoreConsumer().core_delete_storage({})
+        self.assertEqual(StorageDeletion.objects.count(), 0)
+        for name in names:
+            self.assertFalse(storage.exists(name))
+
+    @override_settings(ROLCA_CONTENT_ADDRESSED_STORAGE=True)
+    def test_content_addressed(self):
+        files = [upload() for _ in range(2)]
+        blob = files[0].blob
+        storage = files[0].file.storage
+
+        # Images are kept while another file references the blob.
+        File.objects.filter(pk=files[0].pk).delete()
+        delete_stored_files()
+        self.assertTrue(storage.exists(blob.file))
+        self.assertEqual(StorageDeletion.objects.count(), 0)
+
+        # Blob is released once its last file is deleted with a queryset.
+        File.objects.filter(pk=files[1].pk).delete()
+        delete_stored_files(batch_size=1)
+        self.assertFalse(ContentBlob.objects.exists())
+        self.assertFalse(storage.exists(blob.file))
+        self.assertFalse(storage.exists(blob.thumbnail))
+
+    def test_failed(self):
+        file = upload()
+        storage = file.file.storage
+        file.delete()
+
+        with patch.object(storage, 'delete', side_effect=OSError):
+            self.assertEqual(delete_stored_files(batch_size=1), 2)
+        self.assertEqual(StorageDeletion.objects.count(), 2)
+
+        delete_stored_files()
+        self.assertEqual(StorageDeletion.objects.count(), 0)
+        self.assertFalse(storage.exists(file.file.name))
+
+
+def use_temporary_media_root(test_case):
+    media_root = tempfile.TemporaryDirectory()
+    test_case.addCleanup(media_root.cleanup)
+    settings_override = override_settings(MEDIA_ROOT=media_root.name)
+    settings_override.enable()
+    test_case.addCleanup(settings_override.disable)
+
+
+class ReconcileStorageTestCase(TestCase):
+    def setUp(self):
+        use_temporary_media_root(self)
+        self.files = [upload() for _ in range(3)]
+        self.storage = self.files[0].file.storage
+
+    def add_stray(self, name, age=2 * 24 * 60 * 60):
+        path = self.storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as fh:
+            fh.write(b'stray')
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+
+    def age_files(self):
+        mtime = time.time() - 2 * 24 * 60 * 60
+        for file in self.files:
+            for name in (file.file.name, file.thumbnail.name):
+                os.utime(self.storage.path(name), (mtime, mtime))
+
+    def test_iter_unreferenced(self):
+        self.age_files()
+        for name in ['photos/0.jpg', 'photos/zz.jpg', 'photos/ab/cd/ef.jpg']:
+            self.add_stray(name)
+        self.add_stray('photos/new.jpg', age=0)
+
+        # Small runs exercise merging of several sorted runs.
+        self.assertEqual(
+            list(iter_unreferenced_files(self.storage, 'photos', 60, run_size=2)),
+            ['photos/0.jpg', 'photos/ab/cd/ef.jpg', 'photos/zz.jpg'],
+        )
+        self.assertEqual(list(iter_unreferenced_files(self.storage, 'thumbs')), [])
+
+    def test_command(self):
+        self.age_files()
+        self.add_stray('photos/stray.jpg')
+        self.add_stray('thumbs/stray.jpg')
+        # Files deleted with a queryset leave their images behind.
+        File.objects.filter(pk=self.files[0].pk).delete()
+
+        out = io.StringIO()
+        call_command('reconcilestorage', stdout=out)
+        lines = out.getvalue().splitlines()
+        size = 10 + sum(
+            self.storage.size(name)
+            for name in (self.files[0].file.name, self.files[0].thumbnail.name)
+        )
+        self.assertEqual(
+            lines[-1], "Found 4 unreferenced images with {} bytes.".format(size)
+        )
+        self.assertCountEqual(
+            lines[:-1],
+            [
+                'photos/stray.jpg',
+                'thumbs/stray.jpg',
+                self.files[0].file.name,
+                self.files[0].thumbnail.name,
+            ],
+        )
+        self.assertTrue(self.storage.exists('photos/stray.jpg'))
+
+        out = io.StringIO()
+        call_command('reconcilestorage', delete=True, stdout=out)
+        self.assertEqual(out.getvalue().strip(), lines[-1].replace('Found', 'Deleted'))
+        self.assertFalse(self.storage.exists('photos/stray.jpg'))
+        self.assertFalse(self.storage.exists(self.files[0].file.name))
+        for file in self.files[1:]:
+            self.assertTrue(self.storage.exists(file.file.name))
+            self.assertTrue(self.storage.exists(file.thumbnail.name))
+
+
+class ShardStorageTestCase(TestCase):
+    def setUp(self):
+        use_temporary_media_root(self)
+
+    def test_shard(self):
+        files = [upload() for _ in range(3)]
+        storage = files[0].file.storage
+        old_names = [(file.file.name, file.thumbnail.name) for file in files]
+        contents = [file.file.read() for file in files]
+
+        out = io.StringIO()
+        call_command('shardstorage', batch_size=2, stdout=out)
+        self.assertEqual(out.getvalue().strip(), "Moved 6 images.")
+
+        for file, (photo, thumbnail), content in zip(files, old_names, contents):
+            file.refresh_from_db()
+            self.assertEqual(file.file.name, get_sharded_name(photo))
+            self.assertEqual(file.thumbnail.name, get_sharded_name(thumbnail))
+            self.assertEqual(file.file.read(), content)
+            # Old images are kept until the delay passes.
+            self.assertTrue(storage.exists(photo))
+
+        delete_stored_files()
+        self.assertTrue(storage.exists(old_names[0][0]))
+
+        StorageDeletion.objects.update(delete_after=timezone.now())
+        self.assertEqual(delete_stored_files(), 6)
+        for photo, thumbnail in old_names:
+            self.assertFalse(storage.exists(photo))
+            self.assertFalse(storage.exists(thumbnail))
+
+        # Already sharded images are skipped.
+        out = io.StringIO()
+        call_command('shardstorage', stdout=out)
+        self.assertEqual(out.getvalue().strip(), "Moved 0 images.")
+
+    @override_settings(ROLCA_CONTENT_ADDRESSED_STORAGE=True)
+    def test_shard_content_addressed(self):
+        name = upload().file.name
+        upload()
+
+        call_command('shardstorage', delete_delay=0, stdout=io.StringIO())
+
+        blob = ContentBlob.objects.get()
+        self.assertEqual(blob.file, get_sharded_name(name))
+        self.assertCountEqual(
+            File.objects.values_list('file', flat=True), [blob.file] * 2
+        )
+
+        # Old image still referenced by a concurrent upload is kept.
+        File.objects.filter(pk=File.objects.first().pk).update(file=name)
+        delete_stored_files()
+        storage = File._meta.get_field('file').storage
+        self.assertTrue(storage.exists(name))
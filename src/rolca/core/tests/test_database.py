@@ -1,7 +1,32 @@
+import hashlib
+import io
 import unittest
 from datetime import datetime, timedelta
 
-from rolca.core.models import Author, Contest, Submission, Theme
+from mock import patch
+from PIL import Image
+
+from django.core.files import File as DjangoFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db.models.fields.files import FieldFile
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from rolca.core.deletion import delete_stored_files
+from rolca.core.models import (
+    Author,
+    ContentBlob,
+    Contest,
+    File,
+    Submission,
+    SubmissionSet,
+    Theme,
+    generate_file_filename,
+    generate_thumb_filename,
+    get_sharded_name,
+)
+from rolca.payment.models import Payment
 
 
 class DatabaseTestCase(unittest.TestCase):
@@ -44,3 +69,241 @@ class DatabaseTestCase(unittest.TestCase):
     def test_submission_str(self):
         submission = Submission(title="Test submission")
         self.assertEqual(str(submission), "Test submission")
+
+
+class FileNameTestCase(unittest.TestCase):
+    def test_shared_name(self):
+        file = File(file=SimpleUploadedFile('photo.jpg', b'fake photo'))
+
+        with patch.object(
+            FieldFile, 'chunks', side_effect=DjangoFile.chunks, autospec=True
+        ) as chunks_mock:
+            photo_name = generate_file_filename(file, 'photo.jpg')
+            thumb_name = generate_thumb_filename(file, 'photo.jpg')
+
+        # Content is read only once.
+        self.assertEqual(chunks_mock.call_count, 1)
+        self.assertEqual(
+            file.get_content_digest(), hashlib.md5(b'fake photo').hexdigest()
+        )
+        self.assertTrue(photo_name.startswith('photos/'))
+        self.assertTrue(thumb_name.startswith('thumbs/'))
+        self.assertEqual(photo_name[len('photos/') :], thumb_name[len('thumbs/') :])
+
+    def test_upload_digest(self):
+        upload = SimpleUploadedFile('photo.jpg', b'fake photo')
+        upload.content_digest = 'precomputed'
+        file = File(file=upload)
+
+        with patch.object(FieldFile, 'chunks') as chunks_mock:
+            generate_file_filename(file, 'photo.jpg')
+
+        self.assertEqual(chunks_mock.call_count, 0)
+        self.assertEqual(file.get_content_digest(), 'precomputed')
+
+    @override_settings(ROLCA_HASH_ALGORITHM='blake2b')
+    def test_blake2b(self):
+        file = File(file=SimpleUploadedFile('photo.jpg', b'fake photo'))
+        name = generate_file_filename(file, 'photo.jpg')
+
+        self.assertEqual(
+            file.get_content_digest(),
+            hashlib.blake2b(b'fake photo', digest_size=16).hexdigest(),
+        )
+        self.assertEqual(len(name), len('photos/') + 32 + len('.jpg'))
+
+    @override_settings(ROLCA_SHARDED_STORAGE=True)
+    def test_sharded(self):
+        file = File(file=SimpleUploadedFile('photo.jpg', b'fake photo'))
+        photo_name = generate_file_filename(file, 'photo.jpg')
+        thumb_name = generate_thumb_filename(file, 'photo.jpg')
+
+        name_hash = file._name_hash
+        self.assertEqual(
+            photo_name,
+            'photos/{}/{}/{}.jpg'.format(name_hash[:2], name_hash[2:4], name_hash),
+        )
+        self.assertEqual(thumb_name, 'thumbs' + photo_name[len('photos') :])
+
+    def test_sharded_name(self):
+        self.assertEqual(
+            get_sharded_name('photos/abcdef.jpg'), 'photos/ab/cd/abcdef.jpg'
+        )
+        self.assertEqual(get_sharded_name('photos/abc.jpg'), 'photos/abc.jpg')
+
+
+@override_settings(ROLCA_CONTENT_ADDRESSED_STORAGE=True)
+class ContentAddressedStorageTestCase(TestCase):
+    def upload(self, color='red'):
+        photo = io.BytesIO()
+        Image.new('RGB', (100, 100), color).save(photo, 'jpeg')
+        return File.objects.create(
+            file=SimpleUploadedFile('photo.jpg', photo.getvalue())
+        )
+
+    def test_deduplication(self):
+        file1 = self.upload()
+        file2 = self.upload()
+        file3 = self.upload(color='blue')
+
+        self.assertEqual(ContentBlob.objects.count(), 2)
+        self.assertEqual(file1.blob, file2.blob)
+        self.assertEqual(file1.file.name, file2.file.name)
+        self.assertEqual(file1.thumbnail.name, file2.thumbnail.name)
+        self.assertNotEqual(file1.file.name, file3.file.name)
+
+        storage = file1.file.storage
+        file_name, thumbnail_name = file1.file.name, file1.thumbnail.name
+
+        # Images are kept while the blob is still referenced.
+        file1.delete()
+        delete_stored_files()
+        self.assertTrue(storage.exists(file_name))
+        self.assertTrue(storage.exists(thumbnail_name))
+
+        file2.delete()
+        delete_stored_files()
+        self.assertFalse(storage.exists(file_name))
+        self.assertFalse(storage.exists(thumbnail_name))
+        self.assertEqual(ContentBlob.objects.count(), 1)
+
+        file3.delete()
+        self.assertEqual(ContentBlob.objects.count(), 0)
+
+
+class SubmissionCountersTestCase(TestCase):
+    def setUp(self):
+        now = datetime.now()
+        self.contest = Contest.objects.create(
+            title='Contest', start_date=now, end_date=now, publish_date=now
+        )
+        self.themes = [
+            Theme.objects.create(title=title, contest=self.contest, n_photos=3)
+            for title in ('Theme 1', 'Theme 2')
+        ]
+        self.author = Author.objects.create(first_name='Jane', last_name='Doe')
+
+    def submit(self, theme):
+        return Submission.objects.create(author=self.author, theme=theme)
+
+    def assertCounters(self, obj, total, paid):
+        obj.refresh_from_db()
+        self.assertEqual((obj.n_submissions, obj.n_paid_submissions), (total, paid))
+
+    def test_counters(self):
+        submissions = [self.submit(self.themes[0]) for _ in range(2)]
+        submissions.append(self.submit(self.themes[1]))
+        self.assertCounters(self.themes[0], 2, 0)
+        self.assertCounters(self.contest, 3, 0)
+
+        submission_set = SubmissionSet.objects.create(
+            contest=self.contest, author=self.author
+        )
+        submission_set.submissions.add(*submissions[1:])
+        payment = Payment.objects.create(submissionset=submission_set)
+        self.assertCounters(self.contest, 3, 0)
+
+        payment.paid = True
+        payment.save()
+        # Saving again doesn't count the submissions twice.
+        payment.save()
+        self.assertCounters(self.themes[0], 2, 1)
+        self.assertCounters(self.themes[1], 1, 1)
+        self.assertCounters(self.contest, 3, 2)
+
+        submission_set.submissions.add(submissions[0])
+        self.assertCounters(self.themes[0], 2, 2)
+
+        submission_set.submissions.remove(submissions[2])
+        self.assertCounters(self.themes[1], 1, 0)
+
+        submissions[1].delete()
+        self.assertCounters(self.themes[0], 1, 1)
+        self.assertCounters(self.contest, 2, 1)
+
+        payment.delete()
+        self.assertCounters(self.contest, 2, 0)
+
+    def create_paid_set(self, *submissions):
+        submission_set = SubmissionSet.objects.create(
+            contest=self.contest, author=self.author
+        )
+        submission_set.submissions.add(*submissions)
+        Payment.objects.create(submissionset=submission_set, paid=True)
+        return submission_set
+
+    def test_multiple_paid_sets(self):
+        submission = self.submit(self.themes[0])
+        first_set = self.create_paid_set(submission)
+        second_set = self.create_paid_set(submission)
+        # Submission in several paid sets is counted once.
+        self.assertCounters(self.themes[0], 1, 1)
+
+        first_set.submissions.remove(submission)
+        self.assertCounters(self.themes[0], 1, 1)
+        first_set.submissions.add(submission)
+        second_set.payment.delete()
+        self.assertCounters(self.themes[0], 1, 1)
+
+        Payment.objects.create(submissionset=second_set, paid=True)
+        self.assertCounters(self.themes[0], 1, 1)
+
+        submission.delete()
+        self.assertCounters(self.themes[0], 0, 0)
+        self.assertCounters(self.contest, 0, 0)
+
+    def test_reverse_sets(self):
+        submission = self.submit(self.themes[0])
+        first_set = self.create_paid_set()
+        second_set = self.create_paid_set()
+
+        submission.submissionset_set.add(first_set, second_set)
+        self.assertCounters(self.themes[0], 1, 1)
+
+        submission.submissionset_set.remove(first_set)
+        self.assertCounters(self.themes[0], 1, 1)
+        submission.submissionset_set.remove(second_set)
+        self.assertCounters(self.themes[0], 1, 0)
+
+        submission.submissionset_set.add(first_set)
+        submission.submissionset_set.clear()
+        self.assertCounters(self.themes[0], 1, 0)
+
+    def test_change_theme(self):
+        submission = self.submit(self.themes[0])
+        submission_set = SubmissionSet.objects.create(
+            contest=self.contest, author=self.author
+        )
+        submission_set.submissions.add(submission)
+        Payment.objects.create(submissionset=submission_set, paid=True)
+        self.assertCounters(self.themes[0], 1, 1)
+
+        submission.theme = self.themes[1]
+        submission.save()
+        self.assertCounters(self.themes[0], 0, 0)
+        self.assertCounters(self.themes[1], 1, 1)
+        self.assertCounters(self.contest, 1, 1)
+
+        # Saving again doesn't move the submission twice.
+        submission.save()
+        self.assertCounters(self.themes[0], 0, 0)
+        self.assertCounters(self.themes[1], 1, 1)
+
+    def test_repair(self):
+        submission = self.submit(self.themes[0])
+        self.submit(self.themes[1])
+        submission_set = SubmissionSet.objects.create(
+            contest=self.contest, author=self.author
+        )
+        submission_set.submissions.add(submission)
+        Payment.objects.create(submissionset=submission_set, paid=True)
+
+        Theme.objects.update(n_submissions=0, n_paid_submissions=0)
+        Contest.objects.update(n_submissions=10, n_paid_submissions=10)
+
+        out = io.StringIO()
+        call_command('repaircounters', stdout=out)
+        self.assertEqual(out.getvalue().strip(), "Submission counters recomputed.")
+        self.assertCounters(self.themes[0], 1, 1)
+        self.assertCounters(self.themes[1], 1, 0)
+        self.assertCounters(self.contest, 2, 1)
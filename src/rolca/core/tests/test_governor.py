@@ -0,0 +1,51 @@
+import threading
+import unittest
+
+from django.core.exceptions import ValidationError
+from django.test.utils import override_settings
+
+from rolca.core.governor import ImageGovernor
+
+
+class ImageGovernorTestCase(unittest.TestCase):
+    @override_settings(ROLCA_MAX_IMAGE_PIXELS=100)
+    def test_check(self):
+        governor = ImageGovernor(1000)
+        governor.check(10, 10)
+
+        with self.assertRaisesRegex(ValidationError, "Max photo size is 100 pixels."):
+            governor.check(10, 11)
+        self.assertEqual(governor.get_metrics()['rejected'], 1)
+
+    def test_reserve(self):
+        governor = ImageGovernor(1000)
+        events = []
+
+        def job():
+            with governor.reserve(600):
+                events.append('second')
+
+        with governor.reserve(600):
+            thread = threading.Thread(target=job)
+            thread.start()
+            # Second job waits until the first one releases the budget.
+            thread.join(timeout=0.1)
+            self.assertTrue(thread.is_alive())
+            events.append('first')
+
+        thread.join()
+        self.assertEqual(events, ['first', 'second'])
+
+        metrics = governor.get_metrics()
+        self.assertEqual(metrics['processed'], 2)
+        self.assertEqual(metrics['queued'], 1)
+        self.assertEqual(metrics['reserved'], 0)
+        self.assertEqual(metrics['peak_reserved'], 600)
+
+    def test_reserve_over_budget(self):
+        governor = ImageGovernor(1000)
+
+        # Job larger than the whole budget runs alone.
+        with governor.reserve(5000):
+            self.assertEqual(governor.get_metrics()['reserved'], 1000)
+        self.assertEqual(governor.get_metrics()['reserved'], 0)
@@ -0,0 +1,166 @@
+import datetime
+import io
+import unittest
+
+from PIL import Image, ImageChops, ImageDraw, ImageStat
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from rolca.core.deletion import delete_stored_files
+from rolca.core.imaging import (
+    encode,
+    iter_scaled,
+    open_draft,
+    read_jpeg_size,
+    read_metadata,
+)
+from rolca.core.models import File
+
+
+def generate_photo(size, exif=None):
+    photo = io.BytesIO()
+    Image.new('RGB', size, 'green').save(photo, 'jpeg', exif=exif or Image.Exif())
+    photo.seek(0)
+    return photo
+
+
+def generate_exif():
+    exif = Image.Exif()
+    exif[0x010F] = 'Canon'
+    exif[0x0110] = 'Canon EOS 5D'
+    exif[0x8769] = {0x9003: '2020:05:17 10:30:00'}
+    return exif
+
+
+class ImagingTestCase(unittest.TestCase):
+    def test_iter_scaled(self):
+        sizes = [
+            (size, image.size)
+            for size, image in iter_scaled(generate_photo((1600, 1000)), [200, 800])
+        ]
+        self.assertEqual(sizes, [(800, (800, 500)), (200, (200, 125))])
+
+    def test_no_upscale(self):
+        sizes = [
+            image.size for _, image in iter_scaled(generate_photo((300, 200)), [1200])
+        ]
+        self.assertEqual(sizes, [(300, 200)])
+
+    def test_draft_decoding(self):
+        image = Image.open(generate_photo((1600, 1000)))
+        image.draft('RGB', (400, 250))
+        # Decoder scales the image while decoding.
+        self.assertEqual(image.size, (400, 250))
+
+    def test_draft_quality(self):
+        # Fine stripes alias if the photo is decoded too close to the target.
+        image = Image.new('RGB', (1600, 1000), 'white')
+        draw = ImageDraw.Draw(image)
+        for x in range(0, 1600, 6):
+            draw.line([(x, 0), (x + 200, 1000)], fill='black', width=2)
+        photo = io.BytesIO()
+        image.save(photo, 'jpeg', quality=95)
+
+        draft = open_draft(io.BytesIO(photo.getvalue()), 400)
+        self.assertEqual(draft.size, (800, 500))
+        _, thumbnail = next(iter_scaled(draft, [400]))
+
+        reference = Image.open(io.BytesIO(photo.getvalue()))
+        reference = reference.resize((400, 250), Image.LANCZOS)
+        difference = ImageStat.Stat(ImageChops.difference(thumbnail, reference))
+        self.assertLess(max(difference.mean), 4)
+
+    def test_read_metadata(self):
+        metadata = read_metadata(generate_photo((300, 200), exif=generate_exif()))
+        self.assertEqual(
+            metadata,
+            {
+                'width': 300,
+                'height': 200,
+                'format': 'JPEG',
+                'taken': datetime.datetime(2020, 5, 17, 10, 30),
+                'camera': 'Canon EOS 5D',
+            },
+        )
+
+        metadata = read_metadata(generate_photo((300, 200)))
+        self.assertIsNone(metadata['taken'])
+        self.assertEqual(metadata['camera'], '')
+
+    def test_read_jpeg_size(self):
+        photo = generate_photo((300, 200), exif=generate_exif()).read()
+        self.assertEqual(read_jpeg_size(photo), (300, 200))
+        self.assertEqual(read_jpeg_size(photo[:1024]), (300, 200))
+        self.assertIsNone(read_jpeg_size(photo[:20]))
+        with self.assertRaises(ValueError):
+            read_jpeg_size(b'not a jpeg')
+
+    def test_encode(self):
+        image = Image.new('RGB', (10, 10))
+        self.assertEqual(Image.open(encode(image)).format, 'JPEG')
+        self.assertEqual(Image.open(encode(image, 'WEBP')).format, 'WEBP')
+
+
+@override_settings(
+    ROLCA_DERIVATIVE_SIZES=[50, 80], ROLCA_DERIVATIVE_FORMATS=['JPEG', 'WEBP']
+)
+class DerivativeTestCase(TestCase):
+    def test_derivatives(self):
+        file = File.objects.create(
+            file=SimpleUploadedFile('photo.jpg', generate_photo((100, 60)).read())
+        )
+
+        derivatives = [
+            (derivative.size, derivative.format, derivative.width, derivative.height)
+            for derivative in file.derivatives.all()
+        ]
+        self.assertEqual(
+            derivatives,
+            [
+                (50, 'JPEG', 50, 30),
+                (50, 'WEBP', 50, 30),
+                (80, 'JPEG', 80, 48),
+                (80, 'WEBP', 80, 48),
+            ],
+        )
+        self.assertEqual(file.thumbnail.width, 100)
+
+        names = [derivative.image.name for derivative in file.derivatives.all()]
+        storage = file.file.storage
+        file.delete()
+        delete_stored_files()
+        for name in names:
+            self.assertFalse(storage.exists(name))
+
+
+class MetadataTestCase(TestCase):
+    def test_metadata(self):
+        photo = generate_photo((100, 60), exif=generate_exif()).read()
+        file = File.objects.create(file=SimpleUploadedFile('photo.jpg', photo))
+
+        file = File.objects.get(pk=file.pk)
+        self.assertEqual((file.width, file.height), (100, 60))
+        self.assertEqual(file.file_size, len(photo))
+        self.assertEqual(file.format, 'JPEG')
+        self.assertEqual(file.taken, datetime.datetime(2020, 5, 17, 10, 30))
+        self.assertEqual(file.camera, 'Canon EOS 5D')
+        self.assertEqual(file.get_long_edge(), 100)
+
+        file.delete()
+
+    def test_backfill(self):
+        file = File.objects.create(
+            file=SimpleUploadedFile('photo.jpg', generate_photo((100, 60)).read())
+        )
+        File.objects.filter(pk=file.pk).update(width=None, height=None, file_size=None)
+
+        call_command('backfillmetadata', stdout=io.StringIO())
+
+        file = File.objects.get(pk=file.pk)
+        self.assertEqual((file.width, file.height), (100, 60))
+        self.assertIsNotNone(file.file_size)
+
+        file.delete()
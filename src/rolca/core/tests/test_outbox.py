@@ -0,0 +1,144 @@
+import io
+from datetime import timedelta
+from smtplib import SMTPException
+
+from mock import patch
+
+from django.core import mail
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from drf_user.models import Email
+
+from rolca.core.consumers import CoreConsumer
+from rolca.core.models import OutgoingEmail
+from rolca.core.outbox import queue_email, send_emails
+
+
+@override_settings(ROLCA_EMAIL_RETRY_DELAY=60, ROLCA_EMAIL_MAX_ATTEMPTS=2)
+class OutboxTestCase(TestCase):
+    def setUp(self):
+        self.email = Email.objects.create(subject='Confirmation', body='Thanks!')
+
+    @patch('rolca.core.outbox.send_to_worker')
+    def test_queue(self, send_mock):
+        with self.captureOnCommitCallbacks(execute=True):
+            outgoing = queue_email(self.email, 'jane@example.com')
+        send_mock.assert_called_once_with('core.email')
+        self.assertEqual(len(mail.outbox), 0)
+
+        # Email is not sent before the coalesce window passes.
+        CoreConsumer().core_email({})
+        self.assertEqual(len(mail.outbox), 0)
+
+        OutgoingEmail.objects.update(send_after=timezone.now())
+        CoreConsumer().core_email({})
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['jane@example.com'])
+        outgoing.refresh_from_db()
+        self.assertIsNotNone(outgoing.sent)
+
+    @patch('rolca.core.outbox.send_to_worker')
+    def test_coalesce(self, send_mock):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = queue_email(self.email, 'jane@example.com')
+            second = queue_email(self.email, 'jane@example.com')
+            other = queue_email(self.email, 'john@example.com')
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(send_mock.call_count, 2)
+
+        # Sent emails are not coalesced.
+        OutgoingEmail.objects.update(send_after=timezone.now())
+        self.assertEqual(send_emails(), {'sent': 2, 'failed': 0})
+        with self.captureOnCommitCallbacks(execute=True):
+            third = queue_email(self.email, 'jane@example.com')
+        self.assertNotEqual(third, first)
+        self.assertEqual(send_mock.call_count, 3)
+
+        # Neither are failed ones.
+        OutgoingEmail.objects.filter(pk=third.pk).update(attempts=1)
+        self.assertNotEqual(queue_email(self.email, 'jane@example.com'), third)
+
+    def test_unique_pending(self):
+        OutgoingEmail.objects.create(email=self.email, recipient='jane@example.com')
+        with self.assertRaises(IntegrityError):
+            OutgoingEmail.objects.create(email=self.email, recipient='jane@example.com')
+
+    def test_batch_lease(self):
+        for i in range(5):
+            OutgoingEmail.objects.create(
+                email=self.email, recipient='user{}@example.com'.format(i)
+            )
+
+        def send(email, recipient):
+            # Emails are leased while being sent.
+            outgoing = OutgoingEmail.objects.get(recipient=recipient)
+            self.assertGreater(outgoing.send_after, timezone.now())
+            mail.send_mail(email.subject, email.body, None, [recipient])
+
+        with patch.object(Email, 'send', autospec=True, side_effect=send):
+            result = send_emails(batch_size=2)
+        self.assertEqual(result, {'sent': 5, 'failed': 0})
+        self.assertEqual(len(mail.outbox), 5)
+
+        self.assertEqual(send_emails(), {'sent': 0, 'failed': 0})
+
+    def test_expired_lease(self):
+        outgoing = OutgoingEmail.objects.create(
+            email=self.email, recipient='jane@example.com'
+        )
+
+        # Email claimed by a crashed worker is not sent before the lease expires.
+        with patch.object(Email, 'send', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                send_emails()
+        self.assertEqual(send_emails(), {'sent': 0, 'failed': 0})
+
+        OutgoingEmail.objects.update(send_after=timezone.now())
+        self.assertEqual(send_emails(), {'sent': 1, 'failed': 0})
+        outgoing.refresh_from_db()
+        self.assertIsNotNone(outgoing.sent)
+
+    def test_retry(self):
+        outgoing = OutgoingEmail.objects.create(
+            email=self.email, recipient='jane@example.com'
+        )
+
+        with patch.object(Email, 'send', side_effect=SMTPException('Unavailable')):
+            self.assertEqual(send_emails(), {'sent': 0, 'failed': 1})
+
+        outgoing.refresh_from_db()
+        self.assertEqual(outgoing.attempts, 1)
+        self.assertEqual(outgoing.error, 'Unavailable')
+        self.assertGreater(outgoing.send_after, timezone.now() + timedelta(seconds=50))
+
+        # Retry is not sent before the delay.
+        self.assertEqual(send_emails(), {'sent': 0, 'failed': 0})
+
+        OutgoingEmail.objects.update(send_after=timezone.now())
+        with patch.object(
+            Email, 'send', side_effect=SMTPException('Connection refused')
+        ):
+            self.assertEqual(send_emails(), {'sent': 0, 'failed': 1})
+
+        outgoing.refresh_from_db()
+        self.assertEqual(outgoing.attempts, 2)
+        self.assertEqual(outgoing.error, 'Connection refused')
+        self.assertGreater(outgoing.send_after, timezone.now() + timedelta(seconds=110))
+
+        # Email is abandoned after the max number of attempts.
+        OutgoingEmail.objects.update(send_after=timezone.now())
+        self.assertEqual(send_emails(), {'sent': 0, 'failed': 0})
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_command(self):
+        OutgoingEmail.objects.create(email=self.email, recipient='jane@example.com')
+
+        out = io.StringIO()
+        call_command('sendemails', stdout=out)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("Sent 1 emails, 0 failed.", out.getvalue())
@@ -0,0 +1,59 @@
+import io
+
+from PIL import Image
+
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+
+from rolca.core.uploadhandler import ImageLimitUploadHandler
+
+
+def generate_photo(size):
+    photo = io.BytesIO()
+    Image.new('RGB', size).save(photo, 'jpeg')
+    return photo.getvalue()
+
+
+@override_settings(ROLCA_MAX_UPLOAD_SIZE=4096, ROLCA_MAX_UPLOAD_RESOLUTION=480)
+class ImageLimitUploadHandlerTest(SimpleTestCase):
+    def setUp(self):
+        self.handler = ImageLimitUploadHandler()
+        self.handler.new_file('file', 'photo.jpg', 'image/jpeg', None)
+
+    def receive(self, data, chunk_size=1024):
+        """Feed data to the handler and return number of received bytes."""
+        for start in range(0, len(data), chunk_size):
+            chunk = data[start : start + chunk_size]
+            self.assertEqual(self.handler.receive_data_chunk(chunk, start), chunk)
+        return len(data)
+
+    def test_content_length(self):
+        with self.assertRaisesMessage(ValidationError, "Max size of file is 4096B."):
+            self.handler.handle_raw_input(None, {}, 5000)
+
+        self.handler.handle_raw_input(None, {}, 4000)
+
+    def test_abort_size(self):
+        received = 0
+        with self.assertRaisesMessage(ValidationError, "Max size of file is 4096B."):
+            received = self.receive(b'\xff' * 10000)
+
+        # Exception was raised before all data was received.
+        self.assertEqual(received, 0)
+        self.assertEqual(self.handler.received, 5 * 1024)
+
+    def test_abort_resolution(self):
+        with self.assertRaisesMessage(
+            ValidationError, "Max photo resolution is 480px."
+        ):
+            self.receive(generate_photo((1000, 10)), chunk_size=256)
+
+        # Only the header was received.
+        self.assertEqual(self.handler.received, 256)
+
+    def test_valid(self):
+        photo = generate_photo((100, 100))
+        self.receive(photo)
+        self.assertEqual(self.handler.received, len(photo))
+        self.assertIsNone(self.handler.file_complete(len(photo)))
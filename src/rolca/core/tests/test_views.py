@@ -0,0 +1,163 @@
+import io
+import os
+import zipfile
+from datetime import date, timedelta
+
+from mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import FileResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from rolca.core.archive import build_contest_archive
+from rolca.core.deletion import delete_stored_files
+from rolca.core.models import Author, Contest, ContestArchive, File, Submission, Theme
+from rolca.core.views import download_contest
+
+
+class DownloadContestTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = get_user_model().objects.create_user(username='user')
+
+        today = date.today()
+        self.contest = Contest.objects.create(
+            user=self.user,
+            title='Test contest',
+            start_date=today,
+            end_date=today + timedelta(days=1),
+        )
+        self.theme = theme = Theme.objects.create(
+            title='Nature', contest=self.contest, n_photos=2
+        )
+        self.author = author = Author.objects.create(
+            user=self.user, first_name='Janez', last_name='Novak'
+        )
+
+        submission1 = Submission.objects.create(
+            title='Sunset', user=self.user, author=author, theme=theme
+        )
+        submission2 = Submission.objects.create(
+            user=self.user, author=author, theme=theme
+        )
+
+        # pk must be set to skip on-create procedure
+        self.files = [
+            File.objects.create(
+                pk=1,
+                user=self.user,
+                submission=submission1,
+                file=SimpleUploadedFile('photo.jpg', b'first photo'),
+            ),
+            File.objects.create(
+                pk=2,
+                user=self.user,
+                submission=submission2,
+                file=SimpleUploadedFile('photo.jpg', b'second photo'),
+            ),
+        ]
+
+    def tearDown(self):
+        for file in self.files:
+            file.file.delete()
+
+        for archive in ContestArchive.objects.all():
+            archive.file.delete()
+
+    def get_response(self):
+        request = self.factory.get('')
+        request.user = self.user
+        return download_contest(request, contest_id=self.contest.pk)
+
+    def test_download_contest(self):
+        response = self.get_response()
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            response['Content-Disposition'], 'attachment; filename="test-contest.zip"'
+        )
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(
+            archive.namelist(),
+            [
+                'test-contest/nature/',
+                'test-contest/nature/janez-novak-sunset.jpg',
+                'test-contest/nature/janez-novak-1.jpg',
+            ],
+        )
+        info = archive.getinfo('test-contest/nature/janez-novak-sunset.jpg')
+        self.assertEqual(info.compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(
+            archive.read('test-contest/nature/janez-novak-sunset.jpg'), b'first photo'
+        )
+        self.assertEqual(
+            archive.read('test-contest/nature/janez-novak-1.jpg'), b'second photo'
+        )
+
+    def test_download_prebuilt_archive(self):
+        build_contest_archive(self.contest)
+        archive = ContestArchive.objects.get(contest=self.contest)
+        self.assertTrue(archive.is_valid())
+
+        response = self.get_response()
+        self.assertIsInstance(response, FileResponse)
+        archive_file = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(len(archive_file.namelist()), 3)
+
+        with override_settings(ROLCA_SENDFILE_HEADER='X-Sendfile'):
+            response = self.get_response()
+            self.assertEqual(response['X-Sendfile'], archive.file.path)
+
+        with override_settings(
+            ROLCA_SENDFILE_HEADER='X-Accel-Redirect', ROLCA_SENDFILE_URL='/protected/'
+        ):
+            response = self.get_response()
+            self.assertEqual(
+                response['X-Accel-Redirect'],
+                '/protected/{}'.format(archive.file.name),
+            )
+
+    def test_archive_name(self):
+        build_contest_archive(self.contest)
+        archive = ContestArchive.objects.get(contest=self.contest)
+        old_name = archive.file.name
+        self.assertRegex(os.path.basename(old_name), r'^[0-9a-f]{32}\.zip$')
+        self.assertTrue(archive.file.storage.exists(old_name))
+
+        # Rebuilt archive gets a new name and the old one is deleted.
+        with patch('rolca.core.deletion.send_to_worker'):
+            build_contest_archive(self.contest)
+        archive.refresh_from_db()
+        self.assertNotEqual(archive.file.name, old_name)
+
+        delete_stored_files()
+        self.assertFalse(archive.file.storage.exists(old_name))
+        self.assertTrue(archive.file.storage.exists(archive.file.name))
+
+    def test_archive_invalidation(self):
+        build_contest_archive(self.contest)
+
+        Submission.objects.create(
+            title='Forest', user=self.user, author=self.author, theme=self.theme
+        )
+        archive = ContestArchive.objects.get(contest=self.contest)
+        self.assertFalse(archive.is_valid())
+        self.assertTrue(self.get_response().streaming)
+
+    def test_closed_contest_requests_archive(self):
+        self.contest.end_date = timezone.now() - timedelta(days=1)
+        self.contest.save()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertTrue(self.get_response().streaming)
+        self.assertEqual(len(callbacks), 1)
+
+        archive = ContestArchive.objects.get(contest=self.contest)
+        self.assertTrue(archive.is_pending())
+
+        # Pending build is not requested again.
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.get_response()
+        self.assertEqual(len(callbacks), 0)
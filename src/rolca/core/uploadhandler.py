@@ -0,0 +1,134 @@
+""".. Ignore pydocstyle D400.
+
+====================
+Core upload handlers
+====================
+
+Upload handlers compute the content digest of uploaded files while they
+are being received, so the file doesn't have to be read again to
+generate its name.
+
+``ImageLimitUploadHandler`` rejects uploads exceeding the size or
+resolution limits as early as possible: the size is checked against the
+``Content-Length`` header and the received bytes, and the resolution is
+read from the JPEG's start of frame marker in the first few kilobytes.
+
+.. autoclass:: rolca.core.uploadhandler.ImageLimitUploadHandler
+    :members:
+
+.. autoclass:: rolca.core.uploadhandler.DigestMemoryFileUploadHandler
+    :members:
+
+.. autoclass:: rolca.core.uploadhandler.DigestTemporaryFileUploadHandler
+    :members:
+
+"""
+from django.core.files.uploadhandler import (
+    FileUploadHandler,
+    MemoryFileUploadHandler,
+    TemporaryFileUploadHandler,
+)
+
+from rolca.core.imaging import read_jpeg_size
+from rolca.core.models import new_content_hash, validate_file_size, validate_resolution
+
+#: number of bytes searched for the JPEG's start of frame marker
+HEADER_LIMIT = 256 * 1024
+
+
+class ImageLimitUploadHandler(FileUploadHandler):
+    """Abort uploads exceeding the size or resolution limits.
+
+    The handler must be the first one in the list of handlers. It passes
+    received data to the following handlers and raises
+    ``django.core.exceptions.ValidationError`` as soon as one of the
+    limits is exceeded, so the rest of the request body is not read.
+
+    Requests with several files are checked against ``max_files`` times
+    the size limit before each file is checked separately.
+    """
+
+    def __init__(self, request=None, max_files=1):
+        """Set the number of files allowed in the request."""
+        super().__init__(request)
+        self.max_files = max_files
+
+    def handle_raw_input(self, input_data, META, content_length, *args, **kwargs):
+        """Reject the upload based on the ``Content-Length`` header."""
+        if content_length:
+            validate_file_size(content_length // self.max_files)
+
+    def new_file(self, *args, **kwargs):
+        """Reset the state for a new file."""
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.header = bytearray()
+
+    def receive_data_chunk(self, raw_data, start):
+        """Check limits with the received chunk and pass it on."""
+        self.received += len(raw_data)
+        validate_file_size(self.received)
+
+        if self.header is not None:
+            self.header += raw_data
+            try:
+                size = read_jpeg_size(self.header)
+            except ValueError:
+                # Format is validated after the file is received.
+                size = None
+                self.header = None
+
+            if size is not None:
+                self.header = None
+                validate_resolution(*size)
+            elif self.header is not None and len(self.header) > HEADER_LIMIT:
+                self.header = None
+
+        return raw_data
+
+    def file_complete(self, file_size):
+        """Leave creating the file to the following handlers."""
+        return None
+
+
+class DigestMixin:
+    """Compute digest of the received data and attach it to the file.
+
+    The digest is stored in ``content_digest`` attribute of the uploaded
+    file.
+    """
+
+    def new_file(self, *args, **kwargs):
+        """Start hashing a new file."""
+        self.content_hash = new_content_hash()
+        return super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        """Update digest with the received chunk."""
+        # Memory handler passes data of large files to the next handler.
+        if getattr(self, 'activated', True):
+            self.content_hash.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        """Attach computed digest to the uploaded file."""
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_digest = self.content_hash.hexdigest()
+        return file
+
+
+class DigestMemoryFileUploadHandler(DigestMixin, MemoryFileUploadHandler):
+    """Upload handler streaming small files into memory."""
+
+
+class DigestTemporaryFileUploadHandler(DigestMixin, TemporaryFileUploadHandler):
+    """Upload handler streaming large files into a temporary file."""
+
+
+def get_upload_handlers(request):
+    """Return upload handlers used for uploading photos."""
+    return [
+        DigestMemoryFileUploadHandler(request),
+        DigestTemporaryFileUploadHandler(request),
+    ]
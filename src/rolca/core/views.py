@@ -4,74 +4,95 @@
 Core views
 ==========
 
+.. autofunction:: rolca.core.views.download_contest
+
 .. autofunction:: rolca.core.views.upload
 
 """
-import io
 import json
 import logging
 import os
-import zipfile
 
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.http import (
+    FileResponse,
     HttpResponse,
     HttpResponseBadRequest,
     HttpResponseForbidden,
     HttpResponseNotAllowed,
+    StreamingHttpResponse,
 )
 from django.shortcuts import get_object_or_404
-from django.utils.text import slugify
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 
-from rolca.core.models import Contest, File, Submission, Theme
+from rolca.core.archive import (
+    get_archive_filename,
+    iter_contest_archive,
+    request_contest_archive,
+)
+from rolca.core.models import Contest, ContestArchive, File
+from rolca.core.uploadhandler import get_upload_handlers
 
 logger = logging.getLogger(__name__)
 
 
+def _archive_response(archive):
+    """Return response serving the prebuilt archive from the disk.
+
+    If ``ROLCA_SENDFILE_HEADER`` setting is set to ``X-Sendfile`` or
+    ``X-Accel-Redirect``, the transfer is delegated to the web server.
+    ``X-Accel-Redirect`` points to ``ROLCA_SENDFILE_URL`` (defaults to
+    ``MEDIA_URL``) joined with the archive's name.
+    """
+    filename = get_archive_filename(archive.contest)
+    header = getattr(settings, 'ROLCA_SENDFILE_HEADER', None)
+
+    if header is None:
+        return FileResponse(
+            archive.file.open('rb'),
+            as_attachment=True,
+            filename=filename,
+            content_type='application/x-zip-compressed',
+        )
+
+    response = HttpResponse(content_type='application/x-zip-compressed')
+    if header == 'X-Accel-Redirect':
+        url_prefix = getattr(settings, 'ROLCA_SENDFILE_URL', settings.MEDIA_URL)
+        response[header] = url_prefix + archive.file.name
+    else:
+        response[header] = archive.file.path
+    response['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
+
+    return response
+
+
 @login_required
 def download_contest(request, contest_id):
-    """Download all submissions of the contest as zip file."""
+    """Download all submissions of the contest as zip file.
+
+    Archives of closed contests are built once by a background worker
+    and served from the disk. Until the archive is ready (or while the
+    contest is still open), the archive is streamed to the client while
+    it is being generated, so the response starts immediately and memory
+    usage stays constant regardless of the number of photos.
+    """
     contest = get_object_or_404(Contest, pk=contest_id)
 
-    buffer = io.BytesIO()
-    zip_archive = zipfile.ZipFile(buffer, mode='w')
+    archive = ContestArchive.objects.filter(contest=contest).first()
+    if archive is not None and archive.is_valid():
+        return _archive_response(archive)
 
-    for theme in Theme.objects.filter(contest=contest):
-        # Create empty directory
-        zip_info = zipfile.ZipInfo(
-            os.path.join(slugify(contest.title), slugify(theme.title)) + "/"
-        )
-        zip_archive.writestr(zip_info, '')
-
-        no_title_count = 0
-        for submission in Submission.objects.filter(theme=theme):
-            if not submission.title:
-                no_title_count += 1
-            zip_file_name = '{}.jpg'.format(
-                slugify(
-                    '{}-{}'.format(
-                        submission.author, submission.title or no_title_count
-                    )
-                )
-            )
-            zip_path = os.path.join(
-                slugify(contest.title), slugify(theme.title), zip_file_name
-            )
-            zip_archive.write(submission.photo.file.path, zip_path)
-
-    zip_archive.close()
-
-    response = HttpResponse(
-        buffer.getvalue(), content_type='application/x-zip-compressed'
-    )
+    if contest.end_date < timezone.now():
+        request_contest_archive(contest)
 
-    slugified_title = slugify(contest.title)
-    response['Content-Disposition'] = 'attachment; filename="{}.zip"'.format(
-        slugified_title
+    response = StreamingHttpResponse(
+        iter_contest_archive(contest), content_type='application/x-zip-compressed'
+    )
+    response['Content-Disposition'] = 'attachment; filename="{}"'.format(
+        get_archive_filename(contest)
     )
-    response['Content-Length'] = buffer.tell()
 
     return response
 
@@ -87,6 +108,7 @@ def upload(request):
         logger.warning('Anonymous user tried to upload file.')
         return HttpResponseForbidden('Please login!')
 
+    request.upload_handlers = get_upload_handlers(request)
     if request.FILES is None:
         logger.warning("Upload request without attached image.")
         return HttpResponseBadRequest('Must have files attached!')
@@ -102,8 +124,9 @@ def upload(request):
             "File can't excede size of {}KB".format(settings.MAX_UPLOAD_SIZE / 1024)
         )
 
+    file_.extract_metadata()
     max_image_resolution = settings.MAX_IMAGE_RESOLUTION
-    if max(file_.file.width, file_.file.height) > max_image_resolution:
+    if file_.get_long_edge() > max_image_resolution:
         logger.warning("Too big file.")
         return HttpResponseBadRequest(
             "File can't excede size of {}px".format(settings.MAX_IMAGE_RESOLUTION)
@@ -115,9 +138,9 @@ def upload(request):
     result.append(
         {
             "name": os.path.basename(file_.file.name),
-            "size": file_.file.size,
+            "size": file_.file_size,
             "url": file_.file.url,
-            "thumbnail": file_.thumbnail.url,
+            "thumbnail": file_.thumbnail.url if file_.thumbnail else None,
             "delete_url": '',
             "delete_type": "POST",
         }
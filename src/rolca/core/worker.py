@@ -0,0 +1,31 @@
+""".. Ignore pydocstyle D400.
+
+===========
+Core worker
+===========
+
+Helpers for triggering tasks on the background worker listening on the
+``rolca.core`` channel.
+
+.. autofunction:: rolca.core.worker.send_to_worker
+
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import ChannelFull, get_channel_layer
+
+from rolca.core.protocol import CHANNEL_CORE
+
+logger = logging.getLogger(__name__)
+
+
+def send_to_worker(message_type, **kwargs):
+    """Send message of the given type to the core background worker."""
+    channel_layer = get_channel_layer()
+    try:
+        async_to_sync(channel_layer.send)(
+            CHANNEL_CORE, {"type": message_type, **kwargs}
+        )
+    except ChannelFull:
+        logger.warning("Cannot trigger %s because channel is full.", message_type)
@@ -1,15 +1,18 @@
 """.. Ignore pydocstyle D400."""
 from rest_framework import viewsets
 
+from rolca.core.api.optimization import QueryOptimizationMixin
+from rolca.core.api.pagination import CursorPagination
 from rolca.core.api.permissions import IsSuperUser
 from rolca.payment.api.filters import PaymentFilter
 from rolca.payment.api.serializers import PaymentSerializer
 from rolca.payment.models import Payment
 
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(QueryOptimizationMixin, viewsets.ModelViewSet):
     """API viewset for Payment objects."""
 
+    pagination_class = CursorPagination
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = (IsSuperUser,)
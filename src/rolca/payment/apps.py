@@ -7,3 +7,8 @@ class RolcaPaymentConfig(AppConfig):
 
     name = 'rolca.payment'
     verbose_name = "Rolca payment"
+
+    def ready(self):
+        """Application initialization."""
+        # Register signals handlers
+        from . import signals  # noqa: F401
@@ -0,0 +1,43 @@
+# Generated by Django 4.2 on 2026-10-18 06:31
+
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def count_paid_submissions(apps, schema_editor):
+    """Compute counters of paid submissions already in the database."""
+    Contest = apps.get_model("core", "Contest")
+    Submission = apps.get_model("core", "Submission")
+    Theme = apps.get_model("core", "Theme")
+
+    paid_count = (
+        Submission.objects.filter(
+            theme=OuterRef('pk'), submissionset__payment__paid=True
+        )
+        .order_by()
+        .values('theme')
+        .annotate(value=Count('pk', distinct=True))
+        .values('value')
+    )
+    Theme.objects.update(n_paid_submissions=Coalesce(Subquery(paid_count), 0))
+
+    theme_sum = (
+        Theme.objects.filter(contest=OuterRef('pk'))
+        .order_by()
+        .values('contest')
+        .annotate(value=Sum('n_paid_submissions'))
+        .values('value')
+    )
+    Contest.objects.update(n_paid_submissions=Coalesce(Subquery(theme_sum), 0))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('payment', '0002_existing_payments'),
+        ('core', '0028_submission_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_paid_submissions, migrations.RunPython.noop),
+    ]
@@ -7,10 +7,30 @@ Payment models
 .. autoclass:: rolca.payment.models.Payment
     :members:
 
+.. autofunction:: rolca.payment.models.change_paid_counters
+
 """
-from django.db import models
+from django.db import models, transaction
+
+from rolca.core.counters import change_counters
+from rolca.core.models import BaseModel, Submission, SubmissionSet
+
 
-from rolca.core.models import BaseModel, SubmissionSet
+def change_paid_counters(submissions, paid, submissionset_pks):
+    """Change paid counters of submissions by the given value.
+
+    A submission is counted as paid once, regardless of the number of
+    paid sets it belongs to. Submissions that are also in paid sets
+    other than ``submissionset_pks`` are skipped, as their paid status
+    doesn't change.
+    """
+    other_paid_sets = SubmissionSet.objects.filter(payment__paid=True).exclude(
+        pk__in=submissionset_pks
+    )
+    # Submissions of a related manager are already joined with their sets,
+    # so paid submissions are excluded by their primary keys.
+    paid_elsewhere = Submission.objects.filter(submissionset__in=other_paid_sets)
+    change_counters(submissions.exclude(pk__in=paid_elsewhere.values('pk')), paid=paid)
 
 
 class Payment(BaseModel):
@@ -19,3 +39,22 @@ class Payment(BaseModel):
     submissionset = models.OneToOneField(SubmissionSet, on_delete=models.CASCADE)
 
     paid = models.BooleanField(default=False)
+
+    def save(self, *args, **kwargs):
+        """Save Payment instance and update counters of paid submissions."""
+        with transaction.atomic():
+            # Lock the row, so concurrent changes are counted only once.
+            was_paid = bool(
+                Payment.objects.select_for_update()
+                .filter(pk=self.pk)
+                .values_list('paid', flat=True)
+                .first()
+            )
+            super().save(*args, **kwargs)
+
+            if self.paid != was_paid:
+                change_paid_counters(
+                    self.submissionset.submissions.all(),
+                    1 if self.paid else -1,
+                    [self.submissionset_id],
+                )
@@ -0,0 +1,85 @@
+""".. Ignore pydocstyle D400.
+
+===============
+Signal Handlers
+===============
+
+"""
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import receiver
+
+from rolca.core.counters import change_theme_counters
+from rolca.core.models import Submission, SubmissionSet
+from rolca.payment.models import Payment, change_paid_counters
+
+
+def _is_paid(submission):
+    """Check if the submission is in any paid set."""
+    return Payment.objects.filter(
+        paid=True, submissionset__submissions=submission
+    ).exists()
+
+
+@receiver(pre_delete, sender=Submission)
+def counters_submission_pre_delete_handler(sender, instance, **kwargs):
+    """Remove the deleted paid submission from counters."""
+    # Relations are still present before the submission is deleted.
+    if _is_paid(instance):
+        change_theme_counters(instance.theme_id, paid=-1)
+
+
+@receiver(post_save, sender=Submission)
+def counters_submission_post_save_handler(sender, instance, created, **kwargs):
+    """Move the paid submission to counters of its new theme."""
+    # Stored theme is remembered by the core signal handlers.
+    stored_theme_id = getattr(instance, '_stored_theme_id', None)
+    if created or stored_theme_id in (None, instance.theme_id):
+        return
+
+    if _is_paid(instance):
+        change_theme_counters(stored_theme_id, paid=-1)
+        change_theme_counters(instance.theme_id, paid=1)
+
+
+@receiver(pre_delete, sender=Payment)
+def counters_payment_pre_delete_handler(sender, instance, **kwargs):
+    """Remove submissions of the deleted payment from paid counters."""
+    if instance.paid:
+        change_paid_counters(
+            instance.submissionset.submissions.all(), -1, [instance.submissionset_id]
+        )
+
+
+@receiver(m2m_changed, sender=SubmissionSet.submissions.through)
+def counters_m2m_changed_handler(sender, instance, action, reverse, pk_set, **kwargs):
+    """Update paid counters when submissions of a paid set change."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    if reverse:
+        # Sets of the submission change.
+        if action == 'pre_clear':
+            if _is_paid(instance):
+                change_theme_counters(instance.theme_id, paid=-1)
+            return
+
+        paid_sets = SubmissionSet.objects.filter(pk__in=pk_set, payment__paid=True)
+        if paid_sets.exists():
+            change_paid_counters(
+                Submission.objects.filter(pk=instance.pk),
+                1 if action == 'post_add' else -1,
+                pk_set,
+            )
+        return
+
+    if not Payment.objects.filter(submissionset=instance, paid=True).exists():
+        return
+
+    if action == 'pre_clear':
+        change_paid_counters(instance.submissions.all(), -1, [instance.pk])
+    else:
+        change_paid_counters(
+            Submission.objects.filter(pk__in=pk_set),
+            1 if action == 'post_add' else -1,
+            [instance.pk],
+        )
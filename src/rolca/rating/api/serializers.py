@@ -8,8 +8,11 @@ Rating API serializers
     :members:
 
 """
+from django.utils.functional import cached_property
+
 from rest_framework import exceptions, serializers
 
+from rolca.core.api.compiled import compile_serializer
 from rolca.core.api.serializers import (
     AuthorSerializer as CoreAuthorSerializer,
     BaseSerializer,
@@ -20,6 +23,9 @@ from rolca.core.api.serializers import (
 )
 from rolca.rating.models import Judge, Rating, SubmissionReward
 
+#: labels of submission reward kinds
+REWARD_KINDS = dict(SubmissionReward.KIND_CHOICES)
+
 
 class RatingSerializer(BaseSerializer):
     """Serializer for Rating objects."""
@@ -61,12 +67,15 @@ class ThemeSerializer(CoreThemeSerializer):
         ]
 
     def get_ratings_number(self, theme):
+        if hasattr(theme, 'ratings_count'):
+            return theme.ratings_count
+
         return Rating.objects.filter(
             user=self.context['request'].user, submission__theme=theme
         ).count()
 
     def get_submissions_number(self, theme):
-        return theme.submission_set.filter(submissionset__payment__paid=True).count()
+        return theme.n_paid_submissions
 
 
 class ContestSerializer(CoreContestSerializer):
@@ -134,22 +143,26 @@ class SubmissionResultsSerializer(CoreSubmissionSerializer):
     def get_accepted(self, submission):
         return self._is_accepted(submission)
 
-    def get_files(self, submission):
-        if not self._is_accepted(submission):
-            return None
-
-        return FileSerializer(
-            submission.files,
+    @cached_property
+    def _render_files(self):
+        """Return compiled serializer of submission's files."""
+        serializer = FileSerializer(
             many=True,
             context={
                 'request': self.context['request'],
             },
-        ).data
+        )
+        return compile_serializer(serializer)
+
+    def get_files(self, submission):
+        if not self._is_accepted(submission):
+            return None
+
+        return self._render_files(submission.files.all())
 
     def get_reward_kind(self, submission):
-        mapping = dict(SubmissionReward.KIND_CHOICES)
         if hasattr(submission, 'reward'):
-            return mapping[submission.reward.kind]
+            return REWARD_KINDS[submission.reward.kind]
 
 
 class ThemeResultsSerializer(CoreThemeSerializer):
@@ -164,12 +177,19 @@ class ThemeResultsSerializer(CoreThemeSerializer):
             'submissions',
         ]
 
+    @cached_property
+    def _submissions_context(self):
+        """Return context shared by serializers of all themes' submissions."""
+        return {'request': self.context['request']}
+
+    @cached_property
+    def _render_submissions(self):
+        """Return compiled serializer of theme's submissions."""
+        serializer = SubmissionResultsSerializer(
+            many=True, context=self._submissions_context
+        )
+        return compile_serializer(serializer)
+
     def get_submissions(self, theme):
-        return SubmissionResultsSerializer(
-            theme.submission_set.all(),
-            many=True,
-            context={
-                'request': self.context['request'],
-                'accept_threshold': theme.results.accepted_threshold,
-            },
-        ).data
+        self._submissions_context['accept_threshold'] = theme.results.accepted_threshold
+        return self._render_submissions(theme.submission_set.all())
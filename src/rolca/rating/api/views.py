@@ -1,12 +1,17 @@
 """.. Ignore pydocstyle D400."""
-from django.db.models import F, Prefetch, Sum, Value
+from django.db.models import CharField, Count, F, Prefetch, Q, Sum, Value
 from django.db.models.functions import SHA1, Concat
+from django.http import HttpResponse
 from django.utils import timezone
 from rest_framework import mixins, permissions, viewsets
 
 from rolca.core.api.serializers import SubmissionSerializer
+from rolca.core.api.compiled import CompiledReadMixin
+from rolca.core.api.conditional import ConditionalGetMixin, EarlyResponse
 from rolca.core.api.filters import ContestFilter, SubmissionFilter
-from rolca.core.models import Author, Contest, Submission, Theme
+from rolca.core.api.optimization import QueryOptimizationMixin
+from rolca.core.api.pagination import CursorPagination
+from rolca.core.models import Author, Contest, File, Submission, Theme
 from rolca.rating.api.filters import RatingFilter
 from rolca.rating.api.permissions import IsActiveJudge
 from rolca.rating.api.serializers import (
@@ -15,12 +20,80 @@ from rolca.rating.api.serializers import (
     SubmissionResultsSerializer,
     ThemeResultsSerializer,
 )
-from rolca.rating.models import Judge, Rating
+from rolca.rating.cache import get_cached, get_results_key, get_timeout, set_cached
+from rolca.rating.models import (
+    AuthorReward,
+    Judge,
+    Rating,
+    SubmissionReward,
+    ThemeResults,
+)
+
+
+def get_results_querysets(submissions):
+    """Return querysets of objects included in results of the submissions."""
+    submissions = submissions.values('pk')
+    return [
+        Rating.objects.filter(submission__in=submissions),
+        ThemeResults.objects.filter(theme__submission__in=submissions),
+        SubmissionReward.objects.filter(submission__in=submissions),
+        AuthorReward.objects.filter(author__submission__in=submissions),
+        Author.objects.filter(submission__in=submissions),
+        File.objects.filter(submission__in=submissions),
+    ]
+
+
+class ResultsCacheMixin:
+    """Viewset mixin serving rendered JSON responses from the results cache."""
+
+    def get_cache_scopes(self):
+        """Return scopes of results included in the response."""
+        return ['all']
+
+    def initial(self, request, *args, **kwargs):
+        """Answer with the cached response if it is available."""
+        self._cache_key = None
+        super().initial(request, *args, **kwargs)
+        if not get_timeout() or request.accepted_renderer.format != 'json':
+            return
+
+        key = get_results_key(
+            self.get_cache_scopes(),
+            request.get_full_path(),
+            request.accepted_media_type,
+            request.user.is_superuser,
+        )
+        content = get_cached(key)
+        if content is not None:
+            raise EarlyResponse(
+                HttpResponse(content, content_type=request.accepted_media_type)
+            )
+        self._cache_key = key
+
+    def handle_exception(self, exc):
+        """Return the cached response."""
+        if isinstance(exc, EarlyResponse):
+            return exc.response
+
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Store the rendered response in the cache."""
+        response = super().finalize_response(request, response, *args, **kwargs)
+
+        key = getattr(self, '_cache_key', None)
+        if key is not None:
+            content = None
+            if response.status_code == 200:
+                content = response.render().content
+            set_cached(key, content)
+        return response
 
 
-class RatingViewSet(viewsets.ModelViewSet):
+class RatingViewSet(QueryOptimizationMixin, viewsets.ModelViewSet):
     """API viewset for Rating objects."""
 
+    pagination_class = CursorPagination
     queryset = Rating.objects.none()
     serializer_class = RatingSerializer
     permission_classes = (permissions.IsAuthenticated,)
@@ -30,7 +103,13 @@ class RatingViewSet(viewsets.ModelViewSet):
         return Rating.objects.filter(user=self.request.user)
 
 
-class SubmissionViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+class SubmissionViewSet(
+    CompiledReadMixin,
+    QueryOptimizationMixin,
+    mixins.ListModelMixin,
+    viewsets.GenericViewSet,
+):
+    pagination_class = CursorPagination
     queryset = Submission.objects.all()
     serializer_class = SubmissionSerializer
     filter_class = SubmissionFilter
@@ -48,12 +127,26 @@ class SubmissionViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
                 theme__in=theme_qs,
                 submissionset__payment__paid=True,
             )
-            .annotate(random=SHA1(Concat("pk", Value(str(self.request.user.pk)))))
+            .annotate(
+                random=SHA1(
+                    Concat(
+                        "pk",
+                        Value(str(self.request.user.pk)),
+                        output_field=CharField(),
+                    )
+                )
+            )
             .order_by("random")
         )
 
 
-class ContestViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+class ContestViewSet(
+    CompiledReadMixin,
+    QueryOptimizationMixin,
+    mixins.ListModelMixin,
+    viewsets.GenericViewSet,
+):
+    pagination_class = CursorPagination
     queryset = Contest.objects.all()
     serializer_class = ContestSerializer
     filter_class = ContestFilter
@@ -62,13 +155,25 @@ class ContestViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     def get_queryset(self):
         """Return queryset for contests that can be shown to judge."""
         judge_qs = Judge.objects.filter(judge=self.request.user)
+        theme_qs = Theme.objects.annotate(
+            ratings_count=Count(
+                'submission__rating',
+                filter=Q(submission__rating__user=self.request.user),
+            ),
+        )
         return Contest.objects.filter(
             pk__in=judge_qs.values('contest'),
             publish_date__gte=timezone.now(),
-        )
+        ).prefetch_related(Prefetch('themes', queryset=theme_qs))
 
 
-class ThemeResultsViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+class ThemeResultsViewSet(
+    ResultsCacheMixin,
+    ConditionalGetMixin,
+    CompiledReadMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
+):
     submission_qs = (
         Submission.objects.annotate(rating_sum=Sum('rating__rating'))
         .select_related(
@@ -77,7 +182,7 @@ class ThemeResultsViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
             'author__user__location',
             'author__reward',
         )
-        .prefetch_related('files', 'reward')
+        .prefetch_related('files__derivatives', 'reward')
     )
 
     queryset = Theme.objects.prefetch_related(
@@ -89,10 +194,25 @@ class ThemeResultsViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
         """Return queryset of published themes."""
         return self.queryset.filter(contest__publish_date__lte=timezone.now())
 
+    def get_conditional_querysets(self, queryset):
+        """Return querysets of themes and objects in their results."""
+        submissions = Submission.objects.filter(theme__in=queryset)
+        return [queryset, submissions] + get_results_querysets(submissions)
+
+    def get_cache_scopes(self):
+        """Return scope of the requested theme."""
+        return ['theme-{}'.format(self.kwargs['pk'])]
+
 
 class SubmissionResultsViewSet(
-    mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+    ResultsCacheMixin,
+    ConditionalGetMixin,
+    CompiledReadMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
 ):
+    pagination_class = CursorPagination
     author_qs = Author.objects.select_related('user', 'user__location', 'reward')
 
     queryset = (
@@ -105,7 +225,7 @@ class SubmissionResultsViewSet(
             'author__user__location',
             'author__reward',
         )
-        .prefetch_related('files', 'reward')
+        .prefetch_related('files__derivatives', 'reward')
     )
     serializer_class = SubmissionResultsSerializer
     filter_class = SubmissionFilter
@@ -114,3 +234,16 @@ class SubmissionResultsViewSet(
     def get_queryset(self):
         """Return queryset of published themes."""
         return self.queryset.filter(theme__contest__publish_date__lte=timezone.now())
+
+    def get_conditional_querysets(self, queryset):
+        """Return querysets of submissions and objects in their results."""
+        return [queryset] + get_results_querysets(queryset)
+
+    def get_cache_scopes(self):
+        """Return scopes of themes and contests the list is filtered by."""
+        scopes = [
+            '{}-{}'.format(name, self.request.query_params[name])
+            for name in ('theme', 'contest')
+            if self.action == 'list' and name in self.request.query_params
+        ]
+        return scopes or ['all']
@@ -7,3 +7,8 @@ class RolcaRatingConfig(AppConfig):
 
     name = 'rolca.rating'
     verbose_name = "Rolca rating"
+
+    def ready(self):
+        """Application initialization."""
+        # Register signals handlers
+        from . import signals  # noqa: F401
@@ -0,0 +1,164 @@
+""".. Ignore pydocstyle D400.
+
+=============
+Results cache
+=============
+
+Rendered results are stored in the default Django cache for
+``ROLCA_RESULTS_CACHE_TIMEOUT`` seconds (a day by default, ``0``
+disables the cache).
+
+Cache keys contain versions of the themes, contests or all results the
+response depends on. Changes of ratings, rewards, thresholds and photos
+increment versions of the affected theme, its contest and of all
+results once the transaction is committed, so stale entries are never
+read again and expire on their own.
+
+Contests are published when their ``publish_date`` passes, without any
+change that could increment versions. Cache keys therefore also contain
+the next pending publish date of contests in the scopes, so responses
+rendered before the publication are not read after it.
+
+When an entry is missing, only the process holding the lock renders
+the response, while others wait for the entry to appear.
+
+.. autofunction:: rolca.rating.cache.get_results_key
+
+.. autofunction:: rolca.rating.cache.get_cached
+
+.. autofunction:: rolca.rating.cache.set_cached
+
+.. autofunction:: rolca.rating.cache.invalidate_results
+
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from rolca.core.models import Contest, Theme
+
+#: prefix of all results cache keys
+KEY_PREFIX = 'rolca-results'
+
+#: time in seconds after which the lock of a missing entry is released
+LOCK_TIMEOUT = 30
+
+#: time in seconds between checks for the entry rendered by other process
+POLL_INTERVAL = 0.05
+
+
+def get_timeout():
+    """Return time in seconds for which results are cached."""
+    return getattr(settings, 'ROLCA_RESULTS_CACHE_TIMEOUT', 24 * 60 * 60)
+
+
+def _get_version_key(scope):
+    """Return key storing the version of the scope."""
+    return '{}:version:{}'.format(KEY_PREFIX, scope)
+
+
+def _get_versions(scopes):
+    """Return current versions of the scopes."""
+    keys = [_get_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Versions start at a unique value, so entries cached with
+            # an evicted version are not reused.
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _bump_versions(scopes):
+    """Increment versions of the scopes."""
+    for scope in scopes:
+        key = _get_version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+def _get_contests_filter(scope):
+    """Return filter of contests in the scope."""
+    if scope == 'all':
+        return Q()
+
+    name, _, pk = scope.partition('-')
+    if not pk.isdigit():
+        return Q(pk__in=[])
+    return Q(themes=pk) if name == 'theme' else Q(pk=pk)
+
+
+def _get_next_publish_date(scopes):
+    """Return the earliest future publish date of contests in the scopes."""
+    contests_filter = Q(pk__in=[])
+    for scope in scopes:
+        contests_filter |= _get_contests_filter(scope)
+
+    return (
+        Contest.objects.filter(contests_filter, publish_date__gt=timezone.now())
+        .aggregate(next_publish_date=Min('publish_date'))
+        .get('next_publish_date')
+    )
+
+
+def get_results_key(scopes, *parts):
+    """Return cache key of a response depending on the scopes.
+
+    Scopes are ``'all'``, ``'theme-<pk>'`` or ``'contest-<pk>'`` and
+    ``parts`` identify the response within them.
+    """
+    state = [scopes, _get_versions(scopes), _get_next_publish_date(scopes), parts]
+    digest = hashlib.sha1(repr(state).encode())
+    return '{}:{}'.format(KEY_PREFIX, digest.hexdigest())
+
+
+def get_cached(key):
+    """Return cached content or ``None`` if the caller should render it.
+
+    If ``None`` is returned, the caller holds the lock of the entry and
+    must call ~`set_cached` once the content is rendered or failed.
+    """
+    lock_key = key + ':lock'
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while True:
+        content = cache.get(key)
+        if content is not None:
+            return content
+        if cache.add(lock_key, True, timeout=LOCK_TIMEOUT):
+            return None
+        if time.monotonic() > deadline:
+            # Lock holder is stuck, render the content without it.
+            return None
+        time.sleep(POLL_INTERVAL)
+
+
+def set_cached(key, content=None):
+    """Store rendered content (unless ``None``) and release the lock."""
+    if content is not None:
+        cache.set(key, content, timeout=get_timeout())
+    cache.delete(key + ':lock')
+
+
+def invalidate_results(**filters):
+    """Invalidate cached results of themes matching given filters.
+
+    Results are invalidated once the current transaction is committed.
+    """
+    themes = list(Theme.objects.filter(**filters).values_list('pk', 'contest'))
+    if not themes:
+        return
+
+    scopes = {'all'}
+    for theme_pk, contest_pk in themes:
+        scopes.add('theme-{}'.format(theme_pk))
+        scopes.add('contest-{}'.format(contest_pk))
+
+    transaction.on_commit(lambda: _bump_versions(scopes))
@@ -0,0 +1,47 @@
+""".. Ignore pydocstyle D400.
+
+===============
+Signal Handlers
+===============
+
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rolca.core.counters import theme_counters_changed
+from rolca.core.models import Contest, File
+from rolca.rating.cache import invalidate_results
+from rolca.rating.models import AuthorReward, Rating, SubmissionReward, ThemeResults
+
+
+@receiver([post_save, post_delete], sender=Rating)
+@receiver([post_save, post_delete], sender=SubmissionReward)
+def results_submission_handler(sender, instance, **kwargs):
+    """Invalidate results of the theme when its submission changes."""
+    invalidate_results(submission=instance.submission_id)
+
+
+@receiver([post_save, post_delete], sender=File)
+def results_file_handler(sender, instance, **kwargs):
+    """Invalidate results of the theme when its photo changes."""
+    if instance.submission_id is not None:
+        invalidate_results(submission=instance.submission_id)
+
+
+@receiver([post_save, post_delete], sender=ThemeResults)
+@receiver([post_save, post_delete], sender=AuthorReward)
+def results_theme_handler(sender, instance, **kwargs):
+    """Invalidate results of the theme."""
+    invalidate_results(pk=instance.theme_id)
+
+
+@receiver(theme_counters_changed)
+def results_counters_handler(sender, theme_id, **kwargs):
+    """Invalidate results of the theme when its counters change."""
+    invalidate_results(pk=theme_id)
+
+
+@receiver(post_save, sender=Contest)
+def results_contest_handler(sender, instance, **kwargs):
+    """Invalidate results of the contest, e.g. when it is published."""
+    invalidate_results(contest=instance.pk)
@@ -0,0 +1,108 @@
+"""Benchmark CPU time and peak memory of generating photo derivatives.
+
+Every strategy runs in a fresh process, so the peak RSS reported by the
+operating system belongs to that strategy only. Run from the repository
+root with::
+
+    python -m tests.benchmarks.derivatives [--size WIDTHxHEIGHT] [--repeat N]
+
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from PIL import Image
+
+from rolca.core.imaging import THUMBNAIL_SIZE, encode, iter_scaled
+
+SIZES = [200, THUMBNAIL_SIZE, 1200, 2400]
+
+
+def naive(path, formats):
+    """Decode full resolution photo separately for every derivative."""
+    for size in SIZES:
+        image = Image.open(path)
+        image.thumbnail((size, size), Image.LANCZOS, reducing_gap=None)
+        for format in formats:
+            encode(image, format)
+
+
+def engine(path, formats):
+    """Decode once with draft mode and downscale in a cascade."""
+    for _, image in iter_scaled(path, SIZES):
+        for format in formats:
+            encode(image, format)
+
+
+def peak_rss():
+    """Return peak resident set size of the current process in kB."""
+    # Unlike ``ru_maxrss``, ``VmHWM`` is not inherited from the parent.
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(strategy, path, formats, repeat, queue):
+    """Run strategy and report CPU time per image and peak RSS."""
+    baseline = peak_rss()
+    start = time.process_time()
+    for _ in range(repeat):
+        strategy(path, formats)
+    cpu_time = (time.process_time() - start) / repeat
+    queue.put((cpu_time, baseline, peak_rss()))
+
+
+def generate_photo(path, size):
+    """Save a noisy photo resembling a camera image."""
+    channels = [Image.effect_noise(size, 40 + 10 * i) for i in range(3)]
+    Image.merge('RGB', channels).save(path, 'jpeg', quality=92)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', default='6000x4000', help='input resolution')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per strategy')
+    args = parser.parse_args()
+    size = tuple(int(edge) for edge in args.size.split('x'))
+
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'photo.jpg')
+        generate_photo(path, size)
+        print(
+            'Input: {}x{} JPEG, {:.1f} MB, derivatives: {}'.format(
+                size[0], size[1], os.path.getsize(path) / 1024**2, SIZES
+            )
+        )
+
+        for formats in (['JPEG'], ['JPEG', 'WEBP']):
+            for strategy in (naive, engine):
+                queue = context.Queue()
+                process = context.Process(
+                    target=measure, args=(strategy, path, formats, args.repeat, queue)
+                )
+                process.start()
+                cpu_time, baseline, peak = queue.get()
+                process.join()
+                print(
+                    '{:<8} {:<10} {:>8.0f} ms CPU/image {:>8.1f} MB peak RSS '
+                    '(+{:.1f} MB)'.format(
+                        strategy.__name__,
+                        '+'.join(formats),
+                        cpu_time * 1000,
+                        peak / 1024,
+                        (peak - baseline) / 1024,
+                    )
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Benchmark per-row cost of DRF and compiled serializers.
+
+Objects are built in memory with their relations already cached, so
+only the serialization is measured and no database is needed. Run from
+the repository root with::
+
+    python -m tests.benchmarks.serializers [--rows N] [--repeat N]
+
+"""
+import argparse
+import gc
+import os
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.settings')
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from rest_framework.request import Request  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from rolca.core.api.compiled import compile_serializer  # noqa: E402
+from rolca.core.api.serializers import (  # noqa: E402
+    ContestSerializer,
+    SubmissionSerializer,
+)
+from rolca.core.models import Author, Contest, File, Submission, Theme  # noqa: E402
+from rolca.rating.api.serializers import SubmissionResultsSerializer  # noqa: E402
+from rolca.rating.models import (  # noqa: E402
+    AuthorReward,
+    SubmissionReward,
+    ThemeResults,
+)
+
+
+def prefetched(instance, name, objects):
+    """Store objects as prefetched objects of the relation."""
+    queryset = getattr(instance, name).all()
+    queryset._result_cache = list(objects)
+    queryset._prefetch_done = True
+    instance._prefetched_objects_cache = {name: queryset}
+
+
+def make_objects(rows):
+    """Return contests and submissions with all relations cached."""
+    now = timezone.now()
+    user = get_user_model()(pk=1, username='user', email='user@example.com')
+    contest = Contest(pk=1, title='Contest', start_date=now, end_date=now)
+    theme = Theme(pk=1, contest=contest, title='Theme', n_photos=4)
+    theme.results = ThemeResults(accepted_threshold=10)
+    prefetched(contest, 'themes', [theme])
+
+    submissions = []
+    for pk in range(1, rows + 1):
+        author = Author(pk=pk, user=user, first_name='Jane', last_name='Doe')
+        author.reward = AuthorReward(theme=theme, label='Best author')
+        submission = Submission(
+            pk=pk, author=author, theme=theme, title='Photo {}'.format(pk)
+        )
+        submission.created = submission.modified = now
+        submission.rating_sum = pk % 20
+        submission.reward = SubmissionReward(kind=SubmissionReward.GOLD, label='1st')
+
+        file = File(
+            pk=pk,
+            submission=submission,
+            file='photos/{}.jpg'.format(pk),
+            thumbnail='thumbs/{}.jpg'.format(pk),
+            width=2400,
+            height=1600,
+        )
+        file.created = file.modified = now
+        prefetched(file, 'derivatives', [])
+        prefetched(submission, 'files', [file])
+        submissions.append(submission)
+
+    return [contest] * rows, submissions
+
+
+def measure(render, repeat):
+    """Return the best time of rendering in seconds and the rendered JSON."""
+    best = float('inf')
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data = render()
+            best = min(best, time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return best, JSONRenderer().render(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    request = Request(APIRequestFactory().get('/'))
+    request.user = get_user_model()(pk=1, is_superuser=True)
+    request.method = 'GET'
+
+    contests, submissions = make_objects(args.rows)
+    cases = [
+        ('contest list', ContestSerializer, contests),
+        ('judge submissions', SubmissionSerializer, submissions),
+        ('submission results', SubmissionResultsSerializer, submissions),
+    ]
+
+    print('{:<20} {:>12} {:>14} {:>8}'.format('', 'DRF', 'compiled', 'speedup'))
+    for label, serializer_class, objects in cases:
+
+        def drf():
+            return serializer_class(
+                objects, many=True, context={'request': request}
+            ).data
+
+        def compiled():
+            serializer = serializer_class(many=True, context={'request': request})
+            return compile_serializer(serializer)(objects)
+
+        drf_time, drf_json = measure(drf, args.repeat)
+        compiled_time, compiled_json = measure(compiled, args.repeat)
+        assert drf_json == compiled_json, label
+
+        print(
+            '{:<20} {:>9.1f} us {:>11.1f} us {:>7.1f}x'.format(
+                label,
+                drf_time / args.rows * 10**6,
+                compiled_time / args.rows * 10**6,
+                drf_time / compiled_time,
+            )
+        )
+
+
+if __name__ == '__main__':
+    main()
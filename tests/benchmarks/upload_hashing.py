@@ -0,0 +1,100 @@
+"""Benchmark bytes read while generating names of uploaded photos.
+
+Run from the repository root with::
+
+    python -m tests.benchmarks.upload_hashing
+
+"""
+import hashlib
+import io
+import os
+import struct
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.settings')
+django.setup()
+
+from django.core.files.uploadedfile import InMemoryUploadedFile  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+
+from rolca.core.models import (  # noqa: E402
+    File,
+    generate_file_filename,
+    generate_thumb_filename,
+    new_content_hash,
+)
+
+PHOTO_SIZE = 12 * 1024**2
+
+
+class CountingReader(io.BytesIO):
+    """In-memory file counting the number of bytes read."""
+
+    bytes_read = 0
+
+    def read(self, *args, **kwargs):
+        data = super().read(*args, **kwargs)
+        self.bytes_read += len(data)
+        return data
+
+
+def legacy_filename(instance, filename, prefix):
+    """Filename generation as it was implemented before single-pass hashing."""
+    md5 = hashlib.md5()
+    md5.update(struct.pack('f', time.time()))
+    for chunk in instance.file.chunks():
+        md5.update(chunk)
+    extension = os.path.splitext(filename)[1]
+    return os.path.join(prefix, md5.hexdigest() + extension)
+
+
+def make_file(digest=None):
+    reader = CountingReader(os.urandom(PHOTO_SIZE))
+    upload = InMemoryUploadedFile(
+        reader, 'file', 'photo.jpg', 'image/jpeg', PHOTO_SIZE, None
+    )
+    if digest is not None:
+        upload.content_digest = digest
+    return File(file=upload), reader
+
+
+def run(label, generate, digest=None):
+    file, reader = make_file(digest)
+    start = time.perf_counter()
+    generate(file)
+    elapsed = time.perf_counter() - start
+    print(
+        '{:<40} {:>8.1f} MB read {:>8.1f} ms'.format(
+            label, reader.bytes_read / 1024**2, elapsed * 1000
+        )
+    )
+
+
+def main():
+    print('Photo size: {:.1f} MB'.format(PHOTO_SIZE / 1024**2))
+
+    def legacy(file):
+        legacy_filename(file, 'photo.jpg', 'photos')
+        legacy_filename(file, 'photo.jpg', 'thumbs')
+
+    def current(file):
+        generate_file_filename(file, 'photo.jpg')
+        generate_thumb_filename(file, 'photo.jpg')
+
+    run('legacy (md5 per name)', legacy)
+    run('single pass (no upload digest)', current)
+    run('single pass (upload handler digest)', current, digest='0' * 32)
+
+    for algorithm in ('md5', 'blake2b'):
+        with override_settings(ROLCA_HASH_ALGORITHM=algorithm):
+            data = os.urandom(PHOTO_SIZE)
+            start = time.perf_counter()
+            new_content_hash().update(data)
+            elapsed = time.perf_counter() - start
+            print('{:<40} {:>8.1f} ms'.format(algorithm + ' hashing', elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
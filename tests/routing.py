@@ -2,10 +2,17 @@ from channels.routing import ChannelNameRouter, ProtocolTypeRouter
 
 from rolca.backup.consumers import BackupConsumer
 from rolca.backup.protocol import CHANNEL_BACKUP
+from rolca.core.consumers import CoreConsumer
+from rolca.core.protocol import CHANNEL_CORE
 
 application = ProtocolTypeRouter(
     {
         # Background worker consumers.
-        'channel': ChannelNameRouter({CHANNEL_BACKUP: BackupConsumer}),
+        'channel': ChannelNameRouter(
+            {
+                CHANNEL_BACKUP: BackupConsumer,
+                CHANNEL_CORE: CoreConsumer,
+            }
+        ),
     }
 )